@@ -83,6 +83,13 @@ class WorkflowExecuteRequest(BaseModel):
     context: Optional[Dict[str, Any]] = Field(None, description="额外上下文信息")
     timeout: Optional[int] = Field(60, description="超时时间（秒）")
     prompt_config: Optional[PromptConfig] = Field(None, description="提示词配置")
+    step_models: Optional[Dict[str, str]] = Field(
+        None,
+        description="按步骤指定模型，如 {\"guardrails\": \"haiku-3.5\", \"evaluate\": \"ministral-8b\"}，覆盖 MODEL_ROUTING",
+    )
+    template_answers: Optional[bool] = Field(
+        None, description="标量、单列和小表格结果直接用模板渲染答案而不调用LLM总结，默认取 TEMPLATE_ANSWERS_DEFAULT"
+    )
 
 
 # 工作流执行响应模型
@@ -147,4 +154,5 @@ class StatisticsInfo(BaseModel):
     average_execution_time: float = Field(..., description="平均执行时间")
     popular_workflows: List[Dict[str, Any]] = Field(..., description="热门工作流")
     popular_llms: List[Dict[str, Any]] = Field(..., description="热门LLM")
-    daily_stats: List[Dict[str, Any]] = Field(..., description="每日统计") 
\ No newline at end of file
+    daily_stats: List[Dict[str, Any]] = Field(..., description="每日统计") 
+    latency_percentiles: Dict[str, Any] = Field(default_factory=dict, description="执行时间分位数（整体、按工作流、按LLM）")
@@ -13,10 +13,25 @@ from app.api_models import (
     SystemStatus, HealthCheckResponse, BatchWorkflowRequest, BatchWorkflowResponse,
     ConfigUpdateRequest, StatisticsInfo, WorkflowType, LLMStatus, DatabaseStatus
 )
+from app.execution_stats import ExecutionStats
 from app.resource_manager import ResourceManager
+from app.trace_export import get_trace_exporter
+from app.trace_store import GROUP_FIELDS, aggregate_records, iter_records
 from app.settings import WORKFLOW_MAP
+from app.utils import get_llm_logger
 from app.workflow_service import WorkflowService
 from app.prompt_routes import router as prompt_router
+from cypher_workflows.shared.cypher_executor import get_plan_cache_stats, get_replica_stats
+from cypher_workflows.shared.driver_registry import get_driver_registry_stats
+from cypher_workflows.shared.utils import get_introspection_stats
+from cypher_workflows.shared.speculative import get_speculative_stats
+from cypher_workflows.shared.evaluation_policy import get_evaluation_stats
+from cypher_workflows.shared.model_router import get_model_routing_stats
+from cypher_workflows.shared.step_timing import get_step_timing_stats
+from cypher_workflows.shared.entity_index import (
+    get_entity_index,
+    start_entity_index_builder,
+)
 
 # 创建路由器
 router = APIRouter(prefix="/api/v1", tags=["Text2Cypher API"])
@@ -28,14 +43,8 @@ router.include_router(prompt_router)
 resource_manager = None
 workflow_service = None
 start_time = None
-execution_stats = {
-    "total_executions": 0,
-    "successful_executions": 0,
-    "failed_executions": 0,
-    "execution_times": [],
-    "workflow_usage": {},
-    "llm_usage": {}
-}
+# 执行统计（计数、延迟直方图与按天统计），内存占用固定
+execution_stats = ExecutionStats()
 
 
 def get_resource_manager():
@@ -53,6 +62,11 @@ async def refresh_databases_from_nacos(payload: Dict[str, Any] | None = None):
         before = len(rm.databases)
         rm.load_databases_from_nacos(overrides=payload or {})
         after = len(rm.databases)
+        # 为新注册的数据库构建实体名索引
+        start_entity_index_builder(
+            {name: db for name, db in rm.databases.items() if get_entity_index(name) is None},
+            refresh=False,
+        )
         return BaseResponse(success=True, message=f"Refreshed databases from Nacos: {before} -> {after}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Refresh databases failed: {str(e)}")
@@ -292,11 +306,7 @@ async def execute_workflow(request: WorkflowExecuteRequest):
     
     try:
         # 更新统计信息
-        execution_stats["total_executions"] += 1
-        execution_stats["workflow_usage"][request.workflow_type.value] = \
-            execution_stats["workflow_usage"].get(request.workflow_type.value, 0) + 1
-        execution_stats["llm_usage"][request.llm_name] = \
-            execution_stats["llm_usage"].get(request.llm_name, 0) + 1
+        execution_stats.record_start(request.workflow_type.value, request.llm_name)
         
         ws = get_workflow_service()
         # 解析数据库：优先使用 database_id，其次 database_name
@@ -318,12 +328,15 @@ async def execute_workflow(request: WorkflowExecuteRequest):
             input_text=request.input_text,
             context=request.context or {},
             timeout=request.timeout,
-            prompt_config=request.prompt_config.dict() if request.prompt_config else None
+            prompt_config=request.prompt_config.dict() if request.prompt_config else None,
+            step_models=request.step_models,
+            template_answers=request.template_answers,
         )
         
         execution_time = time.time() - start_time
-        execution_stats["successful_executions"] += 1
-        execution_stats["execution_times"].append(execution_time)
+        execution_stats.record_success(
+            request.workflow_type.value, request.llm_name, execution_time
+        )
         
         return WorkflowExecuteResponse(
             success=True,
@@ -334,7 +347,7 @@ async def execute_workflow(request: WorkflowExecuteRequest):
         
     except Exception as e:
         execution_time = time.time() - start_time
-        execution_stats["failed_executions"] += 1
+        execution_stats.record_failure()
         
         events.append(WorkflowEvent(
             event_type="error",
@@ -376,7 +389,9 @@ async def execute_workflow_stream(request: WorkflowExecuteRequest):
                 input_text=request.input_text,
                 context=request.context or {},
                 timeout=request.timeout,
-                prompt_config=request.prompt_config.dict() if request.prompt_config else None
+                prompt_config=request.prompt_config.dict() if request.prompt_config else None,
+                step_models=request.step_models,
+                template_answers=request.template_answers,
             ):
                 yield f"data: {json.dumps(event)}\n\n"
         except Exception as e:
@@ -421,44 +436,118 @@ async def execute_workflow_batch(request: BatchWorkflowRequest):
 async def get_statistics():
     """获取系统统计信息"""
     try:
-        avg_time = 0
-        if execution_stats["execution_times"]:
-            avg_time = sum(execution_stats["execution_times"]) / len(execution_stats["execution_times"])
-        
-        # 获取热门工作流
-        popular_workflows = [
-            {"name": name, "count": count}
-            for name, count in sorted(
-                execution_stats["workflow_usage"].items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:5]
-        ]
-        
-        # 获取热门LLM
-        popular_llms = [
-            {"name": name, "count": count}
-            for name, count in sorted(
-                execution_stats["llm_usage"].items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:5]
-        ]
-        
-        return StatisticsInfo(
-            total_executions=execution_stats["total_executions"],
-            successful_executions=execution_stats["successful_executions"],
-            failed_executions=execution_stats["failed_executions"],
-            average_execution_time=avg_time,
-            popular_workflows=popular_workflows,
-            popular_llms=popular_llms,
-            daily_stats=[]  # 可以扩展为每日统计
-        )
+        # 平均值与分位数来自固定桶直方图，按天统计保留最近 STATS_DAILY_DAYS 天
+        return StatisticsInfo(**execution_stats.snapshot())
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get statistics: {str(e)}")
 
 
+# 获取Neo4j查询统计（按集群成员）
+@router.get("/statistics/neo4j", response_model=BaseResponse)
+async def get_neo4j_statistics():
+    """获取按集群成员（leader/follower/read replica）统计的查询延迟、计划缓存命中率及共享驱动信息"""
+    try:
+        replicas = get_replica_stats()
+        return BaseResponse(
+            success=True,
+            message=f"Found latency statistics for {len(replicas)} Neo4j servers",
+            data={
+                "replicas": replicas,
+                "plan_cache": get_plan_cache_stats(),
+                "drivers": get_driver_registry_stats(),
+                "schema_introspection": get_introspection_stats(),
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get Neo4j statistics: {str(e)}")
+
+
+# 获取工作流优化路径统计
+@router.get("/statistics/workflows", response_model=BaseResponse)
+async def get_workflow_statistics():
+    """获取推测式生成、评估快速路径（跳过率、抽样复核一致率）、按步骤的模型耗时与成本及各阶段延迟直方图"""
+    try:
+        return BaseResponse(
+            success=True,
+            message="Workflow statistics",
+            data={
+                "speculative_generation": get_speculative_stats(),
+                "evaluation": get_evaluation_stats(),
+                "model_routing": get_model_routing_stats(),
+                "step_timings": get_step_timing_stats(),
+                "llm_logging": get_llm_logger().get_stats(),
+                "trace_export": get_trace_exporter().get_stats(),
+            }
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get workflow statistics: {str(e)}")
+
+
+# 查询追踪记录
+@router.get("/traces", response_model=BaseResponse)
+async def query_traces(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    request_id: Optional[str] = None,
+    event: Optional[str] = None,
+    workflow: Optional[str] = None,
+    llm: Optional[str] = None,
+    database: Optional[str] = None,
+    limit: int = 100,
+):
+    """按时间范围、请求ID、事件、工作流、LLM、数据库筛选追踪记录（逐段流式读取，最多返回 limit 条）"""
+    def collect():
+        records = []
+        for record in iter_records(
+            since=since, until=until, request_id=request_id, event=event,
+            workflow=workflow, llm=llm, database=database,
+        ):
+            records.append(record)
+            if len(records) >= limit:
+                break
+        return records
+
+    try:
+        records = await asyncio.to_thread(collect)
+        return BaseResponse(success=True, message=f"Found {len(records)} trace records", data=records)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid trace filter: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to query traces: {str(e)}")
+
+
+# 汇总追踪记录
+@router.get("/traces/aggregate", response_model=BaseResponse)
+async def aggregate_traces(
+    group_by: str = "workflow",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    event: Optional[str] = "run",
+    workflow: Optional[str] = None,
+    llm: Optional[str] = None,
+    database: Optional[str] = None,
+):
+    """按 group_by（逗号分隔）分组统计次数、错误数、延迟分位数、token 与估算成本，默认只统计运行汇总记录"""
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in GROUP_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by fields {unknown}, expected {list(GROUP_FIELDS)}",
+        )
+    try:
+        records = iter_records(
+            since=since, until=until, event=event, workflow=workflow, llm=llm, database=database
+        )
+        groups = await asyncio.to_thread(aggregate_records, records, fields)
+        return BaseResponse(success=True, message=f"Aggregated {len(groups)} trace groups", data=groups)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid trace filter: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to aggregate traces: {str(e)}")
+
+
 # 测试LLM连接
 @router.post("/llms/{llm_name}/test")
 async def test_llm_connection(llm_name: str):
@@ -533,19 +622,48 @@ async def get_database_schema(database_name: str):
         raise HTTPException(status_code=500, detail=f"Failed to get schema: {str(e)}")
 
 
+# 搜索实体名
+@router.get("/databases/{database_name}/entities/search", response_model=BaseResponse)
+async def search_entities(
+    database_name: str,
+    q: str,
+    mode: str = "auto",
+    label: Optional[str] = None,
+    limit: int = 10,
+):
+    """在实体名索引中查找名称，mode 可选 exact / prefix / fuzzy / auto"""
+    rm = get_resource_manager()
+    if database_name not in rm.databases:
+        raise HTTPException(status_code=404, detail=f"Database '{database_name}' not found")
+    if mode not in ("exact", "prefix", "fuzzy", "auto"):
+        raise HTTPException(status_code=400, detail=f"Unsupported search mode '{mode}'")
+
+    index = get_entity_index(database_name)
+    if index is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Entity index for database '{database_name}' is not built yet",
+        )
+
+    start = time.perf_counter()
+    matches = index.search(q, mode=mode, label=label, limit=limit)
+    return BaseResponse(
+        success=True,
+        message=f"Found {len(matches)} entities matching '{q}'",
+        data={
+            "matches": matches,
+            "index_size": len(index),
+            "search_time_us": (time.perf_counter() - start) * 1e6,
+        },
+    )
+
+
 # 重置统计信息
 @router.post("/statistics/reset")
 async def reset_statistics():
     """重置统计信息"""
     global execution_stats
-    execution_stats = {
-        "total_executions": 0,
-        "successful_executions": 0,
-        "failed_executions": 0,
-        "execution_times": [],
-        "workflow_usage": {},
-        "llm_usage": {}
-    }
+    execution_stats = ExecutionStats()
     
     return BaseResponse(
         success=True,
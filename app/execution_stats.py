@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import deque
+from datetime import date
+from typing import Any, Dict, List
+
+from cypher_workflows.shared.step_timing import LatencyHistogram
+
+# /statistics 中按天统计保留的天数，更早的统计被丢弃
+STATS_DAILY_DAYS = int(os.getenv("STATS_DAILY_DAYS", "30"))
+
+
+def _latency_summary(histogram: LatencyHistogram) -> Dict[str, Any]:
+    snapshot = histogram.snapshot()
+    return {key: snapshot[key] for key in ("count", "avg_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")}
+
+
+class ExecutionStats:
+    """
+    Fixed-memory execution statistics for /statistics: counters, usage per workflow and
+    LLM, latency histograms (overall, per workflow, per LLM) with streaming percentiles,
+    and one entry per day in a ring of STATS_DAILY_DAYS days.
+    """
+
+    def __init__(self, days: int = STATS_DAILY_DAYS):
+        self._lock = threading.Lock()
+        self.total_executions = 0
+        self.successful_executions = 0
+        self.failed_executions = 0
+        self.workflow_usage: Dict[str, int] = {}
+        self.llm_usage: Dict[str, int] = {}
+        self.latency = LatencyHistogram()
+        self.latency_by_workflow: Dict[str, LatencyHistogram] = {}
+        self.latency_by_llm: Dict[str, LatencyHistogram] = {}
+        self.daily: deque = deque(maxlen=max(1, days))
+
+    def _today(self) -> Dict[str, Any]:
+        today = date.today().isoformat()
+        if not self.daily or self.daily[-1]["date"] != today:
+            self.daily.append(
+                {"date": today, "total": 0, "successful": 0, "failed": 0, "latency": LatencyHistogram()}
+            )
+        return self.daily[-1]
+
+    def record_start(self, workflow: str, llm: str):
+        with self._lock:
+            self.total_executions += 1
+            self.workflow_usage[workflow] = self.workflow_usage.get(workflow, 0) + 1
+            self.llm_usage[llm] = self.llm_usage.get(llm, 0) + 1
+            self._today()["total"] += 1
+
+    def record_success(self, workflow: str, llm: str, execution_time: float):
+        value_ms = execution_time * 1000
+        with self._lock:
+            self.successful_executions += 1
+            self.latency.observe(value_ms)
+            self.latency_by_workflow.setdefault(workflow, LatencyHistogram()).observe(value_ms)
+            self.latency_by_llm.setdefault(llm, LatencyHistogram()).observe(value_ms)
+            day = self._today()
+            day["successful"] += 1
+            day["latency"].observe(value_ms)
+
+    def record_failure(self):
+        with self._lock:
+            self.failed_executions += 1
+            self._today()["failed"] += 1
+
+    @staticmethod
+    def _popular(usage: Dict[str, int]) -> List[Dict[str, Any]]:
+        return [
+            {"name": name, "count": count}
+            for name, count in sorted(usage.items(), key=lambda x: x[1], reverse=True)[:5]
+        ]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "total_executions": self.total_executions,
+                "successful_executions": self.successful_executions,
+                "failed_executions": self.failed_executions,
+                "average_execution_time": (
+                    self.latency.sum / self.latency.count / 1000 if self.latency.count else 0
+                ),
+                "popular_workflows": self._popular(self.workflow_usage),
+                "popular_llms": self._popular(self.llm_usage),
+                "daily_stats": [
+                    {
+                        "date": day["date"],
+                        "total": day["total"],
+                        "successful": day["successful"],
+                        "failed": day["failed"],
+                        **_latency_summary(day["latency"]),
+                    }
+                    for day in self.daily
+                ],
+                "latency_percentiles": {
+                    "overall": _latency_summary(self.latency),
+                    "by_workflow": {
+                        name: _latency_summary(h) for name, h in self.latency_by_workflow.items()
+                    },
+                    "by_llm": {
+                        name: _latency_summary(h) for name, h in self.latency_by_llm.items()
+                    },
+                },
+            }
@@ -1,21 +1,27 @@
 import json
-from typing import Type
+import time
 
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from llama_index.core.workflow import Workflow
 from pydantic import BaseModel
 
-from app.resource_manager import ResourceManager
 from app.settings import WORKFLOW_MAP
 from app.utils import urlx_for
-from app.api_routes import router as api_router
+from app.api_routes import get_resource_manager, get_workflow_service, router as api_router
 from app.prompt_routes import router as prompt_router
 from app.prompt_manager import PromptManager
+from app.workflow_pool import RunTimeout
+from cypher_workflows.shared.driver_registry import close_all_drivers
+from cypher_workflows.shared.metrics import (
+    INFLIGHT_REQUESTS,
+    PROMETHEUS_CONTENT_TYPE,
+    render_metrics,
+)
 
 load_dotenv()
 
@@ -45,10 +51,17 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # 包含API路由
 app.include_router(api_router)
 
-resource_manager = ResourceManager()
+# 与 API 路由共用资源管理器和工作流实例池
+resource_manager = get_resource_manager()
 prompt_manager = PromptManager()  # 初始化提示词管理器
 
 
+@app.on_event("shutdown")
+async def shutdown_drivers():
+    """关闭共享的 Neo4j 驱动（异步驱动需要在事件循环中关闭）"""
+    await close_all_drivers()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
     """Web界面首页"""
@@ -96,37 +109,39 @@ async def workflow(payload: WorkflowPayload):
 # Main workflow runner function
 async def run_workflow(llm: str, database: str, workflow: str, context: dict):
     """原有的工作流执行函数"""
+    INFLIGHT_REQUESTS.inc(mode="stream")
     try:
-        workflow_class: Type[Workflow] = WORKFLOW_MAP.get(workflow)
-        if not workflow_class:
-            raise ValueError(f"Workflow '{workflow}' is not recognized.")
-
-        selected_llm = resource_manager.get_model_by_name(llm)
-        selected_database = resource_manager.get_database_by_name(database)
-        # 修复类型拼接问题
-        print(f"!!!!1 {selected_database}")
-
-        workflow_instance = workflow_class(
-            llm=selected_llm,
-            db=selected_database,
-            embed_model=resource_manager.embed_model,
-            timeout=60,
+        # 复用按 (工作流, LLM, 数据库) 缓存的实例，每次运行的状态只保存在 Context 中
+        workflow_instance: Workflow = get_workflow_service().workflow_pool.get(
+            workflow, llm, database
         )
 
+        # 请求截止时间，工作流内的Neo4j查询以剩余时间作为事务超时
+        context["deadline"] = time.time() + 60
         handler = workflow_instance.run(**context)
-
-        async for event in handler.stream_events():
-            if type(event).__name__ != "StopEvent":
-                event_data = json.dumps(
-                    {
-                        "event_type": type(event).__name__,
-                        "label": event.label,
-                        "message": event.message,
-                    }
-                )
-                yield f"data: {event_data}\n\n"
-
-        result = await handler
+        run_timeout = RunTimeout(handler, 60)
+
+        try:
+            async for event in handler.stream_events():
+                if type(event).__name__ != "StopEvent":
+                    event_data = json.dumps(
+                        {
+                            "event_type": type(event).__name__,
+                            "label": event.label,
+                            "message": event.message,
+                        }
+                    )
+                    yield f"data: {event_data}\n\n"
+
+            result = await handler
+        except Exception as e:
+            run_timeout.check(e)
+            raise
+        finally:
+            run_timeout.cancel()
+            # 客户端断开连接时取消工作流，避免被放弃的查询继续占用集群
+            if not handler.done():
+                await handler.cancel_run()
 
         yield f"data: {json.dumps({'result': result})}\n\n"
 
@@ -139,6 +154,14 @@ async def run_workflow(llm: str, database: str, workflow: str, context: dict):
             }
         )
         yield f"data: {error}\n\n"
+    finally:
+        INFLIGHT_REQUESTS.dec(mode="stream")
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus 指标（请求、LLM 调用与 token、Neo4j 查询、缓存命中、队列与进行中的流）"""
+    return PlainTextResponse(render_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 
 # 添加根路径的API信息
@@ -160,7 +183,13 @@ async def api_info():
             "execute_workflow": "/api/v1/workflow/execute",
             "stream_workflow": "/api/v1/workflow/execute/stream",
             "batch_workflow": "/api/v1/workflow/execute/batch",
-            "statistics": "/api/v1/statistics"
+            "statistics": "/api/v1/statistics",
+            "neo4j_statistics": "/api/v1/statistics/neo4j",
+            "workflow_statistics": "/api/v1/statistics/workflows",
+            "traces": "/api/v1/traces",
+            "trace_aggregates": "/api/v1/traces/aggregate",
+            "metrics": "/metrics",
+            "entity_search": "/api/v1/databases/{name}/entities/search"
         },
         "features": [
             "Multiple LLM support (OpenAI, Anthropic, Google, Mistral, ARK)",
@@ -1,5 +1,6 @@
 import os
 import json
+import threading
 from typing import Any, Dict, Optional
 import requests
 
@@ -11,6 +12,16 @@ from llama_index.llms.gemini import Gemini
 from llama_index.llms.mistralai import MistralAI
 from llama_index.llms.openai import OpenAI
 from llama_index.llms.openai_like import OpenAILike
+
+from cypher_workflows.shared.driver_registry import SharedNeo4jPropertyGraphStore
+from cypher_workflows.shared.entity_index import start_entity_index_builder
+from cypher_workflows.shared.metrics import CACHE_LOOKUPS
+from cypher_workflows.shared.model_router import register_models
+from app.schema_cache import (
+    query_schema_fingerprint,
+    load_schema_snapshot,
+    save_schema_snapshot,
+)
 # 注意：避免在顶层导入 sentence_transformers 以减小对 PyTorch 的强依赖
 
 
@@ -18,10 +29,14 @@ class ResourceManager:
     def __init__(self):
         self.llms = []
         self.databases = {}
+        # 从快照加载、等待后台校验指纹的数据库
+        self._pending_schema_checks = []
         self.embed_model = None
         self.init_llms()
         self.init_databases()
         self.init_embed_model()
+        # 后台构建各数据库的实体名索引
+        start_entity_index_builder(self.databases)
 
     def init_llms(self):
         print("> Initializing all llms. This may take some time...")
@@ -145,6 +160,8 @@ class ResourceManager:
                 ]
             )
 
+        # 供按步骤路由模型时按名称查找
+        register_models(self.llms)
         print(f"Loaded {len(self.llms)} llms.")
 
     def init_databases(self):
@@ -168,23 +185,14 @@ class ResourceManager:
         if dft_database is not None:
             print(f"-> Initializing default database: {dft_database}")
             try:
-                graph_store = Neo4jPropertyGraphStore(
+                self.databases[dft_database] = self.create_database_entry(
+                    name=dft_database,
                     url=os.getenv("NEO4J_URI"),
                     username=os.getenv("NEO4J_USERNAME"),
                     password=os.getenv("NEO4J_PASSWORD"),
                     database=os.getenv("NEO4J_DATABASE"),
-                    enhanced_schema=True,
-                    create_indexes=False,
-                    timeout=30,
                 )
-                print(f"-> Getting corrector schema for {dft_database} database.")
-                corrector_schema = self.get_corrector_schema(graph_store)
-                print(f"-> 成功获取 corrector schema 为: {corrector_schema}")
-                self.databases[dft_database] = {
-                    "graph_store": graph_store,
-                    "corrector_schema": corrector_schema,
-                    "name": dft_database,
-                }
+                print(f"-> 成功获取 corrector schema 为: {self.databases[dft_database]['corrector_schema']}")
             except Exception as ex:
                 print(ex)
 
@@ -195,27 +203,18 @@ class ResourceManager:
             for db in demo_databases:
                 print(f"-> Initializing demo database: {db}")
                 try:
-                    graph_store = Neo4jPropertyGraphStore(
+                    self.databases[db] = self.create_database_entry(
+                        name=db,
                         url=os.getenv("NEO4J_URI"),
                         username=db,
                         password=db,
                         database=db,
-                        enhanced_schema=True,
-                        create_indexes=False,
-                        timeout=30,
                     )
-                    print(f"-> Getting corrector schema for {db} database.")
-                    corrector_schema = self.get_corrector_schema(graph_store)
-
-                    self.databases[db] = {
-                        "graph_store": graph_store,
-                        "corrector_schema": corrector_schema,
-                        "name": db,
-                    }
                 except Exception as ex:
                     print(ex)
 
         print(f"Loaded {len(self.databases)} databases.")
+        self.start_schema_revalidation()
 
     def load_databases_from_nacos(self, overrides: Optional[Dict[str, Any]] = None):
         """
@@ -432,30 +431,22 @@ class ResourceManager:
                 uri = f"{neo4j_scheme}://{host}:{port}"
                 print(f"-> 注册 Nacos Neo4j 数据库: name={name}, uri={uri}, database={database_name}")
 
-                graph_store = Neo4jPropertyGraphStore(
+                # 使用 name 作为对外暴露的数据库名称键
+                self.databases[name] = self.create_database_entry(
+                    name=name,
                     url=uri,
                     username=user,
                     password=pwd,
                     database=database_name,
-                    enhanced_schema=True,
-                    create_indexes=False,
-                    timeout=30,
                 )
-                corrector_schema = self.get_corrector_schema(graph_store)
-
-                # 使用 name 作为对外暴露的数据库名称键
-                self.databases[name] = {
-                    "graph_store": graph_store,
-                    "corrector_schema": corrector_schema,
-                    "name": name,
-                    "id": ds_id,
-                }
+                self.databases[name]["id"] = ds_id
                 loaded += 1
             except Exception as e:
                 print(f"[WARN] 注册数据源失败: {ds}: {e}")
                 continue
 
         print(f"-> 从 Nacos 加载 Neo4j 数据库数量: {loaded}")
+        self.start_schema_revalidation()
 
     def init_embed_model(self):
         import os
@@ -530,6 +521,83 @@ class ResourceManager:
             return self.databases.get(name)
         return None
 
+    def create_database_entry(
+        self, name: str, url: str, username: str, password: str, database: str
+    ) -> Dict[str, Any]:
+        """
+        Creates the database entry, loading the schema from the local snapshot when one exists.
+        Snapshots are revalidated in the background by start_schema_revalidation.
+        `schema_version` changes whenever the schema of the entry is updated, so pooled
+        workflow instances built from the old schema are rebuilt.
+        """
+        snapshot = load_schema_snapshot(url, database)
+        CACHE_LOOKUPS.inc(cache="schema_snapshot", result="hit" if snapshot else "miss")
+        graph_store = SharedNeo4jPropertyGraphStore(
+            url=url,
+            username=username,
+            password=password,
+            database=database,
+            refresh_schema=snapshot is None,
+            enhanced_schema=True,
+            create_indexes=False,
+            timeout=30,
+        )
+        entry = {"graph_store": graph_store, "name": name, "schema_version": 0}
+        if snapshot:
+            print(f"-> 从本地快照加载 {name} 数据库的 schema")
+            graph_store.structured_schema = snapshot["structured_schema"]
+            entry["corrector_schema"] = [Schema(*el) for el in snapshot["corrector_schema"]]
+            self._pending_schema_checks.append((entry, snapshot.get("fingerprint")))
+        else:
+            print(f"-> Getting corrector schema for {name} database.")
+            self._update_schema_snapshot(entry)
+        return entry
+
+    def _update_schema_snapshot(self, entry: Dict[str, Any], fingerprint: Optional[str] = None):
+        """根据 graph_store 当前的 schema 更新条目并写入快照"""
+        graph_store = entry["graph_store"]
+        if fingerprint is None:
+            try:
+                fingerprint = query_schema_fingerprint(graph_store)
+            except Exception as e:
+                # 没有指纹的快照在下次启动时总会重新内省
+                print(f"[WARN] 计算 {entry['name']} 的 schema 指纹失败: {e}")
+        entry["corrector_schema"] = self.get_corrector_schema(graph_store)
+        # 已缓存的工作流实例按版本号判断是否需要重建
+        entry["schema_version"] = entry.get("schema_version", 0) + 1
+        save_schema_snapshot(
+            graph_store.url,
+            graph_store._database,
+            graph_store.structured_schema,
+            entry["corrector_schema"],
+            fingerprint,
+        )
+
+    def start_schema_revalidation(self):
+        """
+        后台用 db.schema.* 过程计算 schema 指纹（属性与类型、关系模式），与快照不同时
+        才完整重新内省并更新条目和快照；启动时请求直接使用快照，不等待校验
+        """
+        pending, self._pending_schema_checks = self._pending_schema_checks, []
+        if not pending:
+            return
+
+        def _revalidate():
+            for entry, fingerprint in pending:
+                try:
+                    graph_store = entry["graph_store"]
+                    current = query_schema_fingerprint(graph_store)
+                    if current == fingerprint:
+                        print(f"-> {entry['name']} 的 schema 快照仍然有效")
+                        continue
+                    print(f"-> {entry['name']} 的 schema 已变化，重新内省并更新快照")
+                    graph_store.refresh_schema()
+                    self._update_schema_snapshot(entry, current)
+                except Exception as e:
+                    print(f"[WARN] 校验 {entry['name']} 的 schema 快照失败: {e}")
+
+        threading.Thread(target=_revalidate, name="schema-revalidation", daemon=True).start()
+
     def get_corrector_schema(
         self, graph_store: Neo4jPropertyGraphStore
     ) -> list[Schema]:
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# 数据库模式快照缓存配置
+SCHEMA_CACHE_ENABLED = os.getenv("SCHEMA_CACHE_ENABLED", "true").lower() == "true"
+SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", ".schema_cache")
+
+_write_lock = threading.Lock()
+
+
+def _snapshot_path(url: str, database: str) -> str:
+    digest = hashlib.sha256(f"{url}|{database}".encode("utf-8")).hexdigest()[:16]
+    safe_database = "".join(c if c.isalnum() else "_" for c in str(database))
+    return os.path.join(SCHEMA_CACHE_DIR, f"{safe_database}-{digest}.json")
+
+
+# 指纹查询：db.schema.* 过程返回各标签/关系类型的属性与类型以及关系模式，
+# 不做完整内省中的 APOC 采样和取值统计
+_FINGERPRINT_QUERIES = {
+    "node_props": (
+        "CALL db.schema.nodeTypeProperties() YIELD nodeLabels, propertyName, propertyTypes "
+        "RETURN nodeLabels AS labels, propertyName AS property, propertyTypes AS types"
+    ),
+    "rel_props": (
+        "CALL db.schema.relTypeProperties() YIELD relType, propertyName, propertyTypes "
+        "RETURN relType AS type, propertyName AS property, propertyTypes AS types"
+    ),
+    "relationships": (
+        "CALL db.schema.visualization() YIELD relationships "
+        "UNWIND relationships AS rel "
+        "RETURN labels(startNode(rel)) AS start, type(rel) AS type, labels(endNode(rel)) AS end"
+    ),
+}
+
+
+def _normalize_row(row: Dict[str, Any]) -> str:
+    row = {
+        key: sorted(map(str, value)) if isinstance(value, list) else value
+        for key, value in row.items()
+    }
+    return json.dumps(row, sort_keys=True, default=str)
+
+
+def compute_schema_fingerprint(structure: Dict[str, List[Dict[str, Any]]]) -> str:
+    """
+    Hashes the rows of the fingerprint queries: the property names and types per node
+    label and relationship type, and the (start)-[type]->(end) patterns.
+    Row and list order do not matter.
+    """
+    normalized = {key: sorted(_normalize_row(row) for row in rows) for key, rows in structure.items()}
+    return hashlib.sha256(
+        json.dumps(normalized, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def query_schema_fingerprint(graph_store) -> str:
+    """
+    Fingerprint of the current database schema from the db.schema.* procedures.
+    Much cheaper than refresh_schema(), so a warm start only re-introspects when the
+    fingerprint differs from the snapshot.
+    """
+    structure = {
+        key: graph_store.structured_query(query) for key, query in _FINGERPRINT_QUERIES.items()
+    }
+    return compute_schema_fingerprint(structure)
+
+
+def load_schema_snapshot(url: str, database: str) -> Optional[Dict[str, Any]]:
+    """读取本地模式快照，不存在或损坏时返回 None"""
+    if not SCHEMA_CACHE_ENABLED:
+        return None
+    path = _snapshot_path(url, database)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"[WARN] 读取模式快照失败 {path}: {e}")
+        return None
+
+
+def save_schema_snapshot(
+    url: str,
+    database: str,
+    structured_schema: Dict[str, Any],
+    corrector_schema: List[Any],
+    fingerprint: Optional[str],
+):
+    """写入本地模式快照（先写临时文件再替换，避免读到半个文件）"""
+    if not SCHEMA_CACHE_ENABLED:
+        return
+    snapshot = {
+        "url": url,
+        "database": database,
+        "fingerprint": fingerprint,
+        "created_at": time.time(),
+        "structured_schema": structured_schema,
+        "corrector_schema": [list(el) for el in corrector_schema],
+    }
+    path = _snapshot_path(url, database)
+    with _write_lock:
+        try:
+            os.makedirs(SCHEMA_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"[WARN] 写入模式快照失败 {path}: {e}")
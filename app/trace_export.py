@@ -0,0 +1,221 @@
+"""
+OpenTelemetry-compatible export of request traces (OTLP/JSON, no SDK dependency).
+
+Each finished request becomes one root span with its stages, LLM calls and Neo4j
+transactions as child spans. Traces are queued and written by a background thread,
+either as OTLP/JSON lines to a local file (readable by the collector's otlpjsonfile
+receiver) or POSTed to an OTLP/HTTP collector endpoint.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+from cypher_workflows.shared.request_context import SPAN_SERVER, RequestTrace
+
+# 导出方式：none 不导出，file 写入 OTLP/JSON 文件，otlp 发送到 OTLP/HTTP 采集器
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "none").lower()
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE", "traces/otel_traces.jsonl")
+TRACE_EXPORT_ENDPOINT = os.getenv("TRACE_EXPORT_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "text2cypher-api")
+# 等待导出的请求数上限，队列满时丢弃
+TRACE_EXPORT_QUEUE_SIZE = int(os.getenv("TRACE_EXPORT_QUEUE_SIZE", "1000"))
+# 每次写入/发送合并的最大请求数
+TRACE_EXPORT_BATCH_SIZE = 50
+
+_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON 中 64 位整数以字符串表示
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"key": key, "value": _attribute_value(value)}
+        for key, value in values.items()
+        if value is not None
+    ]
+
+
+def _nanos(seconds: float) -> str:
+    return str(int(seconds * 1_000_000_000))
+
+
+def _otlp_span(trace_id: str, span: Dict[str, Any]) -> Dict[str, Any]:
+    otlp = {
+        "traceId": trace_id,
+        "spanId": span["span_id"],
+        "name": span["name"],
+        "kind": _SPAN_KINDS.get(span["kind"], 1),
+        "startTimeUnixNano": _nanos(span["start"]),
+        "endTimeUnixNano": _nanos(span["start"] + span["duration"]),
+        "attributes": _attributes(span["attributes"]),
+        "status": {"code": _STATUS_ERROR if span["error"] else _STATUS_OK},
+    }
+    if span.get("parent_span_id"):
+        otlp["parentSpanId"] = span["parent_span_id"]
+    return otlp
+
+
+def build_trace_spans(
+    trace: RequestTrace, outcome: str, end: float, error: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """OTLP spans of one request: the root span followed by its child spans."""
+    labels = trace.labels
+    root = {
+        "span_id": trace.span_id,
+        "parent_span_id": None,
+        "name": f"workflow {labels.get('workflow', '')}",
+        "kind": SPAN_SERVER,
+        "start": trace.start,
+        "duration": max(end - trace.start, 0.0),
+        "error": outcome != "success",
+        "attributes": {
+            "text2cypher.request_id": trace.trace_id,
+            "text2cypher.workflow": labels.get("workflow"),
+            "text2cypher.llm": labels.get("llm"),
+            "text2cypher.database": labels.get("database"),
+            "text2cypher.outcome": outcome,
+            "text2cypher.dropped_spans": trace.dropped_spans or None,
+            "error.message": error,
+        },
+    }
+    with trace._lock:
+        spans = list(trace.spans)
+    return [_otlp_span(trace.trace_id, span) for span in [root] + spans]
+
+
+def build_otlp_request(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ExportTraceServiceRequest in the OTLP/JSON encoding."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _attributes({"service.name": TRACE_SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": "text2cypher"}, "spans": spans}],
+            }
+        ]
+    }
+
+
+class TraceExporter:
+    """
+    Queues finished request traces and exports them from a background thread, so the
+    request path only converts the spans and enqueues them.
+    """
+
+    def __init__(self, mode: str = TRACE_EXPORT):
+        self.mode = mode
+        self._queue: "queue.Queue[Optional[List[Dict[str, Any]]]]" = queue.Queue(
+            TRACE_EXPORT_QUEUE_SIZE
+        )
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("file", "otlp")
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def export(self, trace: RequestTrace, outcome: str, error: Optional[str] = None):
+        if not self.enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(build_trace_spans(trace, outcome, time.time(), error))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout: float = 5.0):
+        """Exports the queued traces and stops the background thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < TRACE_EXPORT_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: List[List[Dict[str, Any]]]):
+        payload = build_otlp_request([span for spans in batch for span in spans])
+        try:
+            if self.mode == "file":
+                directory = os.path.dirname(TRACE_EXPORT_FILE)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(TRACE_EXPORT_FILE, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(payload, ensure_ascii=False, default=str) + "\n")
+            else:
+                request = urllib.request.Request(
+                    TRACE_EXPORT_ENDPOINT,
+                    data=json.dumps(payload, default=str).encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+            self.exported += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"[WARN] 追踪导出失败（{self.mode}）: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "exported_traces": self.exported,
+            "dropped_traces": self.dropped,
+            "failed_traces": self.failed,
+            "queued_traces": self._queue.qsize(),
+        }
+
+
+# 全局追踪导出器实例
+trace_exporter = TraceExporter()
+
+
+def get_trace_exporter() -> TraceExporter:
+    return trace_exporter
@@ -0,0 +1,208 @@
+"""
+Rotating, gzip-compressed JSONL store for LLM interactions and workflow runs, plus
+streaming queries over its segments.
+
+Command line:
+    python -m app.trace_store query --since 2026-10-01T00:00 --workflow naive_text2cypher
+    python -m app.trace_store aggregate --group-by llm --event run
+"""
+import argparse
+import gzip
+import json
+import logging.handlers
+import os
+import shutil
+import sys
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from cypher_workflows.shared.step_timing import LatencyHistogram
+
+# 当前写入的 JSONL 文件，轮转后的分段为 <文件>.1.gz、<文件>.2.gz ...（数字越大越旧）
+LLM_TRACE_FILE = os.getenv("LLM_TRACE_FILE", "traces/llm_interactions.jsonl")
+# 单个分段的大小上限（MB）与保留的分段数
+LLM_TRACE_SEGMENT_MB = float(os.getenv("LLM_TRACE_SEGMENT_MB", "50"))
+LLM_TRACE_MAX_SEGMENTS = int(os.getenv("LLM_TRACE_MAX_SEGMENTS", "20"))
+
+FILTER_FIELDS = ("request_id", "event", "workflow", "llm", "database", "step")
+GROUP_FIELDS = ("workflow", "llm", "database", "event", "step", "outcome")
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def create_trace_handler(path: str = LLM_TRACE_FILE) -> logging.Handler:
+    """Size-rotated file handler whose rotated segments are gzip-compressed."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=int(LLM_TRACE_SEGMENT_MB * 1024 * 1024),
+        backupCount=LLM_TRACE_MAX_SEGMENTS,
+        encoding="utf-8",
+    )
+    handler.namer = _gzip_namer
+    handler.rotator = _gzip_rotator
+    return handler
+
+
+def list_segments(path: str = LLM_TRACE_FILE) -> List[str]:
+    """Segments from oldest to newest, ending with the file currently written."""
+    segments = []
+    for i in range(LLM_TRACE_MAX_SEGMENTS, 0, -1):
+        for name in (f"{path}.{i}.gz", f"{path}.{i}"):
+            if os.path.exists(name):
+                segments.append(name)
+                break
+    if os.path.exists(path):
+        segments.append(path)
+    return segments
+
+
+def _open_segment(name: str):
+    if name.endswith(".gz"):
+        return gzip.open(name, "rt", encoding="utf-8")
+    return open(name, "r", encoding="utf-8")
+
+
+def _parse_time(value: Optional[str]) -> Optional[str]:
+    """Normalises a time filter to the ISO format of the records' "ts" field."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value).isoformat(timespec="milliseconds")
+
+
+def iter_records(
+    path: str = LLM_TRACE_FILE,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    **filters: Optional[str],
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the records of all segments in time order, keeping those whose "ts" lies in
+    [since, until) and whose fields equal the given filters (request_id, event, workflow,
+    llm, database, step). Lines that are not valid JSON are skipped.
+    """
+    since, until = _parse_time(since), _parse_time(until)
+    filters = {key: value for key, value in filters.items() if value}
+    for segment in list_segments(path):
+        try:
+            with _open_segment(segment) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    ts = record.get("ts", "")
+                    if since and ts < since:
+                        continue
+                    if until and ts >= until:
+                        continue
+                    if any(str(record.get(key)) != value for key, value in filters.items()):
+                        continue
+                    yield record
+        except (OSError, EOFError) as e:
+            # 分段可能在读取时被轮转或删除
+            print(f"[WARN] 读取追踪分段失败 {segment}: {e}", file=sys.stderr)
+
+
+def _record_tokens(record: Dict[str, Any]) -> Dict[str, float]:
+    usage = record.get("usage") or {}
+    return {
+        "tokens": sum(step.get("tokens", 0) for step in usage.values()),
+        "cost": sum(step.get("cost", 0.0) or 0.0 for step in usage.values()),
+    }
+
+
+def aggregate_records(
+    records: Iterable[Dict[str, Any]], group_by: Iterable[str] = ("workflow",)
+) -> List[Dict[str, Any]]:
+    """
+    Count, latency percentiles (from "duration_ms"), tokens and estimated cost per group.
+    Latencies go into fixed-bucket histograms, so memory stays bounded for any number of records.
+    """
+    group_by = tuple(group_by)
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for record in records:
+        key = tuple(str(record.get(field, "")) for field in group_by)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "count": 0,
+                "errors": 0,
+                "tokens": 0,
+                "cost": 0.0,
+                "latency": LatencyHistogram(),
+            }
+        group["count"] += 1
+        if record.get("outcome") not in (None, "success") or record.get("level") in ("WARNING", "ERROR"):
+            group["errors"] += 1
+        if record.get("duration_ms") is not None:
+            group["latency"].observe(float(record["duration_ms"]))
+        totals = _record_tokens(record)
+        group["tokens"] += totals["tokens"]
+        group["cost"] += totals["cost"]
+
+    results = []
+    for key, group in sorted(groups.items()):
+        latency = group.pop("latency").snapshot()
+        results.append(
+            {
+                **dict(zip(group_by, key)),
+                **group,
+                "cost": round(group["cost"], 6),
+                **{k: latency[k] for k in ("avg_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")},
+            }
+        )
+    return results
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.trace_store",
+        description="Query the LLM interaction / workflow trace segments.",
+    )
+    parser.add_argument("command", choices=("query", "aggregate"))
+    parser.add_argument("--path", default=LLM_TRACE_FILE, help="current trace file")
+    parser.add_argument("--since", help="ISO time, inclusive")
+    parser.add_argument("--until", help="ISO time, exclusive")
+    for field in FILTER_FIELDS:
+        parser.add_argument(f"--{field.replace('_', '-')}", dest=field)
+    parser.add_argument("--limit", type=int, default=0, help="query: maximum records (0 = all)")
+    parser.add_argument(
+        "--group-by",
+        default="workflow",
+        help=f"aggregate: comma-separated fields out of {', '.join(GROUP_FIELDS)}",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = _build_parser().parse_args(argv)
+    records = iter_records(
+        args.path,
+        since=args.since,
+        until=args.until,
+        **{field: getattr(args, field) for field in FILTER_FIELDS},
+    )
+    if args.command == "query":
+        for count, record in enumerate(records, 1):
+            print(json.dumps(record, ensure_ascii=False))
+            if args.limit and count >= args.limit:
+                break
+    else:
+        group_by = [field.strip() for field in args.group_by.split(",") if field.strip()]
+        for row in aggregate_records(records, group_by):
+            print(json.dumps(row, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,287 @@
+import atexit
+import hashlib
 import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
 from datetime import datetime
 from typing import Any, Dict, List
 
 from fastapi import Request
 from jinja2 import pass_context
 
+from app.trace_store import LLM_TRACE_FILE, create_trace_handler
+from cypher_workflows.shared.request_context import get_request_labels, get_request_trace
 
-# 配置日志
+
+# 配置日志（其他模块的日志只输出到控制台，LLM 交互日志由 LLMLogger 异步写入追踪存储）
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('llm_interactions.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    handlers=[logging.StreamHandler()]
 )
 
+# LLM 交互日志配置
+# 日志级别：DEBUG 记录全部，INFO 记录提示词/回应/工作流步骤，WARNING 只记录错误步骤
+LLM_LOG_LEVEL = os.getenv("LLM_LOG_LEVEL", "INFO").upper()
+# 控制台输出：none 不输出，summary 每条记录一行摘要，full 输出完整 JSON
+LLM_LOG_CONSOLE = os.getenv("LLM_LOG_CONSOLE", "summary").lower()
+# 记录提示词、回应与步骤的采样比例（按请求ID哈希，同一请求的记录一起采样），错误和运行汇总始终记录
+LLM_LOG_SAMPLE_RATE = float(os.getenv("LLM_LOG_SAMPLE_RATE", "1.0"))
+# 是否记录提示词/回应正文，关闭时只记录长度等元数据
+LLM_LOG_BODIES = os.getenv("LLM_LOG_BODIES", "true").lower() == "true"
+# 单个正文或上下文字段的最大字符数
+LLM_LOG_MAX_BODY_CHARS = int(os.getenv("LLM_LOG_MAX_BODY_CHARS", "4000"))
+# 内存队列上限，写入跟不上时丢弃新记录而不阻塞请求
+LLM_LOG_QUEUE_SIZE = int(os.getenv("LLM_LOG_QUEUE_SIZE", "10000"))
+# 需要脱敏的上下文字段名（逗号分隔）
+LLM_LOG_REDACT_KEYS = {
+    key.strip().lower()
+    for key in os.getenv(
+        "LLM_LOG_REDACT_KEYS", "password,api_key,apikey,token,secret,authorization"
+    ).split(",")
+    if key.strip()
+}
+# 正文中需要脱敏的模式：API key、Bearer token、key=value 形式的凭据
+_REDACT_PATTERNS = [
+    (re.compile(r"\b(sk|pk|ak)-[A-Za-z0-9_\-]{8,}"), "[REDACTED]"),
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9._\-]+", re.IGNORECASE), r"\1[REDACTED]"),
+    (
+        re.compile(r"((?:password|api_key|apikey|secret|token)[\"']?\s*[:=]\s*[\"']?)[^\s\"',}]+", re.IGNORECASE),
+        r"\1[REDACTED]",
+    ),
+]
+
+
+def _redact(text: str) -> str:
+    for pattern, replacement in _REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _limit(text: str) -> str:
+    if len(text) <= LLM_LOG_MAX_BODY_CHARS:
+        return text
+    return f"{text[:LLM_LOG_MAX_BODY_CHARS]}…(+{len(text) - LLM_LOG_MAX_BODY_CHARS} chars)"
+
+
+def _to_loggable(value: Any, key: str = "") -> Any:
+    """Redacted, size-limited JSON-compatible copy of a log payload value."""
+    if key.lower() in LLM_LOG_REDACT_KEYS:
+        return "[REDACTED]"
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _to_loggable(v, str(k)) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) == 2 and isinstance(value[0], str) and key == "message":
+            return {"role": value[0], "content": _to_loggable(value[1])}
+        return [_to_loggable(v, "message" if key == "prompt" else "") for v in value]
+    role = getattr(value, "role", None)
+    content = getattr(value, "content", None)
+    if role is not None and content is not None:
+        # ChatMessage
+        return {"role": str(getattr(role, "value", role)), "content": _to_loggable(content)}
+    return _limit(_redact(str(value)))
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats the structured payload of a record as one JSON line (in the listener thread)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = getattr(record, "payload", None) or {"message": record.getMessage()}
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            **_to_loggable(payload),
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SummaryFormatter(logging.Formatter):
+    """One short console line per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = getattr(record, "payload", None) or {}
+        parts = [
+            datetime.fromtimestamp(record.created).strftime("%H:%M:%S"),
+            record.levelname,
+            payload.get("event", ""),
+            f"#{payload['interaction']}" if payload.get("interaction") else "",
+            str(payload.get("step", "")),
+            str(payload.get("message", "")),
+        ]
+        for key in ("prompt_chars", "response_chars"):
+            if key in payload:
+                parts.append(f"{key}={payload[key]}")
+        return " ".join(part for part in parts if part)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread unformatted; drops them when the queue is
+    full instead of blocking the request.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def _setup_llm_log_handlers(logger: logging.Logger):
+    handlers = []
+    if LLM_TRACE_FILE:
+        # 按大小轮转、gzip 压缩的 JSONL 分段，可用 python -m app.trace_store 查询
+        file_handler = create_trace_handler(LLM_TRACE_FILE)
+        file_handler.setFormatter(JsonLinesFormatter())
+        handlers.append(file_handler)
+    if LLM_LOG_CONSOLE in ("summary", "full"):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(
+            SummaryFormatter() if LLM_LOG_CONSOLE == "summary" else JsonLinesFormatter()
+        )
+        handlers.append(console_handler)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LLM_LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    logger.setLevel(getattr(logging, LLM_LOG_LEVEL, logging.INFO))
+    logger.propagate = False
+    listener.start()
+    # 退出时把队列中剩余的记录写完
+    atexit.register(listener.stop)
+    return listener
+
+
 class LLMLogger:
-    """LLM交互日志记录器"""
+    """
+    LLM交互日志记录器：调用方只构造一个字典放入队列，脱敏、截断、JSON 序列化和写文件
+    都在后台线程中完成
+    """
     
     def __init__(self):
         self.logger = logging.getLogger('LLM_Logger')
+        # 所有请求的交互总数（统计用）；记录中的 interaction 是请求内的序号
         self.interaction_count = 0
-    
+        self._listener = None
+        if not self.logger.handlers:
+            self._listener = _setup_llm_log_handlers(self.logger)
+
+    @staticmethod
+    def _sampled(context: Dict[str, Any] = None) -> bool:
+        """
+        按请求ID哈希采样，同一请求的提示词、回应和步骤记录一起保留或丢弃；
+        请求之外的调用按问题哈希，两者都没有时随机采样
+        """
+        if LLM_LOG_SAMPLE_RATE >= 1:
+            return True
+        key = get_request_labels().get("request_id")
+        if key is None and isinstance(context, dict):
+            key = context.get("question")
+        if key is None:
+            return random.random() < LLM_LOG_SAMPLE_RATE
+        digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2**64 < LLM_LOG_SAMPLE_RATE
+
+    def _interaction(self, advance: bool = False) -> int:
+        """当前请求内的交互序号，请求之外退回全局计数"""
+        trace = get_request_trace()
+        if trace is None:
+            return self.interaction_count
+        return trace.next_interaction() if advance else trace.interaction
+
+    def _emit(self, level: int, payload: Dict[str, Any]):
+        # 带上当前请求的 request_id、workflow、llm、database，便于按请求筛选
+        payload = {**get_request_labels(), **payload}
+        self.logger.log(level, payload.get("event", ""), extra={"payload": payload})
+
     def log_prompt(self, step_name: str, prompt_content: Any, context: Dict[str, Any] = None):
         """记录发送给LLM的提示词"""
         self.interaction_count += 1
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        print(f"\n{'='*80}")
-        print(f"🔵 LLM交互 #{self.interaction_count} - {step_name}")
-        print(f"⏰ 时间: {timestamp}")
-        print(f"{'='*80}")
-        
-        if isinstance(prompt_content, list):
-            print("📤 发送给LLM的提示词:")
-            for i, msg in enumerate(prompt_content):
-                if isinstance(msg, tuple) and len(msg) == 2:
-                    role, content = msg
-                    print(f"\n--- {role.upper()} ---")
-                    print(content)
-                else:
-                    print(f"\n--- 消息 {i+1} ---")
-                    print(msg)
-        else:
-            print("📤 发送给LLM的提示词:")
-            print(prompt_content)
-        
-        if context:
-            print(f"\n📋 上下文信息:")
-            print(json.dumps(context, ensure_ascii=False, indent=2))
-        
-        print(f"{'='*80}\n")
-        
-        # 同时记录到日志文件
-        self.logger.info(f"LLM交互 #{self.interaction_count} - {step_name} - 提示词已发送")
+        interaction = self._interaction(advance=True)
+        if not self.logger.isEnabledFor(logging.INFO) or not self._sampled(context):
+            return
+        payload = {
+            "event": "prompt",
+            "interaction": interaction,
+            "step": step_name,
+            "prompt_chars": sum(len(str(getattr(m, "content", m))) for m in prompt_content)
+            if isinstance(prompt_content, list)
+            else len(str(prompt_content)),
+        }
+        if LLM_LOG_BODIES:
+            payload["prompt"] = prompt_content
+            payload["context"] = context
+        self._emit(logging.INFO, payload)
     
     def log_response(self, step_name: str, response_content: str, context: Dict[str, Any] = None):
         """记录LLM的完整回应"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        print(f"\n{'='*80}")
-        print(f"🟢 LLM回应 #{self.interaction_count} - {step_name}")
-        print(f"⏰ 时间: {timestamp}")
-        print(f"{'='*80}")
-        print("📥 LLM完整回应:")
-        print(response_content)
-        
-        if context:
-            print(f"\n📋 上下文信息:")
-            print(json.dumps(context, ensure_ascii=False, indent=2))
-        
-        print(f"{'='*80}\n")
-        
-        # 同时记录到日志文件
-        self.logger.info(f"LLM交互 #{self.interaction_count} - {step_name} - 回应已接收")
+        if not self.logger.isEnabledFor(logging.INFO) or not self._sampled(context):
+            return
+        payload = {
+            "event": "response",
+            "interaction": self._interaction(),
+            "step": step_name,
+            "response_chars": len(response_content or ""),
+        }
+        if LLM_LOG_BODIES:
+            payload["response"] = response_content
+        self._emit(logging.INFO, payload)
     
     def log_workflow_step(self, step_name: str, message: str, data: Any = None):
         """记录工作流步骤信息"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        print(f"\n{'='*60}")
-        print(f"🔄 工作流步骤: {step_name}")
-        print(f"⏰ 时间: {timestamp}")
-        print(f"💬 消息: {message}")
-        
-        if data:
-            print(f"📊 数据:")
-            if isinstance(data, str):
-                print(data)
-            else:
-                print(json.dumps(data, ensure_ascii=False, indent=2))
-        
-        print(f"{'='*60}\n")
-        
-        # 同时记录到日志文件
-        self.logger.info(f"工作流步骤: {step_name} - {message}")
+        # 错误步骤不受采样影响
+        level = logging.WARNING if "错误" in step_name else logging.INFO
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not self._sampled(data if isinstance(data, dict) else None):
+            return
+        self._emit(
+            level,
+            {"event": "workflow_step", "step": step_name, "message": message, "data": data},
+        )
+
+    def log_run(
+        self,
+        labels: Dict[str, Any],
+        outcome: str,
+        duration: float,
+        result: Any = None,
+        error: str = None,
+    ):
+        """记录一次工作流运行的汇总（耗时、各步骤模型与 token、各阶段耗时），不参与采样"""
+        if not self.logger.isEnabledFor(logging.WARNING if error else logging.INFO):
+            return
+        result = result if isinstance(result, dict) else {}
+        timings = result.get("step_timings") or {}
+        self._emit(
+            logging.WARNING if error else logging.INFO,
+            {
+                **labels,
+                "event": "run",
+                "outcome": outcome,
+                "duration_ms": round(duration * 1000, 3),
+                "usage": result.get("step_usage"),
+                "stages": timings.get("stages"),
+                "error": error,
+            },
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "interactions": self.interaction_count,
+            "dropped_records": NonBlockingQueueHandler.dropped,
+            "sample_rate": LLM_LOG_SAMPLE_RATE,
+        }
 
 # 全局LLM日志记录器实例
 llm_logger = LLMLogger()
@@ -106,9 +291,9 @@ def get_llm_logger() -> LLMLogger:
     return llm_logger
 
 
-def get_optimized_schema(graph_store, exclude_types: List[str] = None) -> str:
+def get_schema_elements(graph_store, exclude_types: List[str] = None):
     """
-    获取优化的schema信息，只包含node_props和relationships
+    获取过滤后的schema元素：(节点标签 -> 属性名列表, 关系列表)
     过滤掉Entity标签和其他不需要的信息
     """
     if exclude_types is None:
@@ -160,7 +345,12 @@ def get_optimized_schema(graph_store, exclude_types: List[str] = None) -> str:
             end not in exclude_types and 
             rel_type not in exclude_types):
             filtered_relationships.append(rel)
-    
+
+    return filtered_node_props, filtered_relationships
+
+
+def format_optimized_schema(filtered_node_props, filtered_relationships) -> str:
+    """把schema元素格式化为提示词中使用的schema字符串"""
     # 格式化输出
     node_props_str = []
     for node_type, props in filtered_node_props.items():
@@ -192,6 +382,14 @@ def get_optimized_schema(graph_store, exclude_types: List[str] = None) -> str:
     return "\n".join(schema_parts)
 
 
+def get_optimized_schema(graph_store, exclude_types: List[str] = None) -> str:
+    """
+    获取优化的schema信息，只包含node_props和relationships
+    过滤掉Entity标签和其他不需要的信息
+    """
+    return format_optimized_schema(*get_schema_elements(graph_store, exclude_types))
+
+
 # force HTTPS in jinja templates
 @pass_context
 def urlx_for(
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from llama_index.core.workflow import Workflow
+from llama_index.core.workflow.errors import WorkflowTimeoutError
+
+from app.resource_manager import ResourceManager
+from app.settings import WORKFLOW_MAP
+from cypher_workflows.shared.metrics import CACHE_LOOKUPS
+from cypher_workflows.shared.speculative import get_candidate_llms
+
+# 启动时是否为所有 (工作流, LLM, 数据库) 组合预先创建实例
+WORKFLOW_POOL_WARMUP = os.getenv("WORKFLOW_POOL_WARMUP", "false").lower() == "true"
+
+
+class RunTimeout:
+    """
+    Request timeout of one workflow run. Pooled instances are shared by requests with
+    different timeouts and are built without a workflow timeout, so the run is cancelled
+    here once the timeout elapses; `check` turns the resulting error into a timeout error.
+    """
+
+    def __init__(self, handler, timeout: Optional[float]):
+        self.timeout = timeout
+        self.expired = False
+        self._cancel_task = None
+        self._timer = (
+            asyncio.get_running_loop().call_later(timeout, self._expire, handler)
+            if timeout
+            else None
+        )
+
+    def _expire(self, handler):
+        self.expired = True
+        self._cancel_task = asyncio.ensure_future(handler.cancel_run())
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def check(self, error: Exception):
+        """Raises WorkflowTimeoutError instead of `error` when the run was cancelled by the timeout."""
+        if self.expired:
+            raise WorkflowTimeoutError(f"Operation timed out after {self.timeout} seconds") from error
+
+
+class WorkflowPool:
+    """
+    Reusable workflow instances per (workflow type, llm, database).
+    Workflows keep per-run state in Context only, so one instance serves concurrent runs;
+    construction (fewshot managers, schema introspection) happens once instead of per request.
+    The request timeout is not part of the key: it is enforced per run by RunTimeout, and
+    the deadline for Neo4j transactions travels in the run context.
+    """
+
+    def __init__(self, resource_manager: ResourceManager):
+        self.resource_manager = resource_manager
+        self._instances: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(
+        self,
+        workflow_type: str,
+        llm_name: str,
+        database_name: str,
+    ) -> Workflow:
+        """获取可复用的工作流实例，不存在或数据库已重新注册时创建"""
+        workflow_class = WORKFLOW_MAP.get(workflow_type)
+        if not workflow_class:
+            raise ValueError(f"Workflow '{workflow_type}' is not recognized.")
+
+        selected_llm = self.resource_manager.get_model_by_name(llm_name)
+        if not selected_llm:
+            raise ValueError(f"LLM '{llm_name}' not found.")
+
+        selected_database = self.resource_manager.get_database_by_name(database_name)
+        if not selected_database:
+            raise ValueError(f"Database '{database_name}' not found.")
+
+        key = (workflow_type, llm_name, database_name)
+        with self._lock:
+            entry = self._instances.get(key)
+            # Nacos 刷新后数据库对象会被替换、schema 更新后版本号会变化，此时重建实例
+            if (
+                entry
+                and entry["database"] is selected_database
+                and entry["schema_version"] == selected_database.get("schema_version")
+                and entry["llm"] is selected_llm
+            ):
+                self.stats["hits"] += 1
+                CACHE_LOOKUPS.inc(cache="workflow_pool", result="hit")
+                return entry["workflow"]
+
+            self.stats["misses"] += 1
+            CACHE_LOOKUPS.inc(cache="workflow_pool", result="miss")
+            workflow_instance = workflow_class(
+                llm=selected_llm,
+                db=selected_database,
+                embed_model=self.resource_manager.embed_model,
+                timeout=None,
+            )
+            # 支持推测式生成的工作流使用按 SPECULATIVE_LLMS 配置的候选模型
+            if hasattr(workflow_instance, "candidate_llms"):
+                workflow_instance.candidate_llms = get_candidate_llms(
+                    selected_llm, self.resource_manager.llms
+                )
+            self._instances[key] = {
+                "workflow": workflow_instance,
+                "database": selected_database,
+                "schema_version": selected_database.get("schema_version"),
+                "llm": selected_llm,
+            }
+            return workflow_instance
+
+    def warm_up(self):
+        """为所有组合预先创建工作流实例"""
+        for workflow_type in WORKFLOW_MAP:
+            for llm_name, _ in self.resource_manager.llms:
+                for database_name in list(self.resource_manager.databases):
+                    try:
+                        self.get(workflow_type, llm_name, database_name)
+                    except Exception as e:
+                        print(f"[WARN] 预创建工作流实例失败 {workflow_type}/{llm_name}/{database_name}: {e}")
+        print(f"-> 已预创建 {len(self._instances)} 个工作流实例")
+
+    def clear(self):
+        with self._lock:
+            self._instances.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "instances": len(self._instances)}
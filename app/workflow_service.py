@@ -1,18 +1,55 @@
 import json
+import time
 import asyncio
 from typing import Dict, Any, List, Optional, AsyncGenerator
 from datetime import datetime
 from llama_index.core.workflow import Workflow
 
 from app.resource_manager import ResourceManager
+from app.trace_export import get_trace_exporter
 from app.settings import WORKFLOW_MAP
 from app.api_models import WorkflowExecuteResponse, WorkflowEvent
 from app.utils import get_llm_logger
+from app.workflow_pool import WORKFLOW_POOL_WARMUP, RunTimeout, WorkflowPool
+from cypher_workflows.shared.metrics import (
+    BATCH_QUEUE_DEPTH,
+    INFLIGHT_REQUESTS,
+    REQUEST_DURATION,
+    REQUESTS,
+)
+from cypher_workflows.shared.request_context import RequestTrace, current_request, request_scope
+from cypher_workflows.shared.step_timing import new_request_id
+
+
+# 请求中未知的工作流、LLM、数据库名称统一记为该值，避免任意字符串产生新的指标序列
+UNKNOWN_LABEL = "unknown"
+
+
+def _record_request(labels: Dict[str, str], outcome: str, start: float):
+    REQUESTS.inc(outcome=outcome, **labels)
+    REQUEST_DURATION.observe(time.perf_counter() - start, outcome=outcome, **labels)
 
 
 class WorkflowService:
     def __init__(self, resource_manager: ResourceManager):
         self.resource_manager = resource_manager
+        self.workflow_pool = WorkflowPool(resource_manager)
+        if WORKFLOW_POOL_WARMUP:
+            self.workflow_pool.warm_up()
+
+    def _metric_labels(
+        self, workflow_type: str, llm_name: str, database_name: str
+    ) -> Dict[str, str]:
+        """指标与追踪标签：只使用已配置的名称，其余记为 unknown"""
+        return {
+            "workflow": workflow_type if workflow_type in WORKFLOW_MAP else UNKNOWN_LABEL,
+            "llm": llm_name if self.resource_manager.get_model_by_name(llm_name) else UNKNOWN_LABEL,
+            "database": (
+                database_name
+                if database_name in self.resource_manager.databases
+                else UNKNOWN_LABEL
+            ),
+        }
 
     async def execute_workflow(
         self,
@@ -22,12 +59,24 @@ class WorkflowService:
         input_text: str,
         context: Dict[str, Any] = None,
         timeout: int = 60,
-        prompt_config: Dict[str, Any] = None
+        prompt_config: Dict[str, Any] = None,
+        step_models: Dict[str, str] = None,
+        template_answers: Optional[bool] = None
     ) -> Any:
         """执行单个工作流"""
         # 获取日志记录器
         logger = get_llm_logger()
-        
+        metric_labels = self._metric_labels(workflow_type, llm_name, database_name)
+        # 本次请求的追踪上下文，工作流内的日志、span、LLM 调用和 Neo4j 事务都带上 request_id
+        span_labels = {"request_id": new_request_id(), **metric_labels}
+        trace = RequestTrace(span_labels)
+        request_token = current_request.set(trace)
+        start = time.perf_counter()
+        outcome = "error"
+        result = None
+        error = None
+        INFLIGHT_REQUESTS.inc(mode="execute")
+
         try:
             # 记录工作流开始
             logger.log_workflow_step(
@@ -42,19 +91,10 @@ class WorkflowService:
                 }
             )
             
-            # 获取工作流类
-            workflow_class = WORKFLOW_MAP.get(workflow_type)
-            if not workflow_class:
-                raise ValueError(f"Workflow '{workflow_type}' is not recognized.")
-
-            # 获取LLM和数据库
-            selected_llm = self.resource_manager.get_model_by_name(llm_name)
-            if not selected_llm:
-                raise ValueError(f"LLM '{llm_name}' not found.")
-
-            selected_database = self.resource_manager.get_database_by_name(database_name)
-            if not selected_database:
-                raise ValueError(f"Database '{database_name}' not found.")
+            # 获取复用的工作流实例（按工作流类型、LLM、数据库缓存）
+            workflow_instance = self.workflow_pool.get(
+                workflow_type, llm_name, database_name
+            )
 
             # 准备上下文
             if context is None:
@@ -62,22 +102,41 @@ class WorkflowService:
             
             # 添加输入文本到上下文
             context["input"] = input_text
+
+            # 请求截止时间，工作流内的Neo4j查询以剩余时间作为事务超时
+            if timeout:
+                context["deadline"] = time.time() + timeout
             
             # 添加提示词配置到上下文
             if prompt_config:
                 context["prompt_config"] = prompt_config
 
-            # 创建工作流实例
-            workflow_instance = workflow_class(
-                llm=selected_llm,
-                db=selected_database,
-                embed_model=self.resource_manager.embed_model,
-                timeout=timeout,
-            )
+            # 按步骤指定的模型
+            if step_models:
+                context["step_models"] = step_models
 
-            # 执行工作流
+            # 是否对简单结果使用模板答案
+            if template_answers is not None:
+                context["template_answers"] = template_answers
+
+            # 各步骤计时 span 的标签（请求ID、工作流、LLM、数据库）
+            context["span_labels"] = span_labels
+
+            # 执行工作流，超时后取消本次运行
             handler = workflow_instance.run(**context)
-            result = await handler
+            run_timeout = RunTimeout(handler, timeout)
+            try:
+                result = await handler
+            except asyncio.CancelledError:
+                # 上层取消时主动取消工作流，进而中止正在运行的Neo4j事务
+                outcome = "cancelled"
+                await handler.cancel_run()
+                raise
+            except Exception as e:
+                run_timeout.check(e)
+                raise
+            finally:
+                run_timeout.cancel()
             
             # 记录工作流完成
             logger.log_workflow_step(
@@ -89,9 +148,11 @@ class WorkflowService:
                 }
             )
 
+            outcome = "success"
             return result
 
         except Exception as e:
+            error = str(e)
             # 记录工作流错误
             logger.log_workflow_step(
                 "工作流错误", 
@@ -102,6 +163,12 @@ class WorkflowService:
                 }
             )
             raise Exception(f"Workflow execution failed: {str(e)}")
+        finally:
+            INFLIGHT_REQUESTS.dec(mode="execute")
+            _record_request(metric_labels, outcome, start)
+            logger.log_run(span_labels, outcome, time.perf_counter() - start, result, error)
+            get_trace_exporter().export(trace, outcome, error)
+            current_request.reset(request_token)
 
     async def execute_workflow_stream(
         self,
@@ -111,23 +178,26 @@ class WorkflowService:
         input_text: str,
         context: Dict[str, Any] = None,
         timeout: int = 60,
-        prompt_config: Dict[str, Any] = None
+        prompt_config: Dict[str, Any] = None,
+        step_models: Dict[str, str] = None,
+        template_answers: Optional[bool] = None
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """流式执行工作流"""
+        logger = get_llm_logger()
+        metric_labels = self._metric_labels(workflow_type, llm_name, database_name)
+        span_labels = {"request_id": new_request_id(), **metric_labels}
+        trace = None
+        start = time.perf_counter()
+        # 客户端在结果返回前断开时生成器被关闭，按取消计数
+        outcome = "cancelled"
+        result = None
+        error = None
+        INFLIGHT_REQUESTS.inc(mode="stream")
         try:
-            # 获取工作流类
-            workflow_class = WORKFLOW_MAP.get(workflow_type)
-            if not workflow_class:
-                raise ValueError(f"Workflow '{workflow_type}' is not recognized.")
-
-            # 获取LLM和数据库
-            selected_llm = self.resource_manager.get_model_by_name(llm_name)
-            if not selected_llm:
-                raise ValueError(f"LLM '{llm_name}' not found.")
-
-            selected_database = self.resource_manager.get_database_by_name(database_name)
-            if not selected_database:
-                raise ValueError(f"Database '{database_name}' not found.")
+            # 获取复用的工作流实例（按工作流类型、LLM、数据库缓存）
+            workflow_instance = self.workflow_pool.get(
+                workflow_type, llm_name, database_name
+            )
 
             # 准备上下文
             if context is None:
@@ -135,49 +205,80 @@ class WorkflowService:
             
             # 添加输入文本到上下文
             context["input"] = input_text
+
+            # 请求截止时间，工作流内的Neo4j查询以剩余时间作为事务超时
+            if timeout:
+                context["deadline"] = time.time() + timeout
             
             # 添加提示词配置到上下文
             if prompt_config:
                 context["prompt_config"] = prompt_config
 
-            # 创建工作流实例
-            workflow_instance = workflow_class(
-                llm=selected_llm,
-                db=selected_database,
-                embed_model=self.resource_manager.embed_model,
-                timeout=timeout,
-            )
+            # 按步骤指定的模型
+            if step_models:
+                context["step_models"] = step_models
 
-            # 执行工作流并流式返回事件
-            handler = workflow_instance.run(**context)
+            # 是否对简单结果使用模板答案
+            if template_answers is not None:
+                context["template_answers"] = template_answers
+
+            # 各步骤计时 span 的标签（请求ID、工作流、LLM、数据库）
+            context["span_labels"] = span_labels
+
+            # 执行工作流并流式返回事件；工作流任务创建时继承请求的追踪上下文
+            with request_scope(span_labels) as trace:
+                handler = workflow_instance.run(**context)
+            run_timeout = RunTimeout(handler, timeout)
+
+            try:
+                async for event in handler.stream_events():
+                    if type(event).__name__ != "StopEvent":
+                        event_data = {
+                            "event_type": type(event).__name__,
+                            "label": event.label,
+                            "message": event.message,
+                            "request_id": span_labels["request_id"],
+                            "timestamp": datetime.now().isoformat()
+                        }
+                        yield event_data
+
+                # 返回最终结果
+                result = await handler
+            except Exception as e:
+                run_timeout.check(e)
+                raise
+            finally:
+                run_timeout.cancel()
+                # 客户端断开连接时取消工作流，避免被放弃的查询继续占用集群
+                if not handler.done():
+                    await handler.cancel_run()
 
-            async for event in handler.stream_events():
-                if type(event).__name__ != "StopEvent":
-                    event_data = {
-                        "event_type": type(event).__name__,
-                        "label": event.label,
-                        "message": event.message,
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    yield event_data
-
-            # 返回最终结果
-            result = await handler
+            outcome = "success"
             yield {
                 "event_type": "result",
                 "label": "Result",
                 "message": "Workflow completed successfully",
                 "result": result,
+                "request_id": span_labels["request_id"],
                 "timestamp": datetime.now().isoformat()
             }
 
         except Exception as e:
+            outcome = "error"
+            error = str(e)
             yield {
                 "event_type": "error",
                 "label": "Error",
                 "message": f"Workflow execution failed: {str(e)}",
+                "request_id": span_labels["request_id"],
                 "timestamp": datetime.now().isoformat()
             }
+        finally:
+            INFLIGHT_REQUESTS.dec(mode="stream")
+            _record_request(metric_labels, outcome, start)
+            logger.log_run(span_labels, outcome, time.perf_counter() - start, result, error)
+            if trace is not None:
+                get_trace_exporter().export(trace, outcome, error)
 
     async def execute_workflow_batch(
         self,
@@ -188,7 +289,13 @@ class WorkflowService:
         semaphore = asyncio.Semaphore(max_concurrent)
         
         async def execute_single(request):
-            async with semaphore:
+            # 等待并发名额的请求数
+            BATCH_QUEUE_DEPTH.inc()
+            try:
+                await semaphore.acquire()
+            finally:
+                BATCH_QUEUE_DEPTH.dec()
+            try:
                 start_time = datetime.now()
                 events = []
                 
@@ -218,7 +325,9 @@ class WorkflowService:
                         input_text=_get(request, "input_text"),
                         context=(request.get("context", {}) if isinstance(request, dict) else (_get(request, "context") or {})),
                         timeout=(request.get("timeout", 60) if isinstance(request, dict) else (_get(request, "timeout") or 60)),
-                        prompt_config=(request.get("prompt_config") if isinstance(request, dict) else _get(request, "prompt_config"))
+                        prompt_config=(request.get("prompt_config") if isinstance(request, dict) else _get(request, "prompt_config")),
+                        step_models=_get(request, "step_models"),
+                        template_answers=_get(request, "template_answers")
                     )
                     
                     execution_time = (datetime.now() - start_time).total_seconds()
@@ -246,6 +355,8 @@ class WorkflowService:
                         result=None,
                         execution_time=execution_time
                     )
+            finally:
+                semaphore.release()
 
         # 并发执行所有请求
         tasks = [execute_single(request) for request in requests]
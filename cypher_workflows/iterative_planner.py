@@ -1,3 +1,5 @@
+import asyncio
+
 from llama_index.core import VectorStoreIndex
 from llama_index.core.schema import TextNode
 from llama_index.core.workflow import (
@@ -10,10 +12,19 @@ from llama_index.core.workflow import (
 )
 from llama_index.graph_stores.neo4j import CypherQueryCorrector
 
+from cypher_workflows.shared.cost_guard import CypherCostError, guard_cypher_cost
+from cypher_workflows.shared.cypher_executor import run_cypher
+from cypher_workflows.shared.entity_index import rewrite_entity_literals
 from cypher_workflows.shared.local_fewshot_manager import LocalFewshotManager
+from cypher_workflows.shared.model_router import get_step_llm, summarize_usage
 from cypher_workflows.shared.sse_event import SseEvent
+from cypher_workflows.shared.step_timing import (
+    finish_spans,
+    format_span_summary,
+    start_spans,
+    step_span,
+)
 from cypher_workflows.shared.utils import get_neo4j_schema_str
-import os
 from cypher_workflows.steps.iterative_planner import (
     correct_cypher_step,
     generate_cypher_step,
@@ -74,12 +85,10 @@ class IterativePlanningFlow(Workflow):
         self.cypher_query_corrector = CypherQueryCorrector(db["corrector_schema"])
         self.few_shot_retriever = LocalFewshotManager()
         self.db_name = db["name"]
-        # 新增：初始化时获取schema
-        uri = os.getenv("NEO4J_URI", "bolt://localhost:7687")
-        username = os.getenv("NEO4J_USERNAME", "neo4j")
-        password = os.getenv("NEO4J_PASSWORD", "12345678")
-        database = os.getenv("NEO4J_DATABASE", "neo4j")
-        self.schema = get_neo4j_schema_str(uri, username, password, database, exclude_types=["Actor", "Director"])
+        # 初始化时获取schema，使用当前数据库的连接而不是默认的 NEO4J_* 配置
+        self.schema = get_neo4j_schema_str(
+            graph_store=self.graph_store, exclude_types=["Actor", "Director"]
+        )
 
     @step
     async def start(self, ctx: Context, ev: StartEvent) -> InitialPlan | FinalAnswer:
@@ -91,9 +100,19 @@ class IterativePlanningFlow(Workflow):
         await ctx.set(
             "subqueries_cypher_history", {}
         )  # History of which queries were executed
+        await ctx.set(
+            "deadline", getattr(ev, "deadline", None)
+        )  # Request deadline, bounds the Neo4j transaction timeout
+        # 按步骤选择模型（请求中的 step_models 优先于 MODEL_ROUTING），并记录各步骤耗时与成本
+        await ctx.set("step_models", getattr(ev, "step_models", None))
+        await ctx.set("step_usage", [])
+        # 各阶段计时 span，汇入按工作流/LLM/数据库分组的延迟直方图
+        await start_spans(ctx, ev, "iterative_planning")
 
         # LLM call
-        guardrails_output = await guardrails_step(self.llm, original_question)
+        guardrails_llm = await get_step_llm(ctx, "guardrails", self.llm)
+        async with step_span(ctx, "guardrails", llm=guardrails_llm.model_name):
+            guardrails_output = await guardrails_step(guardrails_llm, original_question)
         if guardrails_output.get("next_event") == "generate_final_answer":
             context = "The question is not about movies or cast, so I cannot answer the question"
             final_answer = FinalAnswer(context=context)
@@ -105,7 +124,9 @@ class IterativePlanningFlow(Workflow):
     async def initial_plan(self, ctx: Context, ev: InitialPlan) -> GenerateCypher:
         original_question = ev.question
         # store in global context
-        initial_plan_output = await initial_plan_step(self.llm, original_question)
+        plan_llm = await get_step_llm(ctx, "plan", self.llm)
+        async with step_span(ctx, "plan", llm=plan_llm.model_name):
+            initial_plan_output = await initial_plan_step(plan_llm, original_question)
         subqueries = initial_plan_output["arguments"].get("plan")
 
         ctx.write_event_to_stream(
@@ -130,17 +151,20 @@ class IterativePlanningFlow(Workflow):
         ctx: Context,
         ev: GenerateCypher,
     ) -> ValidateCypher:
-        fewshot_examples = self.few_shot_retriever.get_fewshot_examples(
-            ev.subquery, self.db_name
-        )
+        async with step_span(ctx, "fewshot"):
+            fewshot_examples = self.few_shot_retriever.get_fewshot_examples(
+                ev.subquery, self.db_name
+            )
         # 传递schema
-        generated_cypher = await generate_cypher_step(
-            self.llm,
-            self.graph_store,
-            ev.subquery,
-            fewshot_examples,
-            self.schema,
-        )
+        generate_llm = await get_step_llm(ctx, "generate", self.llm)
+        async with step_span(ctx, "generate", llm=generate_llm.model_name):
+            generated_cypher = await generate_cypher_step(
+                generate_llm,
+                self.graph_store,
+                ev.subquery,
+                fewshot_examples,
+                self.schema,
+            )
         return ValidateCypher(
             subquery=ev.subquery, generated_cypher=generated_cypher, retries=ev.retries
         )
@@ -148,47 +172,66 @@ class IterativePlanningFlow(Workflow):
     @step(num_workers=4)
     async def validate_cypher_step(
         self, ctx: Context, ev: ValidateCypher
-    ) -> ExecuteCypher | CorrectCypher:
+    ) -> ExecuteCypher | CorrectCypher | InformationCheck:
+        # 用实体名索引把实体名改写为库中的实际取值，再做值映射
+        cypher, entity_rewrites = rewrite_entity_literals(ev.generated_cypher, self.db_name)
+        if entity_rewrites:
+            ctx.write_event_to_stream(
+                SseEvent(
+                    message=f"Entity names mapped: {entity_rewrites}",
+                    label=f"Entity mapping: {ev.subquery}",
+                )
+            )
         results = await validate_cypher_step(
             llm=self.llm,
             graph_store=self.graph_store,
             question=ev.subquery,
-            cypher=ev.generated_cypher,
+            cypher=cypher,
             cypher_query_corrector=self.cypher_query_corrector,
         )
-        # if results["next_action"] == "end":  # DB value mapping
-        #    return FinalAnswer(context=str(results["mapping_errors"]))
+        # DB value mapping errors come back as cypher_errors with suggested values
         if results["next_action"] == "execute_cypher":
             return ExecuteCypher(
-                subquery=ev.subquery, validated_cypher=ev.generated_cypher
+                subquery=ev.subquery,
+                validated_cypher=results["cypher_statement"] or cypher,
             )
         if results["next_action"] == "correct_cypher" and ev.retries > 0:
             return CorrectCypher(
                 subquery=ev.subquery,
-                cypher=ev.generated_cypher,
+                cypher=cypher,
                 errors=results["cypher_errors"],
                 retries=ev.retries - 1,
             )
-        else:  # What to do if no retries left
-            # We just run execute cypher and expect an error
-            # Improve
-            return ExecuteCypher(
-                subquery=ev.subquery, validated_cypher=ev.generated_cypher
+        if results["cost_errors"]:
+            # 重试用尽仍未通过EXPLAIN检查（超预算、写操作或语法错误），不下发执行，
+            # 以错误结果结束该子查询
+            return InformationCheck(
+                subquery=ev.subquery,
+                cypher=cypher,
+                database_output=[CypherCostError("\n".join(results["cost_errors"]))],
             )
+        # What to do if no retries left
+        # We just run execute cypher and expect an error
+        return ExecuteCypher(
+            subquery=ev.subquery,
+            validated_cypher=results["cypher_statement"] or cypher,
+        )
 
     @step(num_workers=4)
     async def correct_cypher_step(
         self, ctx: Context, ev: CorrectCypher
     ) -> ValidateCypher:
         # 传递schema
-        corrected_cypher = await correct_cypher_step(
-            self.llm,
-            self.graph_store,
-            ev.subquery,
-            ev.cypher,
-            ev.errors,
-            self.schema,
-        )
+        correct_llm = await get_step_llm(ctx, "correct", self.llm)
+        async with step_span(ctx, "correct", llm=correct_llm.model_name):
+            corrected_cypher = await correct_cypher_step(
+                correct_llm,
+                self.graph_store,
+                ev.subquery,
+                ev.cypher,
+                ev.errors,
+                self.schema,
+            )
         return ValidateCypher(
             subquery=ev.subquery, generated_cypher=corrected_cypher, retries=ev.retries
         )
@@ -206,9 +249,18 @@ class IterativePlanningFlow(Workflow):
 
         try:
             print(f"[INFO] 即将查询数据库: {self.db_name}")
-            database_output = self.graph_store.structured_query(ev.validated_cypher)[
-                :100
-            ]  # Hard limit of 100 results
+            # 执行前再次检查EXPLAIN预估成本，超预算的查询不会下发执行
+            async with step_span(ctx, "explain"):
+                # EXPLAIN 是同步驱动调用，放到线程中避免阻塞事件循环
+                cypher = await asyncio.to_thread(
+                    guard_cypher_cost, self.graph_store, ev.validated_cypher
+                )
+            async with step_span(ctx, "execute"):
+                database_output = await run_cypher(
+                    self.graph_store,
+                    cypher,
+                    deadline=await ctx.get("deadline", default=None),
+                )  # Hard limit of 100 results
         except Exception as e:  # Dividing by zero, etc... or timeout
             database_output = [e]
 
@@ -250,9 +302,15 @@ class IterativePlanningFlow(Workflow):
         plan = await ctx.get("plan")
 
         # Do the information check
-        data = await information_check_step(
-            self.llm, result, original_question, dynamic_notebook, plan
-        )
+        check_llm = await get_step_llm(ctx, "information_check", self.llm)
+        async with step_span(ctx, "information_check", llm=check_llm.model_name):
+            data = await information_check_step(
+                check_llm,
+                result,
+                original_question,
+                dynamic_notebook,
+                plan,
+            )
 
         # Get count of information checks done
         information_checks = await ctx.get("information_checks")
@@ -284,17 +342,40 @@ class IterativePlanningFlow(Workflow):
         final_answer_prompt = get_final_answer_prompt()
 
         # wait until we receive all events
-        gen = await self.llm.astream_chat(
-            final_answer_prompt.format_messages(
-                context=ev.context, question=original_question
+        summary_llm = await get_step_llm(ctx, "summarize", self.llm)
+        async with step_span(ctx, "summarize", llm=summary_llm.model_name):
+            gen = await summary_llm.astream_chat(
+                final_answer_prompt.format_messages(
+                    context=ev.context, question=original_question
+                )
             )
-        )
 
-        final_answer = ""
-        async for response in gen:
-            final_answer += response.delta
-            ctx.write_event_to_stream(
-                SseEvent(message=response.delta, label="Final answer")
+            final_answer = ""
+            async for response in gen:
+                final_answer += response.delta
+                ctx.write_event_to_stream(
+                    SseEvent(message=response.delta, label="Final answer")
+                )
+
+        # 各步骤的模型、耗时与预估成本
+        step_usage = summarize_usage(await ctx.get("step_usage", default=[]))
+        ctx.write_event_to_stream(
+            SseEvent(message=f"Step usage: {step_usage}", label="Step usage")
+        )
+        # 本次请求各阶段的耗时
+        step_timings = await finish_spans(ctx)
+        ctx.write_event_to_stream(
+            SseEvent(
+                message=f"Step timings: {format_span_summary(step_timings['stages'])}",
+                label="Step timings",
             )
+        )
 
-        return StopEvent(result={"answer": final_answer, "question": original_question})
+        return StopEvent(
+            result={
+                "answer": final_answer,
+                "question": original_question,
+                "step_usage": step_usage,
+                "step_timings": step_timings,
+            }
+        )
@@ -0,0 +1,105 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# 模板答案配置：请求未指定 template_answers 时的默认值
+TEMPLATE_ANSWERS_DEFAULT = os.getenv("TEMPLATE_ANSWERS_DEFAULT", "false").lower() == "true"
+# 单列列表与小表格最多渲染的行数、列数，超出时仍交给LLM总结
+TEMPLATE_ANSWER_MAX_ROWS = int(os.getenv("TEMPLATE_ANSWER_MAX_ROWS", "20"))
+TEMPLATE_ANSWER_MAX_COLUMNS = int(os.getenv("TEMPLATE_ANSWER_MAX_COLUMNS", "5"))
+
+_CJK = re.compile(r"[一-鿿]")
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+def _json_safe(value: Any) -> Any:
+    if isinstance(value, _PRIMITIVES):
+        return value
+    if isinstance(value, dict):
+        return {str(key): _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    # neo4j.time 的日期时间类型输出 ISO 8601 文本，空间点等其余类型用 str()
+    iso_format = getattr(value, "iso_format", None)
+    return iso_format() if callable(iso_format) else str(value)
+
+
+def json_safe_rows(rows: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+    """Query rows for the workflow result, with values JSON cannot encode turned into text."""
+    if rows is None:
+        return None
+    return [{key: _json_safe(value) for key, value in row.items()} for row in rows]
+
+
+def classify_result_shape(rows: Optional[List[Dict[str, Any]]]) -> str:
+    """
+    Classifies a result as empty, scalar (one value), list (one column),
+    table (a few primitive columns) or complex (nodes, paths, maps or too large).
+    """
+    if rows is None:
+        return "complex"
+    if not rows:
+        return "empty"
+    columns = list(rows[0])
+    if any(list(row) != columns for row in rows):
+        return "complex"
+    if not all(isinstance(value, _PRIMITIVES) for row in rows for value in row.values()):
+        return "complex"
+    if len(rows) == 1 and len(columns) == 1:
+        return "scalar"
+    if len(rows) > TEMPLATE_ANSWER_MAX_ROWS:
+        return "complex"
+    if len(columns) == 1:
+        return "list"
+    if len(columns) <= TEMPLATE_ANSWER_MAX_COLUMNS:
+        return "table"
+    return "complex"
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.4g}" if abs(value) < 1e6 else f"{value:,.0f}"
+    return str(value)
+
+
+def _column_label(column: str) -> str:
+    # n.name -> name，count(n) 之类保留原样
+    return column.split(".", 1)[1] if re.fullmatch(r"\w+\.\w+", column) else column
+
+
+def render_template_answer(
+    question: str,
+    rows: Optional[List[Dict[str, Any]]],
+) -> Optional[str]:
+    """
+    Renders scalar, single-column and small tabular results as a short answer.
+    `rows` are the records of the query (None when it failed). Returns None for other
+    shapes (including empty results), which still need the LLM.
+    """
+    shape = classify_result_shape(rows)
+    chinese = bool(_CJK.search(question or ""))
+
+    if shape == "scalar":
+        column, value = next(iter(rows[0].items()))
+        if chinese:
+            return f"查询结果（{_column_label(column)}）：{_format_value(value)}"
+        return f"Result ({_column_label(column)}): {_format_value(value)}"
+    if shape == "list":
+        column = next(iter(rows[0]))
+        values = [_format_value(row[column]) for row in rows]
+        if chinese:
+            return f"共 {len(values)} 条结果（{_column_label(column)}）：" + "、".join(values)
+        return f"{len(values)} results ({_column_label(column)}): " + ", ".join(values)
+    if shape == "table":
+        columns = list(rows[0])
+        header = "| " + " | ".join(_column_label(c) for c in columns) + " |"
+        separator = "| " + " | ".join("---" for _ in columns) + " |"
+        lines = [
+            "| " + " | ".join(_format_value(row[c]).replace("|", "\\|") for c in columns) + " |"
+            for row in rows
+        ]
+        title = f"共 {len(rows)} 条结果：" if chinese else f"{len(rows)} results:"
+        return "\n".join([title, "", header, separator, *lines])
+    return None
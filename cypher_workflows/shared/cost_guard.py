@@ -0,0 +1,202 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import neo4j
+
+from cypher_workflows.shared.parameterizer import mask_literals, parameterize_cypher
+from cypher_workflows.shared.request_context import get_tx_metadata
+
+# 成本守卫配置，均可通过环境变量覆盖
+COST_GUARD_ENABLED = os.getenv("CYPHER_COST_GUARD_ENABLED", "true").lower() == "true"
+# 任一算子的预估行数超过该值即拒绝
+MAX_ESTIMATED_ROWS = float(os.getenv("CYPHER_MAX_ESTIMATED_ROWS", "1000000"))
+# 高代价算子（全图扫描、笛卡尔积、变长扩展等）允许的预估行数
+EXPENSIVE_OPERATOR_MAX_ROWS = float(
+    os.getenv("CYPHER_EXPENSIVE_OPERATOR_MAX_ROWS", "100000")
+)
+EXPENSIVE_OPERATORS = [
+    op.strip()
+    for op in os.getenv(
+        "CYPHER_EXPENSIVE_OPERATORS",
+        "AllNodesScan,CartesianProduct,VarLengthExpand(All),VarLengthExpand(Into),"
+        "ShortestPath,StatefulShortestPath(All),StatefulShortestPath(Into)",
+    ).split(",")
+    if op.strip()
+]
+# 变长关系模式允许的最大跳数，未设上限的模式会被改写为该上限
+MAX_VAR_LENGTH_HOPS = int(os.getenv("CYPHER_MAX_VAR_LENGTH_HOPS", "5"))
+
+# 匹配关系模式中的变长定义，如 -[*]-、-[:KNOWS*2..]->、-[r*..10]-
+_VAR_LENGTH_PATTERN = re.compile(
+    r"(-\[[^\[\]]*?)\*\s*(\d*)\s*(\.\.)?\s*(\d*)(?=[^\[\]]*\])"
+)
+
+
+class CypherCostError(Exception):
+    """Cypher语句超出成本预算"""
+
+
+def cap_var_length_patterns(
+    cypher: str, max_hops: int = MAX_VAR_LENGTH_HOPS
+) -> Tuple[str, List[str]]:
+    """
+    Caps unbounded or oversized variable-length relationship patterns to `max_hops`.
+    A pattern whose lower bound already exceeds `max_hops` is fixed to that lower bound
+    (`*7..` -> `*7..7`) and left to the EXPLAIN estimate. `*` inside string literals,
+    comments and backtick identifiers is ignored.
+    Returns the rewritten statement and a description of every rewrite.
+    """
+    rewrites = []
+    out = []
+    last = 0
+    # 在遮盖了字符串字面量的文本上匹配，按相同位置改写原语句
+    for match in _VAR_LENGTH_PATTERN.finditer(mask_literals(cypher)):
+        prefix, lower, dots, upper = match.groups()
+        if not dots:
+            if lower:  # 固定跳数 *n 保持不变，交给EXPLAIN估算
+                continue
+            new_spec = f"*1..{max_hops}"
+        elif not upper or int(upper) > max_hops:
+            if lower and int(lower) > max_hops:
+                if upper:  # 有上限的 *7..10 交给EXPLAIN估算
+                    continue
+                new_spec = f"*{lower}..{lower}"
+            else:
+                new_spec = f"*{lower}..{max_hops}"
+        else:
+            continue
+        spec_start = match.start() + len(prefix)
+        # 不替换变长定义之后的空白
+        spec_end = spec_start + len(match.group(0)[len(prefix):].rstrip())
+        rewrites.append(f"{cypher[spec_start:spec_end]} -> {new_spec}")
+        out.append(cypher[last:spec_start])
+        out.append(new_spec)
+        last = spec_end
+    out.append(cypher[last:])
+    return "".join(out), rewrites
+
+
+def explain_cypher(
+    graph_store, cypher: str, param_map: Optional[Dict[str, Any]] = None
+) -> neo4j.ResultSummary:
+    """
+    Runs EXPLAIN for the statement and returns the result summary with the estimated plan.
+    The statement is parameterized the same way as in execution, so the plan compiled here
+    is the one reused by the following run.
+    """
+    query, params, _ = parameterize_cypher(cypher, param_map)
+    _, summary, _ = graph_store.client.execute_query(
+        neo4j.Query(text=f"EXPLAIN {query}", metadata=get_tx_metadata()),
+        database_=getattr(graph_store, "_database", None),
+        parameters_=params,
+        routing_=neo4j.RoutingControl.READ,
+    )
+    return summary
+
+
+def collect_plan_operators(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flattens the plan tree into a list of operators with their estimated rows."""
+    operators = []
+    stack = [plan] if plan else []
+    while stack:
+        node = stack.pop()
+        # Neo4j 5 的算子名带有运行时后缀，如 AllNodesScan@neo4j
+        operator = str(node.get("operatorType", "")).split("@")[0]
+        estimated_rows = float(node.get("arguments", {}).get("EstimatedRows", 0) or 0)
+        operators.append({"operator": operator, "estimated_rows": estimated_rows})
+        stack.extend(node.get("children", []))
+    return operators
+
+
+def check_cypher_cost(
+    graph_store, cypher: str, param_map: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Checks the EXPLAIN estimates of a Cypher statement against the configured cost budget.
+    Unbounded variable-length patterns are capped before planning; statements over budget
+    or statements that write to the database are rejected with a reason that can be passed
+    to the correction step.
+    """
+    result = {
+        "next_action": "execute_cypher",
+        "cypher": cypher,
+        "errors": [],
+        "rewrites": [],
+        "estimated_rows": None,
+        "operators": [],
+    }
+    if not COST_GUARD_ENABLED:
+        return result
+
+    capped_cypher, rewrites = cap_var_length_patterns(cypher)
+    result["cypher"] = capped_cypher
+    result["rewrites"] = rewrites
+
+    try:
+        summary = explain_cypher(graph_store, capped_cypher, param_map)
+    except neo4j.exceptions.Neo4jError as e:
+        # 语法或语义错误，执行必然失败，直接交给修正步骤
+        result["errors"].append(e.message or str(e))
+        result["next_action"] = "correct_cypher"
+        return result
+    except Exception as e:
+        # 连接等非查询问题不阻断执行
+        print(f"[WARN] 成本守卫 EXPLAIN 失败，跳过检查: {e}")
+        return result
+
+    # 生成的查询只允许只读（query_type 为 'r'）
+    if summary.query_type and summary.query_type != "r":
+        result["errors"].append(
+            "Only read queries are allowed, but the generated statement writes to the database. "
+            "Rewrite it as a read-only query without CREATE, MERGE, SET, DELETE or REMOVE."
+        )
+        result["next_action"] = "correct_cypher"
+        return result
+
+    operators = collect_plan_operators(summary.plan or {})
+    result["operators"] = operators
+    result["estimated_rows"] = max(
+        (op["estimated_rows"] for op in operators), default=0
+    )
+
+    for op in operators:
+        if op["estimated_rows"] > MAX_ESTIMATED_ROWS:
+            result["errors"].append(
+                f"Operator {op['operator']} is estimated to produce {op['estimated_rows']:.0f} rows, "
+                f"which exceeds the budget of {MAX_ESTIMATED_ROWS:.0f} rows."
+            )
+        elif (
+            op["operator"] in EXPENSIVE_OPERATORS
+            and op["estimated_rows"] > EXPENSIVE_OPERATOR_MAX_ROWS
+        ):
+            result["errors"].append(
+                f"Expensive operator {op['operator']} is estimated to process {op['estimated_rows']:.0f} rows, "
+                f"which exceeds the budget of {EXPENSIVE_OPERATOR_MAX_ROWS:.0f} rows."
+            )
+
+    if result["errors"]:
+        result["errors"].append(
+            "The query was rejected by the cost guard before execution. "
+            "Narrow the pattern with node labels and property filters, "
+            f"bound variable-length relationships to at most {MAX_VAR_LENGTH_HOPS} hops "
+            "and add a LIMIT clause."
+        )
+        result["next_action"] = "correct_cypher"
+
+    return result
+
+
+def guard_cypher_cost(
+    graph_store, cypher: str, param_map: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Returns the (possibly rewritten) statement that fits the cost budget.
+    Raises CypherCostError with the rejection reason otherwise.
+    """
+    guard = check_cypher_cost(graph_store, cypher, param_map)
+    if guard["rewrites"]:
+        print(f"[INFO] 成本守卫改写变长模式: {guard['rewrites']}")
+    if guard["errors"]:
+        raise CypherCostError("\n".join(guard["errors"]))
+    return guard["cypher"]
@@ -0,0 +1,253 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import neo4j
+from llama_index.core.graph_stores.utils import value_sanitize
+
+from cypher_workflows.shared.metrics import (
+    CACHE_LOOKUPS,
+    NEO4J_QUERY_DURATION,
+    NEO4J_QUERY_ROWS,
+)
+from cypher_workflows.shared.parameterizer import parameterize_cypher, restore_literals
+from cypher_workflows.shared.request_context import (
+    SPAN_CLIENT,
+    get_tx_metadata,
+    record_trace_span,
+)
+
+# 单条查询的默认事务超时（秒），请求剩余时间更短时以剩余时间为准
+DEFAULT_QUERY_TIMEOUT = float(os.getenv("NEO4J_QUERY_TIMEOUT", "30"))
+# 每次查询最多拉取的记录数
+DEFAULT_RECORD_LIMIT = 100
+
+# 与 Neo4j 默认的 server.db.query_cache_size 保持一致
+PLAN_CACHE_SIZE = int(os.getenv("CYPHER_PLAN_CACHE_SIZE", "1000"))
+
+# 按服务器地址（集群成员）统计的查询延迟
+replica_stats: Dict[str, Dict[str, Any]] = {}
+
+# 计划缓存命中统计：Neo4j 按查询文本缓存执行计划，这里按 (database, 参数化后的文本)
+# 模拟同样大小的 LRU 缓存来估算命中率
+_seen_queries: "OrderedDict[Tuple[Optional[str], str], None]" = OrderedDict()
+plan_cache_stats: Dict[str, Any] = {
+    "lookups": 0,
+    "hits": 0,
+    "parameterized_queries": 0,
+    "hit_available_after_ms": 0,
+    "miss_available_after_ms": 0,
+}
+
+
+class CypherTimeoutError(Exception):
+    """请求截止时间已过，不再下发查询"""
+
+
+def get_remaining_timeout(
+    deadline: Optional[float], default: Optional[float] = DEFAULT_QUERY_TIMEOUT
+) -> Optional[float]:
+    """
+    Returns the transaction timeout for a query started now.
+    `deadline` is the request deadline as a `time.time()` timestamp.
+    """
+    if deadline is None:
+        return default
+    remaining = deadline - time.time()
+    return min(remaining, default) if default else remaining
+
+
+def _record_replica_latency(address: str, database: Optional[str], latency: float):
+    """按服务器地址累计查询延迟"""
+    stats = replica_stats.setdefault(
+        address,
+        {
+            "address": address,
+            "databases": [],
+            "count": 0,
+            "total_time": 0.0,
+            "max_time": 0.0,
+            "last_time": 0.0,
+        },
+    )
+    if database and database not in stats["databases"]:
+        stats["databases"].append(database)
+    stats["count"] += 1
+    stats["total_time"] += latency
+    stats["max_time"] = max(stats["max_time"], latency)
+    stats["last_time"] = latency
+
+
+def get_replica_stats() -> List[Dict[str, Any]]:
+    """Returns the per-server query latency statistics."""
+    return [
+        {
+            **stats,
+            "average_time": stats["total_time"] / stats["count"] if stats["count"] else 0,
+        }
+        for stats in replica_stats.values()
+    ]
+
+
+def reset_replica_stats():
+    replica_stats.clear()
+
+
+def _record_plan_cache_lookup(
+    database: Optional[str], cypher: str, available_after: Optional[int]
+) -> bool:
+    """Records whether the statement text was already planned recently, returns True on a hit."""
+    key = (database, cypher)
+    hit = key in _seen_queries
+    if hit:
+        _seen_queries.move_to_end(key)
+    else:
+        _seen_queries[key] = None
+        if len(_seen_queries) > PLAN_CACHE_SIZE:
+            _seen_queries.popitem(last=False)
+
+    plan_cache_stats["lookups"] += 1
+    CACHE_LOOKUPS.inc(cache="plan", result="hit" if hit else "miss")
+    if hit:
+        plan_cache_stats["hits"] += 1
+        plan_cache_stats["hit_available_after_ms"] += available_after or 0
+    else:
+        plan_cache_stats["miss_available_after_ms"] += available_after or 0
+    return hit
+
+
+def get_plan_cache_stats() -> Dict[str, Any]:
+    """Returns the estimated plan cache hit rate of executed statements."""
+    lookups = plan_cache_stats["lookups"]
+    hits = plan_cache_stats["hits"]
+    misses = lookups - hits
+    return {
+        "lookups": lookups,
+        "hits": hits,
+        "hit_rate": hits / lookups if lookups else 0,
+        "parameterized_queries": plan_cache_stats["parameterized_queries"],
+        "distinct_queries": len(_seen_queries),
+        # result_available_after 包含计划编译时间，可对比命中与未命中的差异
+        "average_hit_available_after_ms": (
+            plan_cache_stats["hit_available_after_ms"] / hits if hits else 0
+        ),
+        "average_miss_available_after_ms": (
+            plan_cache_stats["miss_available_after_ms"] / misses if misses else 0
+        ),
+    }
+
+
+def reset_plan_cache_stats():
+    _seen_queries.clear()
+    for key in plan_cache_stats:
+        plan_cache_stats[key] = 0
+
+
+def _record_query(
+    database: Optional[str],
+    wall_start: float,
+    duration: float,
+    outcome: str,
+    query: str,
+    rows: Optional[int] = None,
+    server: Optional[str] = None,
+):
+    NEO4J_QUERY_DURATION.observe(duration, database=database, outcome=outcome)
+    if rows is not None:
+        NEO4J_QUERY_ROWS.observe(rows, database=database)
+    # 属性名沿用 OpenTelemetry 数据库语义约定
+    record_trace_span(
+        "neo4j query",
+        wall_start,
+        duration,
+        outcome != "success",
+        kind=SPAN_CLIENT,
+        **{
+            "db.system": "neo4j",
+            "db.namespace": database,
+            "db.query.text": query,
+            "db.response.returned_rows": rows,
+            "server.address": server,
+            "text2cypher.outcome": outcome,
+        },
+    )
+
+
+async def run_cypher(
+    graph_store,
+    cypher: str,
+    param_map: Optional[Dict[str, Any]] = None,
+    deadline: Optional[float] = None,
+    limit: Optional[int] = DEFAULT_RECORD_LIMIT,
+) -> List[Dict[str, Any]]:
+    """
+    Runs a generated statement as a read transaction on the async driver of the graph store.
+    With a `neo4j://` URI the read is routed to followers and read replicas, and the server
+    rejects any write. The remaining request time is sent to Neo4j as the transaction timeout,
+    and cancelling the calling task (workflow timeout, cancel_run, client disconnect) drops
+    the connection so the server aborts the running transaction.
+    String and number literals are lifted into parameters first, so queries that differ only
+    in their literals reuse one cached plan.
+    """
+    timeout = get_remaining_timeout(
+        deadline, getattr(graph_store, "_timeout", None) or DEFAULT_QUERY_TIMEOUT
+    )
+    if timeout is not None and timeout <= 0:
+        raise CypherTimeoutError(
+            "The request deadline was exceeded before the query could be executed."
+        )
+
+    query, params, literals = parameterize_cypher(cypher, param_map)
+
+    # 事务元数据带上请求ID与 traceparent，可在 SHOW TRANSACTIONS 和查询日志中关联到请求
+    @neo4j.unit_of_work(timeout=timeout, metadata=get_tx_metadata())
+    async def _read(tx):
+        result = await tx.run(query, params)
+        # 只拉取需要的记录，其余记录由服务端丢弃
+        if limit:
+            records = await result.fetch(limit)
+        else:
+            records = [record async for record in result]
+        summary = await result.consume()
+        return records, summary
+
+    database = getattr(graph_store, "_database", None)
+    wall_start = time.time()
+    start = time.perf_counter()
+    try:
+        async with graph_store._async_driver.session(
+            database=database, default_access_mode=neo4j.READ_ACCESS
+        ) as session:
+            records, summary = await session.execute_read(_read)
+    except asyncio.CancelledError:
+        print("[INFO] 工作流已取消，正在中止 Neo4j 查询")
+        _record_query(database, wall_start, time.perf_counter() - start, "cancelled", query)
+        raise
+    except Exception:
+        _record_query(database, wall_start, time.perf_counter() - start, "error", query)
+        raise
+    _record_query(
+        database, wall_start, time.perf_counter() - start, "success", query, len(records),
+        str(summary.server.address) if summary.server and summary.server.address else None,
+    )
+
+    if summary.server and summary.server.address:
+        _record_replica_latency(
+            str(summary.server.address), database, time.perf_counter() - start
+        )
+
+    _record_plan_cache_lookup(database, query, summary.result_available_after)
+    if literals:
+        plan_cache_stats["parameterized_queries"] += 1
+
+    # record.data() 把节点、关系和路径转换为字典与列表；
+    # 未起别名的返回列以表达式文本命名，把参数名还原为原始字面量
+    data = [
+        {restore_literals(key, literals): value for key, value in record.data().items()}
+        for record in records
+    ]
+    if getattr(graph_store, "sanitize_query_output", True):
+        return [value_sanitize(el) for el in data]
+    return data
@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import neo4j
+from llama_index.graph_stores.neo4j import Neo4jPropertyGraphStore
+
+# 连接池配置，所有共享驱动统一使用
+MAX_CONNECTION_POOL_SIZE = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
+MAX_CONNECTION_LIFETIME = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "3600"))
+CONNECTION_ACQUISITION_TIMEOUT = float(
+    os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "60")
+)
+
+# (uri, username) -> 共享驱动
+_drivers: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_lock = threading.Lock()
+# 被替换后尚未关闭的异步驱动（替换时不在事件循环中），进程退出时关闭
+_retired_async_drivers: List[neo4j.AsyncDriver] = []
+# 正在关闭的异步驱动任务，保留引用避免任务被回收
+_closing_tasks: set = set()
+
+
+def get_pool_config() -> Dict[str, Any]:
+    return {
+        "max_connection_pool_size": MAX_CONNECTION_POOL_SIZE,
+        "max_connection_lifetime": MAX_CONNECTION_LIFETIME,
+        "connection_acquisition_timeout": CONNECTION_ACQUISITION_TIMEOUT,
+    }
+
+
+def get_shared_drivers(
+    uri: str, username: str, password: str
+) -> Tuple[neo4j.Driver, neo4j.AsyncDriver]:
+    """
+    Returns the pooled sync and async drivers for (uri, username), creating them on first use.
+    Logical databases on the same server share one connection pool.
+    """
+    key = (uri, username)
+    password_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
+    with _lock:
+        entry = _drivers.get(key)
+        if entry and entry["password_hash"] == password_hash:
+            return entry["driver"], entry["async_driver"]
+        if entry:
+            # 密码变更后旧凭据已失效，关闭旧驱动并创建新驱动
+            print(f"[WARN] {username}@{uri} 的密码已变更，关闭旧驱动并创建新的共享驱动")
+            _retire_drivers(entry)
+
+        pool_config = get_pool_config()
+        driver = neo4j.GraphDatabase.driver(
+            uri,
+            auth=(username, password),
+            notifications_min_severity="OFF",
+            **pool_config,
+        )
+        async_driver = neo4j.AsyncGraphDatabase.driver(
+            uri,
+            auth=(username, password),
+            notifications_min_severity="OFF",
+            **pool_config,
+        )
+        _drivers[key] = {
+            "driver": driver,
+            "async_driver": async_driver,
+            "password_hash": password_hash,
+            "databases": [],
+        }
+        print(f"-> 创建共享 Neo4j 驱动: {username}@{uri}, 连接池配置: {pool_config}")
+        return driver, async_driver
+
+
+def _retire_drivers(entry: Dict[str, Any]):
+    """Closes the drivers of a replaced registry entry (called with the lock held)."""
+    try:
+        entry["driver"].close()
+    except Exception as e:
+        print(f"[WARN] 关闭 Neo4j 驱动失败: {e}")
+    async_driver = entry["async_driver"]
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # 异步驱动只能在事件循环中关闭，留到进程退出时关闭
+        _retired_async_drivers.append(async_driver)
+        return
+    task = loop.create_task(_close_async_driver(async_driver))
+    _closing_tasks.add(task)
+    task.add_done_callback(_closing_tasks.discard)
+
+
+async def _close_async_driver(async_driver: neo4j.AsyncDriver):
+    try:
+        await async_driver.close()
+    except Exception as e:
+        print(f"[WARN] 关闭 Neo4j 异步驱动失败: {e}")
+
+
+def _register_database(uri: str, username: str, database: Optional[str]):
+    with _lock:
+        entry = _drivers.get((uri, username))
+        if entry and database and database not in entry["databases"]:
+            entry["databases"].append(database)
+
+
+def get_driver_registry_stats() -> List[Dict[str, Any]]:
+    """Returns the shared drivers with the logical databases using each of them."""
+    with _lock:
+        return [
+            {"uri": uri, "username": username, "databases": list(entry["databases"])}
+            for (uri, username), entry in _drivers.items()
+        ]
+
+
+async def close_all_drivers():
+    """关闭所有共享驱动，包括同步与异步驱动（进程退出时调用）"""
+    with _lock:
+        entries = list(_drivers.values())
+        _drivers.clear()
+        async_drivers = [entry["async_driver"] for entry in entries] + _retired_async_drivers
+        _retired_async_drivers.clear()
+    for entry in entries:
+        try:
+            entry["driver"].close()
+        except Exception as e:
+            print(f"[WARN] 关闭 Neo4j 驱动失败: {e}")
+    if _closing_tasks:
+        await asyncio.gather(*_closing_tasks, return_exceptions=True)
+    await asyncio.gather(*(_close_async_driver(driver) for driver in async_drivers))
+
+
+class SharedNeo4jPropertyGraphStore(Neo4jPropertyGraphStore):
+    """
+    Neo4jPropertyGraphStore that borrows pooled drivers from the registry
+    instead of opening a driver and connection pool of its own.
+    """
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        url: str,
+        database: Optional[str] = "neo4j",
+        refresh_schema: bool = True,
+        sanitize_query_output: bool = True,
+        enhanced_schema: bool = False,
+        create_indexes: bool = False,
+        timeout: Optional[float] = None,
+    ) -> None:
+        # 只读查询场景，不创建 LlamaIndex 的约束和向量索引，create_indexes 仅为兼容父类参数
+        self.sanitize_query_output = sanitize_query_output
+        self.enhanced_schema = enhanced_schema
+        self._driver, self._async_driver = get_shared_drivers(url, username, password)
+        self._database = database
+        self._timeout = timeout
+        self.url = url
+        self.structured_schema = {}
+        _register_database(url, username, database)
+        if refresh_schema:
+            self.refresh_schema()
+        # Verify version to check if we can use vector index
+        self.verify_version()
+
+    def close(self) -> None:
+        # 驱动由多个store共享，不随单个store关闭
+        pass
@@ -0,0 +1,285 @@
+import bisect
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cypher_workflows.shared.filter_extractor import EQUALITY_OPERATORS, extract_filter_literals
+
+# 实体名索引配置，均可通过环境变量覆盖
+ENTITY_INDEX_ENABLED = os.getenv("ENTITY_INDEX_ENABLED", "true").lower() == "true"
+# 参与索引的属性（字符串或字符串列表）
+ENTITY_INDEX_PROPERTIES = [
+    prop.strip()
+    for prop in os.getenv("ENTITY_INDEX_PROPERTIES", "name,aliases").split(",")
+    if prop.strip()
+]
+# 每个标签最多加载的取值个数
+ENTITY_INDEX_MAX_VALUES = int(os.getenv("ENTITY_INDEX_MAX_VALUES", "200000"))
+# 定时重建间隔（秒），0 表示只在启动时构建
+ENTITY_INDEX_REFRESH_INTERVAL = int(os.getenv("ENTITY_INDEX_REFRESH_INTERVAL", "0"))
+# 模糊匹配允许的最大编辑距离
+ENTITY_INDEX_MAX_DISTANCE = int(os.getenv("ENTITY_INDEX_MAX_DISTANCE", "2"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+# 数据库名 -> 实体名索引
+_indexes: Dict[str, "EntityIndex"] = {}
+_lock = threading.Lock()
+
+
+def normalize_name(value: str) -> str:
+    return _WHITESPACE.sub(" ", value.strip().casefold())
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, returns max_distance + 1 as soon as the bound is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def _trigrams(key: str) -> List[str]:
+    padded = f"^{key}$"
+    return [padded[i : i + 3] for i in range(len(padded) - 2)]
+
+
+class EntityIndex:
+    """
+    Sorted array of normalized entity names of one database.
+    Exact lookup is a dict hit, prefix lookup a binary search, and fuzzy lookup
+    only computes edit distances for names sharing enough trigrams with the query.
+    """
+
+    def __init__(self, entries: List[Tuple[str, str, str]]):
+        # entries: (value, label, property)
+        by_key: Dict[str, List[Dict[str, str]]] = {}
+        for value, label, prop in entries:
+            key = normalize_name(value)
+            if not key:
+                continue
+            matches = by_key.setdefault(key, [])
+            entry = {"value": value, "label": label, "property": prop}
+            if entry not in matches:
+                matches.append(entry)
+        self._by_key = by_key
+        self._keys = sorted(by_key)
+        # trigram -> 名称在 _keys 中的下标
+        self._grams: Dict[str, List[int]] = {}
+        for i, key in enumerate(self._keys):
+            for gram in set(_trigrams(key)):
+                self._grams.setdefault(gram, []).append(i)
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _entries(self, key: str, label: Optional[str], **extra) -> List[Dict[str, Any]]:
+        return [
+            {**entry, **extra}
+            for entry in self._by_key.get(key, [])
+            if label is None or entry["label"] == label
+        ]
+
+    def exact(self, name: str, label: Optional[str] = None) -> List[Dict[str, Any]]:
+        return self._entries(normalize_name(name), label, match="exact", distance=0)
+
+    def prefix(
+        self, name: str, label: Optional[str] = None, limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        prefix = normalize_name(name)
+        results = []
+        start = bisect.bisect_left(self._keys, prefix)
+        for key in self._keys[start:]:
+            if not key.startswith(prefix) or len(results) >= limit:
+                break
+            results.extend(
+                self._entries(key, label, match="prefix", distance=len(key) - len(prefix))
+            )
+        return results[:limit]
+
+    def fuzzy(
+        self,
+        name: str,
+        label: Optional[str] = None,
+        max_distance: int = ENTITY_INDEX_MAX_DISTANCE,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        query = normalize_name(name)
+        grams = set(_trigrams(query))
+        # q-gram 引理：编辑距离为 d 的两个串至少共享 len - 3d 个 trigram
+        threshold = max(1, len(grams) - 3 * max_distance)
+        counts: Dict[int, int] = {}
+        for gram in grams:
+            for i in self._grams.get(gram, []):
+                counts[i] = counts.get(i, 0) + 1
+        found: List[Tuple[int, str]] = []
+        for i, count in counts.items():
+            if count < threshold:
+                continue
+            key = self._keys[i]
+            distance = edit_distance(query, key, max_distance)
+            if distance <= max_distance:
+                found.append((distance, key))
+        results = []
+        for distance, key in sorted(found):
+            results.extend(self._entries(key, label, match="fuzzy", distance=distance))
+        return results[:limit]
+
+    def search(
+        self,
+        name: str,
+        mode: str = "auto",
+        label: Optional[str] = None,
+        limit: int = 10,
+        max_distance: int = ENTITY_INDEX_MAX_DISTANCE,
+    ) -> List[Dict[str, Any]]:
+        """
+        Looks a name up by `mode`: exact, prefix, fuzzy, or auto
+        (exact first, then prefix, then fuzzy).
+        """
+        if mode == "exact":
+            return self.exact(name, label)[:limit]
+        if mode == "prefix":
+            return self.prefix(name, label, limit)
+        if mode == "fuzzy":
+            return self.fuzzy(name, label, max_distance, limit)
+        return (
+            self.exact(name, label)
+            or self.prefix(name, label, limit)
+            or self.fuzzy(name, label, max_distance, limit)
+        )[:limit]
+
+
+def _load_entries(graph_store) -> List[Tuple[str, str, str]]:
+    """Reads the indexed property values of every label in the schema."""
+    entries = []
+    node_props = graph_store.get_schema().get("node_props", {})
+    for label, props in node_props.items():
+        for prop in props:
+            key = prop.get("property")
+            if key not in ENTITY_INDEX_PROPERTIES:
+                continue
+            rows = graph_store.structured_query(
+                f"MATCH (n:`{label}`) WHERE n.`{key}` IS NOT NULL "
+                f"RETURN n.`{key}` AS value LIMIT $limit",
+                {"limit": ENTITY_INDEX_MAX_VALUES},
+            )
+            for row in rows:
+                values = row["value"] if isinstance(row["value"], list) else [row["value"]]
+                entries.extend(
+                    (value, label, key) for value in values if isinstance(value, str)
+                )
+    return entries
+
+
+def build_entity_index(database_name: str, graph_store) -> Optional[EntityIndex]:
+    """Builds the entity-name index of a database and swaps it in."""
+    start = time.perf_counter()
+    try:
+        index = EntityIndex(_load_entries(graph_store))
+    except Exception as e:
+        print(f"[WARN] 构建实体名索引失败 ({database_name}): {e}")
+        return None
+    with _lock:
+        _indexes[database_name] = index
+    print(
+        f"-> 实体名索引已构建: {database_name}, {len(index)} 个名称, "
+        f"耗时 {time.perf_counter() - start:.2f}s"
+    )
+    return index
+
+
+def get_entity_index(database_name: str) -> Optional[EntityIndex]:
+    with _lock:
+        return _indexes.get(database_name)
+
+
+def start_entity_index_builder(
+    databases: Dict[str, Dict[str, Any]], refresh: bool = True
+) -> Optional[threading.Thread]:
+    """
+    Builds the indexes of the databases in a background thread, so startup is not blocked.
+    With `refresh`, they are rebuilt every ENTITY_INDEX_REFRESH_INTERVAL seconds when configured.
+    """
+    if not ENTITY_INDEX_ENABLED:
+        return None
+
+    def _run():
+        while True:
+            for name, db in list(databases.items()):
+                build_entity_index(name, db["graph_store"])
+            if not refresh or ENTITY_INDEX_REFRESH_INTERVAL <= 0:
+                break
+            time.sleep(ENTITY_INDEX_REFRESH_INTERVAL)
+
+    thread = threading.Thread(target=_run, name="entity-index-builder", daemon=True)
+    thread.start()
+    return thread
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def rewrite_entity_literals(
+    cypher: str, database_name: str
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Replaces entity names in string filters on indexed properties with the value
+    stored in the database when there is exactly one close match
+    (different casing, a longer stored name, or a small typo).
+    Only the literal of each matched "=" or "IN" filter is rewritten; the same text
+    elsewhere in the statement is left alone.
+    Returns the rewritten statement and the applied rewrites.
+    """
+    index = get_entity_index(database_name)
+    if index is None or not len(index):
+        return cypher, []
+
+    rewrites = []
+    replacements = []
+    resolved: Dict[Tuple[str, str, str], Optional[Dict[str, Any]]] = {}
+    for (label, key, operator, value), span in extract_filter_literals(cypher):
+        # 只改写精确匹配的取值；STARTS WITH / CONTAINS 等部分匹配的取值本来就不是完整名称
+        if (
+            operator not in EQUALITY_OPERATORS
+            or key not in ENTITY_INDEX_PROPERTIES
+            or not isinstance(value, str)
+        ):
+            continue
+        marker = (label, key, value)
+        if marker not in resolved:
+            matches = [
+                m for m in index.search(value, label=label, limit=2) if m["property"] == key
+            ]
+            match = matches[0] if len(matches) == 1 and matches[0]["value"] != value else None
+            resolved[marker] = match
+            if match is not None:
+                rewrites.append(
+                    {
+                        "label": label,
+                        "property": key,
+                        "from": value,
+                        "to": match["value"],
+                        "match": match["match"],
+                    }
+                )
+        if resolved[marker] is not None:
+            replacements.append((span, resolved[marker]["value"]))
+
+    # 从后往前替换，前面字面量的位置不受影响
+    for (start, end), replacement in reversed(replacements):
+        cypher = cypher[:start] + _quote(replacement) + cypher[end:]
+    return cypher, rewrites
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import random
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from cypher_workflows.shared.filter_extractor import tokenize
+from cypher_workflows.shared.metrics import gauge_lines, register_collector
+from cypher_workflows.shared.utils import check_ok
+
+# 数据库输出评估策略：llm 每次都调用LLM评估；hybrid 先用本地打分，明确的情况不再调用LLM
+EVALUATION_POLICY = os.getenv("EVALUATION_POLICY", "hybrid").lower()
+# 本地打分不低于该阈值时直接判定 Ok
+EVALUATION_OK_THRESHOLD = float(os.getenv("EVALUATION_OK_THRESHOLD", "0.75"))
+# 本地判定 Ok 的结果中抽样交给LLM复核的比例。本地打分只看结果与问题的字面重合，
+# 无法确认查询语义（如关系类型）是否正确，抽样复核是发现误判的保障，不要设为 0
+EVALUATION_AUDIT_RATE = float(os.getenv("EVALUATION_AUDIT_RATE", "0.05"))
+# 结果行数达到该值视为被截断（查询过宽），不走快速路径
+EVALUATION_MAX_ROWS = int(os.getenv("EVALUATION_MAX_ROWS", "100"))
+
+_ERROR_MARKERS = (
+    "error",
+    "exception",
+    "traceback",
+    "neo.clienterror",
+    "neo.transienterror",
+    "neo.databaseerror",
+    "timed out",
+    "exceeds the cost budget",
+)
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+_CJK = re.compile(r"[一-鿿]+")
+_STOPWORDS = {
+    "the", "and", "for", "with", "what", "which", "who", "whom", "how", "many", "much",
+    "are", "was", "were", "is", "did", "does", "have", "has", "from", "that", "this",
+    "list", "show", "give", "find", "all", "any", "of", "in", "on", "to", "by", "me",
+}
+
+evaluation_stats = {
+    "evaluations": 0,
+    "heuristic_ok": 0,
+    "heuristic_error": 0,
+    "llm_calls": 0,
+    "llm_ok": 0,
+    # 抽样复核：本地判定 Ok 后LLM也判定 Ok 的次数
+    "audits": 0,
+    "audit_agreements": 0,
+}
+_stats_lock = threading.Lock()
+# 后台复核任务的引用，避免任务在完成前被回收
+_audit_tasks = set()
+
+
+register_collector(
+    lambda: gauge_lines(
+        "text2cypher_background_tasks",
+        "Background tasks pending by kind.",
+        [({"kind": "evaluation_audit"}, len(_audit_tasks))],
+    )
+)
+
+
+def _terms(text: str) -> set:
+    """Lower-cased words of length >= 3 plus CJK character bigrams."""
+    terms = {
+        word.lower()
+        for word in _WORD.findall(text)
+        if len(word) >= 3 and word.lower() not in _STOPWORDS and not _CJK.fullmatch(word)
+    }
+    for run in _CJK.findall(text):
+        terms.update(run[i : i + 2] for i in range(max(1, len(run) - 1)))
+    return terms
+
+
+def _literal_terms(cypher: str) -> set:
+    """Terms of the string literals in the statement."""
+    try:
+        tokens = tokenize(cypher or "")
+    except ValueError:
+        return set()
+    terms = set()
+    for kind, value in tokens:
+        if kind == "string":
+            terms |= _terms(value)
+    return terms
+
+
+def score_database_output(
+    question: str,
+    cypher: str,
+    context: str,
+    records: Optional[List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """
+    Cheap local check of a query result. Returns {"verdict", "score", "reasons"} where
+    verdict is "ok" (clearly answers the question), "error" (the query failed) or
+    "uncertain" (needs the LLM evaluation).
+    Only the result counts as evidence: question terms must appear both in the returned
+    columns and in the returned values. Values that echo a string literal of the query
+    (usually the filtered entity) are not evidence, since the generated query copies them
+    from the question whether it is right or not.
+    Column aliases are chosen by the same LLM, so an "ok" verdict is still a guess about
+    the query's semantics; EVALUATION_AUDIT_RATE samples these verdicts for an LLM audit.
+    """
+    rows = records
+    if rows is None:
+        # 没有记录说明查询未执行成功，context 中是错误信息
+        lowered = context.lower()
+        if any(marker in lowered for marker in _ERROR_MARKERS):
+            return {"verdict": "error", "score": 0.0, "reasons": ["execution error"]}
+        return {"verdict": "uncertain", "score": 0.0, "reasons": ["no records"]}
+    if not rows:
+        # 空结果也可能是正确答案（如“是否存在…”），交给LLM判断
+        return {"verdict": "uncertain", "score": 0.0, "reasons": ["empty result"]}
+
+    reasons = []
+    score = 0.4
+    values = [value for row in rows for value in row.values()]
+    non_null = sum(value not in (None, "", [], {}) for value in values)
+    if not values or non_null == 0:
+        return {"verdict": "uncertain", "score": 0.0, "reasons": ["all values null"]}
+    score += 0.2 * non_null / len(values)
+
+    # 问题中的词与返回列名、结果取值的重合
+    question_terms = _terms(question)
+    column_terms = set()
+    for column in rows[0]:
+        column_terms |= _terms(str(column).replace(".", " "))
+    value_terms = set()
+    for value in values[:200]:
+        if isinstance(value, str):
+            value_terms |= _terms(value)
+    column_overlap = question_terms & column_terms
+    # 查询中字面量的回显（如过滤的实体名）不算证据
+    value_overlap = (question_terms & value_terms) - _literal_terms(cypher)
+    if column_overlap:
+        score += 0.15
+        reasons.append(f"columns match: {sorted(column_overlap)[:5]}")
+    else:
+        reasons.append("no overlap between question and columns")
+    if value_overlap:
+        score += 0.15
+        reasons.append(f"values match: {sorted(value_overlap)[:5]}")
+    else:
+        reasons.append("no overlap between question and values")
+
+    if len(rows) >= EVALUATION_MAX_ROWS:
+        reasons.append("result truncated")
+    else:
+        score += 0.1
+
+    # 列名和取值都与问题相符才跳过LLM评估
+    if (
+        column_overlap
+        and value_overlap
+        and score >= EVALUATION_OK_THRESHOLD
+        and len(rows) < EVALUATION_MAX_ROWS
+    ):
+        verdict = "ok"
+    else:
+        verdict = "uncertain"
+    return {"verdict": verdict, "score": round(score, 3), "reasons": reasons}
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        evaluation_stats[key] += amount
+
+
+def get_evaluation_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(evaluation_stats)
+    evaluations = stats["evaluations"]
+    skipped = stats["heuristic_ok"] + stats["heuristic_error"]
+    stats["policy"] = EVALUATION_POLICY
+    stats["skip_rate"] = skipped / evaluations if evaluations else 0.0
+    stats["audit_agreement_rate"] = (
+        stats["audit_agreements"] / stats["audits"] if stats["audits"] else None
+    )
+    return stats
+
+
+async def _audit(llm_evaluate):
+    try:
+        if check_ok(await llm_evaluate()):
+            _count("audit_agreements")
+    except Exception as e:
+        print(f"[WARN] 评估抽样复核失败: {e}")
+
+
+async def _llm_evaluation(llm_evaluate) -> str:
+    _count("llm_calls")
+    evaluation = await llm_evaluate()
+    if check_ok(evaluation):
+        _count("llm_ok")
+    return evaluation
+
+
+async def evaluate_with_policy(
+    llm_evaluate,
+    question: str,
+    cypher: str,
+    context: str,
+    records: Optional[List[Dict[str, Any]]],
+) -> Dict[str, Any]:
+    """
+    Applies EVALUATION_POLICY. `llm_evaluate` is a zero-argument coroutine function
+    running the LLM evaluation. Returns {"evaluation", "source", "score"}; "evaluation"
+    is "Ok" or the reason the result is insufficient, like the LLM step.
+    """
+    _count("evaluations")
+    if EVALUATION_POLICY != "hybrid":
+        return {"evaluation": await _llm_evaluation(llm_evaluate), "source": "llm", "score": None}
+
+    scored = score_database_output(question, cypher, context, records)
+    if scored["verdict"] == "error":
+        _count("heuristic_error")
+        return {
+            "evaluation": f"The query failed with the following error, fix the Cypher query: {context}",
+            "source": "heuristic",
+            "score": scored["score"],
+        }
+    if scored["verdict"] == "ok":
+        _count("heuristic_ok")
+        # 抽样交给LLM在后台复核本地判定，不阻塞本次请求
+        if random.random() < EVALUATION_AUDIT_RATE:
+            _count("audits")
+            _count("llm_calls")
+            task = asyncio.create_task(_audit(llm_evaluate))
+            _audit_tasks.add(task)
+            task.add_done_callback(_audit_tasks.discard)
+        return {"evaluation": "Ok", "source": "heuristic", "score": scored["score"]}
+
+    return {
+        "evaluation": await _llm_evaluation(llm_evaluate),
+        "source": "llm",
+        "score": scored["score"],
+    }
@@ -0,0 +1,387 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from cypher_workflows.shared.parameterizer import read_string_literal
+
+_TOKEN_PATTERNS = [
+    ("number", re.compile(r"\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")),
+    ("identifier", re.compile(r"[^\W\d]\w*")),
+    ("param", re.compile(r"\$(?:[^\W\d]\w*|\d+)")),
+    ("op", re.compile(r"<>|<=|>=|=~|\.\.|->|<-|[=<>]")),
+]
+_COMPARISON_OPS = {"=", "<>", "<", ">", "<=", ">=", "=~"}
+_STRING_OPS = {"STARTS", "ENDS"}
+# 字面量写在左边时（1950 < p.born）换成属性在左边的运算符
+_FLIPPED_OPS = {"=": "=", "<>": "<>", "<": ">", ">": "<", "<=": ">=", ">=": "<="}
+# 精确匹配的运算符，只有这些过滤条件的取值应与数据库中的值完全一致
+EQUALITY_OPERATORS = ("=", "IN")
+# WHERE 之后遇到这些子句关键字时过滤条件结束
+_CLAUSE_KEYWORDS = {
+    "RETURN", "WITH", "MATCH", "OPTIONAL", "UNWIND", "ORDER", "SKIP", "LIMIT", "CALL",
+    "YIELD", "UNION", "CREATE", "MERGE", "SET", "DELETE", "DETACH", "REMOVE", "FOREACH",
+}
+# 出现在节点模式前的关键字；其他标识符后的括号是函数调用
+_PATTERN_KEYWORDS = {"MATCH", "WHERE", "AND", "OR", "XOR", "NOT", "MERGE", "CREATE"}
+# 紧跟在字面量之后说明它只是表达式的一部分
+_ARITHMETIC = {"+", "-", "*", "/", "%", "^", ".", "[", "("}
+
+Token = Tuple[str, Any]
+# (节点标签, 属性名, 运算符, 字面量)
+FilterTriple = Tuple[str, str, str, Any]
+# 过滤条件及其字面量所在的标记下标
+_LocatedFilter = Tuple[FilterTriple, int]
+
+
+def tokenize(cypher: str) -> List[Token]:
+    """
+    Splits a Cypher statement into (kind, value) tokens.
+    Kinds are string, number, bool, identifier, param, op and punct; comments are dropped.
+    """
+    return _tokenize_with_spans(cypher)[0]
+
+
+def _tokenize_with_spans(cypher: str) -> Tuple[List[Token], List[Tuple[int, int]]]:
+    """Tokens together with their (start, end) offsets in the statement."""
+    tokens: List[Token] = []
+    spans: List[Tuple[int, int]] = []
+    i = 0
+    n = len(cypher)
+    while i < n:
+        ch = cypher[i]
+        start = i
+        if ch.isspace():
+            i += 1
+            continue
+        elif cypher.startswith("//", i):
+            end = cypher.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif cypher.startswith("/*", i):
+            end = cypher.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif ch == "`":
+            end = cypher.find("`", i + 1)
+            if end == -1:
+                raise ValueError("Unterminated backtick identifier")
+            tokens.append(("identifier", cypher[i + 1 : end]))
+            i = end + 1
+        elif ch in ("'", '"'):
+            value, i = read_string_literal(cypher, i)
+            tokens.append(("string", value))
+        else:
+            for kind, pattern in _TOKEN_PATTERNS:
+                match = pattern.match(cypher, i)
+                if match:
+                    text = match.group(0)
+                    if kind == "number":
+                        value = float(text) if any(c in text for c in ".eE") else int(text)
+                        tokens.append(("number", value))
+                    elif kind == "identifier" and text.lower() in ("true", "false"):
+                        tokens.append(("bool", text.lower() == "true"))
+                    else:
+                        tokens.append((kind, text))
+                    i = match.end()
+                    break
+            else:
+                tokens.append(("punct", ch))
+                i += 1
+        spans.append((start, i))
+    return tokens, spans
+
+
+def _is_literal(token: Optional[Token]) -> bool:
+    return token is not None and token[0] in ("string", "number", "bool")
+
+
+def _token(tokens: List[Token], index: int) -> Optional[Token]:
+    return tokens[index] if 0 <= index < len(tokens) else None
+
+
+def _read_literal(tokens: List[Token], index: int) -> Tuple[Optional[Any], int]:
+    """Reads a literal (with an optional minus sign) at `index`, returns it and the next index."""
+    token = _token(tokens, index)
+    if token == ("op", "-") or token == ("punct", "-"):
+        nxt = _token(tokens, index + 1)
+        if nxt and nxt[0] == "number":
+            return -nxt[1], index + 2
+        return None, index
+    if _is_literal(token):
+        return token[1], index + 1
+    return None, index
+
+
+def _ends_operand(tokens: List[Token], index: int) -> bool:
+    nxt = _token(tokens, index)
+    return nxt is None or not (nxt[0] in ("punct", "op") and nxt[1] in _ARITHMETIC)
+
+
+def _is_keyword(tokens: List[Token], index: int) -> bool:
+    """Whether the identifier at `index` is used as a keyword."""
+    prev = _token(tokens, index - 1)
+    # 属性名（n.limit）、标签（:Match）、映射键（{limit: 1}）和 STARTS WITH 中的 WITH
+    # 不是子句关键字
+    return (
+        prev not in (("punct", "."), ("punct", ":"))
+        and _token(tokens, index + 1) != ("punct", ":")
+        and not (prev and prev[0] == "identifier" and str(prev[1]).upper() in _STRING_OPS)
+    )
+
+
+def _where_mask(tokens: List[Token]) -> List[bool]:
+    """Marks the tokens that belong to a WHERE clause (until the next clause keyword)."""
+    mask = []
+    in_where = False
+    for i, token in enumerate(tokens):
+        if token[0] == "identifier":
+            is_keyword = _is_keyword(tokens, i)
+            if is_keyword and token[1].upper() == "WHERE":
+                in_where = True
+            elif is_keyword and token[1].upper() in _CLAUSE_KEYWORDS:
+                in_where = False
+        mask.append(in_where)
+    return mask
+
+
+def _negation_mask(tokens: List[Token]) -> List[bool]:
+    """
+    Marks the tokens of the operands of NOT: a parenthesized expression, or everything up
+    to the next AND, OR, XOR or clause keyword (NOT binds looser than comparisons).
+    """
+    mask = [False] * len(tokens)
+    for i, token in enumerate(tokens):
+        if token[0] != "identifier" or token[1].upper() != "NOT" or not _is_keyword(tokens, i):
+            continue
+        depth = 0
+        for j in range(i + 1, len(tokens)):
+            kind, value = tokens[j]
+            if kind == "punct" and value in ("(", "[", "{"):
+                depth += 1
+            elif kind == "punct" and value in (")", "]", "}"):
+                if depth == 0:
+                    break
+                depth -= 1
+            elif (
+                depth == 0
+                and kind == "identifier"
+                and value.upper() in _CLAUSE_KEYWORDS | {"AND", "OR", "XOR"}
+                and _is_keyword(tokens, j)
+            ):
+                break
+            mask[j] = True
+    return mask
+
+
+def _parse_node_patterns(
+    tokens: List[Token],
+) -> Tuple[Dict[str, str], List[_LocatedFilter]]:
+    """
+    Finds node patterns `(var:Label {key: literal})` and returns the variable-to-label
+    mapping together with the inline property filters (operator "=").
+    """
+    labels: Dict[str, str] = {}
+    filters: List[_LocatedFilter] = []
+    for i, token in enumerate(tokens):
+        if token != ("punct", "("):
+            continue
+        # 函数调用 count(n) 之类不是节点模式
+        prev = _token(tokens, i - 1)
+        if prev and prev[0] == "identifier" and prev[1].upper() not in _PATTERN_KEYWORDS:
+            continue
+        j = i + 1
+        variable = None
+        if _token(tokens, j) and tokens[j][0] == "identifier":
+            variable = tokens[j][1]
+            j += 1
+        label = None
+        if _token(tokens, j) == ("punct", ":"):
+            label_token = _token(tokens, j + 1)
+            if not label_token or label_token[0] != "identifier":
+                continue
+            label = label_token[1]
+            j += 2
+            # 跳过其余标签，如 :Person:Actor 或 :Person&Actor
+            while _token(tokens, j) in (("punct", ":"), ("punct", "&"), ("punct", "|")):
+                j += 2
+        elif _token(tokens, j) not in (("punct", "{"), ("punct", ")")):
+            continue
+
+        if variable and label:
+            labels.setdefault(variable, label)
+        if not label and variable:
+            label = labels.get(variable)
+
+        if _token(tokens, j) != ("punct", "{"):
+            continue
+        j += 1
+        while _token(tokens, j) and tokens[j] != ("punct", "}"):
+            key = tokens[j]
+            if key[0] != "identifier" or _token(tokens, j + 1) != ("punct", ":"):
+                break
+            value, after = _read_literal(tokens, j + 2)
+            if after != j + 2 and label and _token(tokens, after) in (
+                ("punct", ","),
+                ("punct", "}"),
+            ):
+                filters.append(((label, key[1], "=", value), after - 1))
+            # 跳到下一个属性
+            depth = 0
+            j += 2
+            while _token(tokens, j):
+                if tokens[j][1] in ("(", "[", "{") and tokens[j][0] == "punct":
+                    depth += 1
+                elif tokens[j][1] in (")", "]", "}") and tokens[j][0] == "punct":
+                    if depth == 0:
+                        break
+                    depth -= 1
+                elif tokens[j] == ("punct", ",") and depth == 0:
+                    j += 1
+                    break
+                j += 1
+    return labels, filters
+
+
+def _read_property(tokens: List[Token], index: int) -> Optional[Tuple[str, str]]:
+    """Reads `var.key` at `index`, returns (var, key)."""
+    var = _token(tokens, index)
+    dot = _token(tokens, index + 1)
+    key = _token(tokens, index + 2)
+    if (
+        var
+        and var[0] == "identifier"
+        and dot == ("punct", ".")
+        and key
+        and key[0] == "identifier"
+    ):
+        return var[1], key[1]
+    return None
+
+
+def _parse_comparisons(
+    tokens: List[Token], labels: Dict[str, str]
+) -> List[_LocatedFilter]:
+    """
+    Finds `var.key <op> literal` and `literal <op> var.key` comparisons, plus
+    `var.key IN [literals]`, inside WHERE clauses. Property-to-property comparisons,
+    negated comparisons (`NOT p.name = 'x'`) and comparisons elsewhere
+    (e.g. `RETURN p.born = 1956`) are ignored.
+    """
+    filters: List[_LocatedFilter] = []
+    in_where = _where_mask(tokens)
+    negated = _negation_mask(tokens)
+    for i in range(len(tokens)):
+        if not in_where[i] or negated[i]:
+            continue
+        prop = _read_property(tokens, i)
+        if not prop:
+            continue
+        # var.key 本身不能是更长属性链或函数参数的一部分
+        prev = _token(tokens, i - 1)
+        if prev == ("punct", "."):
+            continue
+        var, key = prop
+        label = labels.get(var)
+        if not label:
+            continue
+
+        j = i + 3
+        op = _token(tokens, j)
+        if op is None:
+            continue
+        # (字面量, 标记下标)
+        values: List[Tuple[Any, int]] = []
+        operator = None
+        if op[0] == "op" and op[1] in _COMPARISON_OPS:
+            operator = op[1]
+            value, after = _read_literal(tokens, j + 1)
+            if after != j + 1 and _ends_operand(tokens, after):
+                values.append((value, after - 1))
+        elif op[0] == "identifier" and op[1].upper() in _STRING_OPS | {"CONTAINS"}:
+            # STARTS WITH / ENDS WITH 占两个标记
+            if op[1].upper() == "CONTAINS":
+                operator, start = "CONTAINS", j + 1
+            elif _token(tokens, j + 1) and str(tokens[j + 1][1]).upper() == "WITH":
+                operator, start = f"{op[1].upper()} WITH", j + 2
+            else:
+                start = None
+            if start is not None:
+                value, after = _read_literal(tokens, start)
+                if after != start and _ends_operand(tokens, after):
+                    values.append((value, after - 1))
+        elif op[0] == "identifier" and op[1].upper() == "IN":
+            operator = "IN"
+            if _token(tokens, j + 1) == ("punct", "["):
+                k = j + 2
+                items = []
+                while True:
+                    value, after = _read_literal(tokens, k)
+                    if after == k:
+                        items = []
+                        break
+                    items.append((value, after - 1))
+                    if _token(tokens, after) == ("punct", ","):
+                        k = after + 1
+                    elif _token(tokens, after) == ("punct", "]"):
+                        break
+                    else:
+                        items = []
+                        break
+                values.extend(items)
+        filters.extend(((label, key, operator, value), index) for value, index in values)
+
+        # literal <op> var.key（'x' =~ p.name 中属性是正则表达式，不算过滤条件）
+        if prev and prev[0] == "op" and prev[1] in _FLIPPED_OPS:
+            before = _token(tokens, i - 2)
+            before_prev = _token(tokens, i - 3)
+            in_expression = (
+                before_prev
+                and before_prev[0] in ("punct", "op")
+                and before_prev[1] in _ARITHMETIC
+            )
+            if _is_literal(before) and not in_expression and _ends_operand(tokens, i + 3):
+                filters.append(((label, key, _FLIPPED_OPS[prev[1]], before[1]), i - 2))
+    return filters
+
+
+def _locate_filters(cypher: str) -> Tuple[List[_LocatedFilter], List[Tuple[int, int]]]:
+    try:
+        tokens, spans = _tokenize_with_spans(cypher)
+    except ValueError as e:
+        print(f"[WARN] 解析Cypher过滤条件失败: {e}")
+        return [], []
+    labels, filters = _parse_node_patterns(tokens)
+    filters.extend(_parse_comparisons(tokens, labels))
+    return filters, spans
+
+
+def extract_filter_triples(cypher: str) -> List[FilterTriple]:
+    """
+    Extracts (node_label, property_key, operator, literal) filters from the MATCH patterns
+    and WHERE clauses of a Cypher statement, in order of appearance and without duplicates.
+    Operators are "=", "<>", "<", ">", "<=", ">=", "=~", "CONTAINS", "STARTS WITH",
+    "ENDS WITH" and "IN" (one filter per list item); only "=" and "IN" require the
+    literal to equal a stored value (see EQUALITY_OPERATORS).
+    Only comparisons against literal strings, numbers and booleans are returned;
+    comparisons under NOT are skipped, and variables whose label is not declared in a
+    node pattern are ignored.
+    """
+    filters, _ = _locate_filters(cypher)
+
+    seen = set()
+    unique = []
+    for (label, key, operator, value), _ in filters:
+        marker = (label, key, operator, type(value).__name__, value)
+        if marker not in seen:
+            seen.add(marker)
+            unique.append((label, key, operator, value))
+    return unique
+
+
+def extract_filter_literals(cypher: str) -> List[Tuple[FilterTriple, Tuple[int, int]]]:
+    """
+    Like extract_filter_triples, but returns every occurrence of a filter together with
+    the (start, end) offsets of its literal in the statement, so callers can rewrite
+    exactly that literal. Occurrences are ordered by position.
+    """
+    filters, spans = _locate_filters(cypher)
+    return sorted(((triple, spans[index]) for triple, index in filters), key=lambda f: f[1])
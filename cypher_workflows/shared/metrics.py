@@ -0,0 +1,220 @@
+import bisect
+import math
+import threading
+from typing import Callable, Dict, List, Tuple
+
+# Prometheus 文本格式的 Content-Type
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 查询返回行数的桶上界
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶计数..., +Inf 桶计数, 总和]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(entry)) for key, entry in self._values.items())
+        lines = self._header()
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), entry[:-1]):
+                cumulative += count
+                le = f'le="{_format_number(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(entry[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+_registry: List[_Metric] = []
+# 抓取时调用的回调，返回额外的指标行（用于只在抓取时才计算的取值）
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collector: Callable[[], List[str]]):
+    _collectors.append(collector)
+
+
+def gauge_lines(name: str, documentation: str, samples: List[Tuple[Dict[str, object], float]]) -> List[str]:
+    """Renders scrape-time gauge samples for a collector."""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        names = tuple(labels)
+        lines.append(
+            f"{name}{_format_labels(names, tuple(labels[n] for n in names))} {_format_number(value)}"
+        )
+    return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            print(f"[WARN] 指标采集失败: {e}")
+    return "\n".join(lines) + "\n"
+
+
+# 请求
+REQUESTS = Counter(
+    "text2cypher_requests_total",
+    "Workflow requests by workflow, LLM, database and outcome.",
+    ("workflow", "llm", "database", "outcome"),
+)
+REQUEST_DURATION = Histogram(
+    "text2cypher_request_duration_seconds",
+    "Workflow request duration.",
+    ("workflow", "llm", "database", "outcome"),
+)
+INFLIGHT_REQUESTS = Gauge(
+    "text2cypher_inflight_requests",
+    "Workflow runs in progress by mode (execute, stream).",
+    ("mode",),
+)
+BATCH_QUEUE_DEPTH = Gauge(
+    "text2cypher_batch_queue_depth",
+    "Batch requests waiting for a concurrency slot.",
+)
+
+# 工作流阶段
+STEP_DURATION = Histogram(
+    "text2cypher_step_duration_seconds",
+    "Workflow stage duration.",
+    ("stage", "workflow", "llm", "database"),
+)
+
+# LLM
+LLM_CALLS = Counter(
+    "text2cypher_llm_calls_total",
+    "LLM calls by workflow step, model and outcome.",
+    ("step", "model", "outcome"),
+)
+LLM_TOKENS = Counter(
+    "text2cypher_llm_tokens_total",
+    "LLM tokens by workflow step, model and direction (input, output).",
+    ("step", "model", "direction"),
+)
+LLM_LATENCY = Histogram(
+    "text2cypher_llm_latency_seconds",
+    "LLM call latency by workflow step and model.",
+    ("step", "model"),
+)
+LLM_COST = Counter(
+    "text2cypher_llm_cost_usd_total",
+    "Estimated LLM cost in US dollars by workflow step and model.",
+    ("step", "model"),
+)
+
+# Neo4j
+NEO4J_QUERY_DURATION = Histogram(
+    "text2cypher_neo4j_query_duration_seconds",
+    "Neo4j read transaction duration by database and outcome.",
+    ("database", "outcome"),
+)
+NEO4J_QUERY_ROWS = Histogram(
+    "text2cypher_neo4j_query_rows",
+    "Rows returned per Neo4j query.",
+    ("database",),
+    buckets=ROW_BUCKETS,
+)
+
+# 缓存命中（命中率 = hit / (hit + miss)）
+CACHE_LOOKUPS = Counter(
+    "text2cypher_cache_lookups_total",
+    "Cache lookups by cache (plan, workflow_pool, schema_snapshot) and result (hit, miss).",
+    ("cache", "result"),
+)
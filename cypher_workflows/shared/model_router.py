@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cypher_workflows.shared.metrics import LLM_CALLS, LLM_COST, LLM_LATENCY, LLM_TOKENS
+from cypher_workflows.shared.request_context import SPAN_CLIENT, record_trace_span
+
+# 工作流步骤名，与 MODEL_ROUTING / 请求中的 step_models 对应
+STEPS = (
+    "guardrails",
+    "plan",
+    "generate",
+    "correct",
+    "evaluate",
+    "information_check",
+    "summarize",
+)
+
+# 按步骤指定模型，例如 "guardrails=haiku-3.5,evaluate=ministral-8b"；未配置的步骤使用请求的模型
+MODEL_ROUTING = {
+    step.strip(): model.strip()
+    for step, _, model in (
+        item.partition("=") for item in os.getenv("MODEL_ROUTING", "").split(",")
+    )
+    if step.strip() and model.strip()
+}
+
+# 各模型每百万 token 的美元价格 (输入, 输出)，为公开价目的近似值，可用 MODEL_PRICES 覆盖
+DEFAULT_MODEL_PRICES = {
+    "gpt-4o": (2.5, 10.0),
+    "gemini-1.5-pro": (1.25, 5.0),
+    "gemini-1.5-flash": (0.075, 0.3),
+    "sonnet-3.5": (3.0, 15.0),
+    "haiku-3.5": (0.8, 4.0),
+    "mistral-medium": (2.7, 8.1),
+    "mistral-large": (2.0, 6.0),
+    "ministral-8b": (0.1, 0.1),
+    "deepseek-v3": (0.27, 1.1),
+}
+
+
+def _parse_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """Parses "model=input/output,..." into {model: (input, output)}."""
+    prices = {}
+    for item in value.split(","):
+        name, _, price = item.partition("=")
+        input_price, _, output_price = price.partition("/")
+        try:
+            prices[name.strip()] = (float(input_price), float(output_price or input_price))
+        except ValueError:
+            continue
+    return prices
+
+
+MODEL_PRICES = {**DEFAULT_MODEL_PRICES, **_parse_prices(os.getenv("MODEL_PRICES", ""))}
+
+# 模型名 -> LLM 实例，由 ResourceManager 初始化模型后注册
+_models: Dict[str, Any] = {}
+# (步骤, 模型) -> 累计调用统计
+_step_stats: Dict[Tuple[str, str], Dict[str, float]] = {}
+_lock = threading.Lock()
+
+
+def register_models(llms: List[Tuple[str, Any]]):
+    with _lock:
+        _models.clear()
+        _models.update(dict(llms))
+
+
+def get_model_name(llm) -> str:
+    with _lock:
+        for name, model in _models.items():
+            if model is llm:
+                return name
+    return getattr(llm, "model", None) or type(llm).__name__
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def _message_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(getattr(m, "content", m) or "") for m in messages)
+
+
+def _usage_from_raw(raw) -> Optional[Tuple[int, int]]:
+    """Reads provider token usage (OpenAI, Anthropic or Gemini style) from a raw response."""
+    usage = raw.get("usage") if isinstance(raw, dict) else getattr(raw, "usage", None)
+    if usage is None and isinstance(raw, dict):
+        usage = raw.get("usage_metadata")
+    if usage is None:
+        return None
+    if not isinstance(usage, dict):
+        usage = {key: getattr(usage, key, None) for key in dir(usage) if not key.startswith("_")}
+    for input_key, output_key in (
+        ("prompt_tokens", "completion_tokens"),
+        ("input_tokens", "output_tokens"),
+        ("prompt_token_count", "candidates_token_count"),
+    ):
+        if isinstance(usage.get(input_key), int) and isinstance(usage.get(output_key), int):
+            return usage[input_key], usage[output_key]
+    return None
+
+
+def estimate_cost(model_name: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+    price = MODEL_PRICES.get(model_name)
+    if price is None:
+        return None
+    return (input_tokens * price[0] + output_tokens * price[1]) / 1_000_000
+
+
+def _record(
+    usage: Optional[List[Dict[str, Any]]],
+    step: str,
+    model_name: str,
+    latency: float,
+    input_tokens: int,
+    output_tokens: int,
+    error: bool = False,
+):
+    cost = estimate_cost(model_name, input_tokens, output_tokens)
+    LLM_CALLS.inc(step=step, model=model_name, outcome="error" if error else "success")
+    LLM_LATENCY.observe(latency, step=step, model=model_name)
+    LLM_TOKENS.inc(input_tokens, step=step, model=model_name, direction="input")
+    LLM_TOKENS.inc(output_tokens, step=step, model=model_name, direction="output")
+    if cost:
+        LLM_COST.inc(cost, step=step, model=model_name)
+    # 属性名沿用 OpenTelemetry 生成式 AI 语义约定
+    record_trace_span(
+        f"llm {step}",
+        time.time() - latency,
+        latency,
+        error,
+        kind=SPAN_CLIENT,
+        **{
+            "gen_ai.request.model": model_name,
+            "gen_ai.usage.input_tokens": input_tokens,
+            "gen_ai.usage.output_tokens": output_tokens,
+            "text2cypher.step": step,
+            "text2cypher.cost_usd": cost,
+        },
+    )
+    with _lock:
+        stats = _step_stats.setdefault(
+            (step, model_name),
+            {
+                "calls": 0,
+                "errors": 0,
+                "total_latency": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cost": 0.0,
+            },
+        )
+        stats["calls"] += 1
+        stats["errors"] += int(error)
+        stats["total_latency"] += latency
+        stats["input_tokens"] += input_tokens
+        stats["output_tokens"] += output_tokens
+        stats["cost"] += cost or 0.0
+    if usage is not None:
+        usage.append(
+            {
+                "step": step,
+                "model": model_name,
+                "latency": round(latency, 3),
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "cost": cost,
+                "error": error,
+            }
+        )
+
+
+class RoutedLLM:
+    """
+    LLM wrapper bound to a workflow step. Chat and completion calls are timed and
+    their token usage and estimated cost recorded per (step, model); every other
+    attribute is delegated to the wrapped LLM.
+    """
+
+    def __init__(self, llm, step: str, model_name: str, usage: Optional[List[Dict[str, Any]]] = None):
+        self._llm = llm
+        self.step = step
+        self.model_name = model_name
+        self._usage = usage
+
+    def __getattr__(self, name):
+        return getattr(self._llm, name)
+
+    def _finish(self, start: float, prompt: str, output: str, raw=None, error: bool = False):
+        tokens = _usage_from_raw(raw) if raw is not None else None
+        if tokens is None:
+            tokens = (estimate_tokens(prompt), estimate_tokens(output) if output else 0)
+        _record(self._usage, self.step, self.model_name, time.perf_counter() - start, *tokens, error=error)
+
+    async def achat(self, messages, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self._llm.achat(messages, **kwargs)
+        except Exception:
+            self._finish(start, _message_text(messages), "", error=True)
+            raise
+        self._finish(start, _message_text(messages), response.message.content or "", response.raw)
+        return response
+
+    async def acomplete(self, prompt, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await self._llm.acomplete(prompt, **kwargs)
+        except Exception:
+            self._finish(start, str(prompt), "", error=True)
+            raise
+        self._finish(start, str(prompt), response.text or "", getattr(response, "raw", None))
+        return response
+
+    async def astream_chat(self, messages, **kwargs):
+        start = time.perf_counter()
+        gen = await self._llm.astream_chat(messages, **kwargs)
+
+        async def _stream():
+            output = ""
+            error = False
+            try:
+                async for response in gen:
+                    output += response.delta or ""
+                    yield response
+            except BaseException:
+                error = True
+                raise
+            finally:
+                # 流结束（或被取消）时记录整段生成的耗时
+                self._finish(start, _message_text(messages), output, error=error)
+
+        return _stream()
+
+    def as_structured_llm(self, output_cls, **kwargs):
+        return RoutedLLM(
+            self._llm.as_structured_llm(output_cls, **kwargs),
+            self.step,
+            self.model_name,
+            self._usage,
+        )
+
+
+def resolve_step_llm(
+    step: str,
+    default_llm,
+    step_models: Optional[Dict[str, str]] = None,
+    usage: Optional[List[Dict[str, Any]]] = None,
+) -> RoutedLLM:
+    """
+    Picks the model of a step: the request's step_models first, then MODEL_ROUTING,
+    then the model chosen for the request. Unknown model names fall back to the latter.
+    """
+    model_name = (step_models or {}).get(step) or MODEL_ROUTING.get(step)
+    if model_name:
+        with _lock:
+            llm = _models.get(model_name)
+        if llm is not None:
+            return RoutedLLM(llm, step, model_name, usage)
+        print(f"[WARN] 步骤 {step} 配置的模型 {model_name} 不存在，使用请求的模型")
+    return RoutedLLM(default_llm, step, get_model_name(default_llm), usage)
+
+
+async def get_step_llm(ctx, step: str, default_llm) -> RoutedLLM:
+    """Resolves the model of a step from the routing stored in the workflow context."""
+    return resolve_step_llm(
+        step,
+        default_llm,
+        await ctx.get("step_models", default=None),
+        await ctx.get("step_usage", default=None),
+    )
+
+
+def summarize_usage(usage: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-step totals of one run: model, calls, latency, tokens and cost."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for call in usage or []:
+        entry = summary.setdefault(
+            call["step"],
+            {"model": call["model"], "calls": 0, "latency": 0.0, "tokens": 0, "cost": 0.0},
+        )
+        entry["calls"] += 1
+        entry["latency"] = round(entry["latency"] + call["latency"], 3)
+        entry["tokens"] += call["input_tokens"] + call["output_tokens"]
+        entry["cost"] += call["cost"] or 0.0
+    return summary
+
+
+def get_model_routing_stats() -> Dict[str, Any]:
+    with _lock:
+        steps = [
+            {
+                "step": step,
+                "model": model,
+                **stats,
+                "avg_latency": stats["total_latency"] / stats["calls"] if stats["calls"] else 0.0,
+            }
+            for (step, model), stats in sorted(_step_stats.items())
+        ]
+    return {"routing": MODEL_ROUTING, "steps": steps}
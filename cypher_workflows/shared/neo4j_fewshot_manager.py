@@ -1,6 +1,6 @@
 import os
 
-from llama_index.graph_stores.neo4j import Neo4jPropertyGraphStore
+from cypher_workflows.shared.driver_registry import SharedNeo4jPropertyGraphStore
 
 
 class Neo4jFewshotManager:
@@ -12,7 +12,7 @@ class Neo4jFewshotManager:
         print("[DEBUG] FEWSHOT_NEO4J_PASSWORD:", os.getenv("FEWSHOT_NEO4J_PASSWORD"))
         if os.getenv("FEWSHOT_NEO4J_USERNAME"):
             try:
-                self.graph_store = Neo4jPropertyGraphStore(
+                self.graph_store = SharedNeo4jPropertyGraphStore(
                     username=os.getenv("FEWSHOT_NEO4J_USERNAME"),
                     password=os.getenv("FEWSHOT_NEO4J_PASSWORD"),
                     url=os.getenv("FEWSHOT_NEO4J_URI"),
@@ -0,0 +1,202 @@
+import os
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# 是否在执行前把字面量提取为参数
+PARAMETERIZE_LITERALS = (
+    os.getenv("CYPHER_PARAMETERIZE_LITERALS", "true").lower() == "true"
+)
+# 提取出的参数名前缀，按出现顺序编号：$lit_0, $lit_1 ...
+PARAM_PREFIX = "lit_"
+
+_NUMBER = re.compile(r"\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_HEX_OR_OCTAL = re.compile(r"0[xXoO][0-9a-fA-F_]+")
+_IDENTIFIER = re.compile(r"[^\W\d]\w*")
+# 量化路径模式的次数上下界，如 ((a)-->(b)){1,3}、-[:R]->{2,}、{,5}、{3}
+_QUANTIFIER = re.compile(r"\{\s*(?:\d+\s*(?:,\s*\d*\s*)?|,\s*\d+\s*)\}")
+_ESCAPES = {
+    "\\": "\\",
+    "'": "'",
+    '"': '"',
+    "n": "\n",
+    "t": "\t",
+    "r": "\r",
+    "b": "\b",
+    "f": "\f",
+}
+
+
+def read_string_literal(cypher: str, start: int) -> Tuple[str, int]:
+    """Reads a quoted string literal starting at `start`, returns its value and end index."""
+    quote = cypher[start]
+    chars = []
+    i = start + 1
+    while i < len(cypher):
+        ch = cypher[i]
+        if ch == "\\" and i + 1 < len(cypher):
+            nxt = cypher[i + 1]
+            if nxt == "u" and re.fullmatch(r"[0-9a-fA-F]{4}", cypher[i + 2 : i + 6]):
+                chars.append(chr(int(cypher[i + 2 : i + 6], 16)))
+                i += 6
+                continue
+            chars.append(_ESCAPES.get(nxt, "\\" + nxt))
+            i += 2
+            continue
+        if ch == quote:
+            return "".join(chars), i + 1
+        chars.append(ch)
+        i += 1
+    raise ValueError("Unterminated string literal")
+
+
+def mask_literals(cypher: str) -> str:
+    """
+    Returns the statement with the contents of string literals, comments and backtick
+    identifiers replaced by underscores. Offsets are preserved, so patterns found in the
+    masked text can be applied to the original statement.
+    """
+    out = []
+    i = 0
+    n = len(cypher)
+    while i < n:
+        ch = cypher[i]
+        if cypher.startswith("//", i):
+            end = cypher.find("\n", i)
+            end = n if end == -1 else end
+        elif cypher.startswith("/*", i):
+            end = cypher.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+        elif ch == "`":
+            end = cypher.find("`", i + 1)
+            end = n if end == -1 else end + 1
+        elif ch in ("'", '"'):
+            try:
+                _, end = read_string_literal(cypher, i)
+            except ValueError:
+                end = n
+        else:
+            out.append(ch)
+            i += 1
+            continue
+        # 保留引号/定界符，只遮盖内容
+        out.append(ch + "_" * (end - i - 1) if end - i > 1 else ch)
+        i = end
+    return "".join(out)
+
+
+def _prev_token(cypher: str, index: int) -> str:
+    return cypher[:index].rstrip()[-2:]
+
+
+def parameterize_cypher(
+    cypher: str, existing_params: Optional[Dict[str, Any]] = None
+) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    """
+    Lifts string and number literals into parameters so that structurally identical
+    statements share one cached plan in Neo4j.
+    Parameters are named by order of appearance ($lit_0, $lit_1, ...), so the same
+    query shape always produces the same text.
+    Returns the rewritten statement, the parameters (merged with `existing_params`)
+    and a mapping from parameter name to the original literal text.
+    Literals in variable-length bounds (`*1..3`) and path pattern quantifiers (`{1,3}`)
+    are kept, since Neo4j does not accept parameters there. On any tokenizing problem the statement is returned unchanged.
+    """
+    params = dict(existing_params or {})
+    literals: Dict[str, str] = {}
+    if not PARAMETERIZE_LITERALS:
+        return cypher, params, literals
+
+    out = []
+    counter = 0
+    i = 0
+    n = len(cypher)
+
+    def _next_name() -> str:
+        nonlocal counter
+        while f"{PARAM_PREFIX}{counter}" in params:
+            counter += 1
+        name = f"{PARAM_PREFIX}{counter}"
+        counter += 1
+        return name
+
+    try:
+        while i < n:
+            ch = cypher[i]
+            # 注释原样保留
+            if cypher.startswith("//", i):
+                end = cypher.find("\n", i)
+                end = n if end == -1 else end
+                out.append(cypher[i:end])
+                i = end
+            elif cypher.startswith("/*", i):
+                end = cypher.find("*/", i + 2)
+                end = n if end == -1 else end + 2
+                out.append(cypher[i:end])
+                i = end
+            # 反引号标识符原样保留
+            elif ch == "`":
+                end = cypher.find("`", i + 1)
+                if end == -1:
+                    raise ValueError("Unterminated backtick identifier")
+                out.append(cypher[i : end + 1])
+                i = end + 1
+            # 量化路径模式的上下界原样保留（映射字面量不会只含数字和逗号）
+            elif ch == "{" and _QUANTIFIER.match(cypher, i):
+                end = _QUANTIFIER.match(cypher, i).end()
+                out.append(cypher[i:end])
+                i = end
+            elif ch in ("'", '"'):
+                value, end = read_string_literal(cypher, i)
+                name = _next_name()
+                params[name] = value
+                literals[name] = cypher[i:end]
+                out.append(f"${name}")
+                i = end
+            # 已有参数（$name / $0）与标识符（含 n1 这类变量名）原样保留
+            elif ch == "$":
+                match = _IDENTIFIER.match(cypher, i + 1) or _NUMBER.match(cypher, i + 1)
+                end = match.end() if match else i + 1
+                out.append(cypher[i:end])
+                i = end
+            elif ch.isalpha() or ch == "_":
+                match = _IDENTIFIER.match(cypher, i)
+                out.append(match.group(0))
+                i = match.end()
+            elif "0" <= ch <= "9":
+                hex_match = _HEX_OR_OCTAL.match(cypher, i)
+                match = hex_match or _NUMBER.match(cypher, i)
+                end = match.end()
+                text = match.group(0)
+                prev = _prev_token(cypher, i)
+                in_range = (
+                    prev.endswith("*")
+                    or prev.endswith("..")
+                    or cypher[end:].lstrip().startswith("..")
+                )
+                if hex_match or in_range or cypher[i - 1 : i] == ".":
+                    out.append(text)
+                else:
+                    name = _next_name()
+                    is_float = any(c in text for c in ".eE")
+                    params[name] = float(text) if is_float else int(text)
+                    literals[name] = text
+                    out.append(f"${name}")
+                i = end
+            else:
+                out.append(ch)
+                i += 1
+    except ValueError as e:
+        print(f"[WARN] 字面量参数化失败，使用原始语句: {e}")
+        return cypher, dict(existing_params or {}), {}
+
+    return "".join(out), params, literals
+
+
+def restore_literals(text: str, literals: Dict[str, str]) -> str:
+    """Puts the original literals back into text derived from the statement, e.g. column names."""
+    if not literals or f"${PARAM_PREFIX}" not in text:
+        return text
+    # 先替换编号较大的参数，避免 $lit_1 误匹配 $lit_10
+    for name in sorted(literals, key=len, reverse=True):
+        text = text.replace(f"${name}", literals[name])
+    return text
@@ -0,0 +1,134 @@
+import os
+import secrets
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# 单个请求最多保留的 span 数，超出的只计数
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+
+# span 类型（与 OpenTelemetry SpanKind 对应）
+SPAN_INTERNAL = "internal"
+SPAN_SERVER = "server"
+SPAN_CLIENT = "client"
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+class RequestTrace:
+    """
+    Trace of one workflow request. The request id (32 hex digits) doubles as the
+    OpenTelemetry trace id; the request itself is the root span, and the stages, LLM
+    calls and Neo4j transactions of the run are added as child spans.
+    """
+
+    def __init__(self, labels: Dict[str, Any]):
+        self.labels = dict(labels)
+        self.trace_id = self.labels.setdefault("request_id", uuid.uuid4().hex)
+        self.span_id = new_span_id()
+        self.start = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped_spans = 0
+        self.interaction = 0
+        self._lock = threading.Lock()
+
+    def next_interaction(self) -> int:
+        """Sequence number of the next LLM interaction within this request."""
+        with self._lock:
+            self.interaction += 1
+            return self.interaction
+
+    def add_span(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        error: bool = False,
+        kind: str = SPAN_INTERNAL,
+        span_id: Optional[str] = None,
+        **attributes,
+    ):
+        """Adds a finished span (wall-clock start, duration in seconds) under the current span."""
+        span = {
+            "name": name,
+            "span_id": span_id or new_span_id(),
+            "parent_span_id": current_span.get() or self.span_id,
+            "kind": kind,
+            "start": start,
+            "duration": duration,
+            "error": error,
+            "attributes": {k: v for k, v in attributes.items() if v is not None},
+        }
+        with self._lock:
+            if len(self.spans) >= TRACE_MAX_SPANS:
+                self.dropped_spans += 1
+                return
+            self.spans.append(span)
+
+    def traceparent(self, span_id: Optional[str] = None) -> str:
+        """W3C traceparent header value for the given (default: current) span."""
+        return f"00-{self.trace_id}-{span_id or current_span.get() or self.span_id}-01"
+
+    def tx_metadata(self) -> Dict[str, str]:
+        """Neo4j transaction metadata, visible in SHOW TRANSACTIONS and the query log."""
+        return {
+            "request_id": self.trace_id,
+            "workflow": str(self.labels.get("workflow") or ""),
+            "llm": str(self.labels.get("llm") or ""),
+            "traceparent": self.traceparent(),
+        }
+
+
+# 当前请求的追踪上下文。WorkflowService 在启动工作流前设置，
+# 工作流内创建的任务和 to_thread 线程会继承该上下文
+current_request: ContextVar[Optional[RequestTrace]] = ContextVar("current_request", default=None)
+# 当前 span（阶段），其间记录的 LLM 调用和 Neo4j 查询作为它的子 span
+current_span: ContextVar[Optional[str]] = ContextVar("current_span", default=None)
+
+
+def get_request_trace() -> Optional[RequestTrace]:
+    return current_request.get()
+
+
+def get_request_labels() -> Dict[str, Any]:
+    trace = current_request.get()
+    return trace.labels if trace is not None else {}
+
+
+def get_tx_metadata() -> Optional[Dict[str, str]]:
+    trace = current_request.get()
+    return trace.tx_metadata() if trace is not None else None
+
+
+def record_trace_span(name: str, start: float, duration: float, error: bool = False, **kwargs):
+    """Adds a span to the current request's trace; a no-op outside a request."""
+    trace = current_request.get()
+    if trace is not None:
+        trace.add_span(name, start, duration, error, **kwargs)
+
+
+@contextmanager
+def request_scope(labels: Dict[str, Any]):
+    """Starts the trace of a request for the enclosed block and the tasks it starts."""
+    trace = RequestTrace(labels)
+    token = current_request.set(trace)
+    try:
+        yield trace
+    finally:
+        current_request.reset(token)
+
+
+@contextmanager
+def span_scope():
+    """Makes a new span id current for the enclosed block and yields it."""
+    span_id = new_span_id()
+    token = current_span.set(span_id)
+    try:
+        yield span_id
+    finally:
+        current_span.reset(token)
@@ -0,0 +1,155 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from cypher_workflows.shared.model_router import get_step_llm
+
+# 数据库输出进入评估/总结提示词时的 token 预算，可按模型覆盖，如 "haiku-3.5=1000,sonnet-3.5=4000"
+RESULT_TOKEN_BUDGET = int(os.getenv("RESULT_TOKEN_BUDGET", "2000"))
+RESULT_TOKEN_BUDGETS = {
+    name.strip(): int(budget)
+    for name, _, budget in (
+        item.partition("=") for item in os.getenv("RESULT_TOKEN_BUDGETS", "").split(",")
+    )
+    if name.strip() and budget.strip().isdigit()
+}
+# 单个字符串取值的最大长度，超出部分截断
+RESULT_MAX_STRING_CHARS = int(os.getenv("RESULT_MAX_STRING_CHARS", "200"))
+# 至少这么长的取值重复出现时只输出一次，之后用引用代替
+RESULT_DEDUP_MIN_CHARS = 24
+# 数值列表长度超过该值时视为向量，只输出维度
+RESULT_VECTOR_MIN_LENGTH = 16
+# 路径中用于显示节点的属性，按顺序取第一个存在的
+NODE_DISPLAY_KEYS = ("name", "title", "id")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def get_result_token_budget(*model_names: str) -> int:
+    """Smallest budget among the models that will read the serialized result."""
+    budgets = [RESULT_TOKEN_BUDGETS.get(name, RESULT_TOKEN_BUDGET) for name in model_names]
+    return min(budgets) if budgets else RESULT_TOKEN_BUDGET
+
+
+async def get_context_token_budget(
+    ctx, default_llm, steps: Iterable[str] = ("evaluate", "summarize")
+) -> int:
+    """Budget for the models routed to the steps that consume the database output."""
+    names = [(await get_step_llm(ctx, step, default_llm)).model_name for step in steps]
+    return get_result_token_budget(*names)
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= RESULT_MAX_STRING_CHARS:
+        return text
+    return f"{text[:RESULT_MAX_STRING_CHARS]}…(+{len(text) - RESULT_MAX_STRING_CHARS} chars)"
+
+
+def _is_vector(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) >= RESULT_VECTOR_MIN_LENGTH
+        and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)
+    )
+
+
+def _is_path(value: Any) -> bool:
+    """
+    Record.data() turns a path into [node, rel_type, node, rel_type, node, ...] and a
+    relationship into (start_node, rel_type, end_node), with nodes as property dicts.
+    """
+    return (
+        isinstance(value, (list, tuple))
+        and len(value) >= 3
+        and len(value) % 2 == 1
+        and all(isinstance(v, dict) for v in value[::2])
+        and all(isinstance(v, str) for v in value[1::2])
+    )
+
+
+def _node_label(node: Dict[str, Any]) -> str:
+    for key in NODE_DISPLAY_KEYS:
+        if node.get(key) not in (None, ""):
+            return _truncate(str(node[key]))
+    return _truncate(_format_map(node))
+
+
+def _format_path(path: List[Any]) -> str:
+    parts = [f"({_node_label(path[0])})"]
+    for i in range(1, len(path), 2):
+        parts.append(f"-[:{path[i]}]-({_node_label(path[i + 1])})")
+    return "".join(parts)
+
+
+def _format_map(value: Dict[str, Any]) -> str:
+    return "{" + ", ".join(f"{k}: {_format_value(v)}" for k, v in value.items()) + "}"
+
+
+def _format_value(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return _truncate(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if _is_vector(value):
+        return f"<vector dim={len(value)}>"
+    if _is_path(value):
+        return _format_path(value)
+    if isinstance(value, dict):
+        return _format_map(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(_format_value(v) for v in value) + "]"
+    return _truncate(str(value))
+
+
+def serialize_records(
+    records: Optional[List[Dict[str, Any]]], token_budget: Optional[int] = None
+) -> str:
+    """
+    Compact, token-bounded text form of query records for prompts: one header line with
+    the columns, then one line per row with `|`-separated values. Long strings are
+    truncated, vectors reduced to their dimension, paths written as (a)-[:TYPE]-(b),
+    and long values seen before are replaced by a reference to their first row.
+    Rows that do not fit the budget are counted in a trailing line.
+    """
+    if records is None:
+        return "null"
+    if not records:
+        return "[] (no rows)"
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        return _truncate(json.dumps(records, default=str, ensure_ascii=False))
+
+    budget = token_budget or RESULT_TOKEN_BUDGET
+    columns: List[str] = []
+    for record in records:
+        for key in record:
+            if key not in columns:
+                columns.append(key)
+
+    header = f"columns: {' | '.join(columns)}"
+    lines = [header]
+    used = estimate_tokens(header)
+    seen: Dict[str, int] = {}
+    for index, record in enumerate(records, 1):
+        cells = []
+        for column in columns:
+            text = _format_value(record.get(column))
+            if len(text) >= RESULT_DEDUP_MIN_CHARS:
+                if text in seen:
+                    text = f"<same as row {seen[text]}>"
+                else:
+                    seen[text] = index
+            cells.append(text)
+        line = f"{index}. " + " | ".join(cells)
+        cost = estimate_tokens(line)
+        if used + cost > budget and len(lines) > 1:
+            lines.append(f"... {len(records) - index + 1} more rows omitted (token budget {budget})")
+            break
+        lines.append(line)
+        used += cost
+    return "\n".join(lines)
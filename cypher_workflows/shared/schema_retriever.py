@@ -0,0 +1,180 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils import format_optimized_schema, get_schema_elements
+
+# 按问题裁剪 schema 的配置，均可通过环境变量覆盖
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+# 每个问题保留的最相关标签个数（另加这些标签的一跳关系及其端点）
+SCHEMA_PRUNING_TOP_K = int(os.getenv("SCHEMA_PRUNING_TOP_K", "5"))
+# 裁剪后 schema 的 token 预算；完整 schema 不超过预算时不裁剪
+SCHEMA_PRUNING_TOKEN_BUDGET = int(os.getenv("SCHEMA_PRUNING_TOKEN_BUDGET", "1500"))
+
+EXCLUDE_TYPES = ["Actor", "Director"]
+
+# id(graph_store) -> SchemaRetriever
+_retrievers: Dict[int, "SchemaRetriever"] = {}
+_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数（约 4 个字符一个 token）"""
+    return max(1, len(text) // 4)
+
+
+def _normalize(vectors) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _parse_relationship(rel) -> Optional[Tuple[str, str, str]]:
+    """Returns (start, type, end) of a relationship in dict or `(:A)-[:T]->(:B)` form."""
+    if isinstance(rel, dict):
+        return rel.get("start"), rel.get("type"), rel.get("end")
+    if isinstance(rel, str) and rel.startswith("(:") and ")-[:" in rel and "]->(:" in rel:
+        start, rest = rel[2:].split(")-[:", 1)
+        rel_type, end = rest.split("]->(:", 1)
+        return start, rel_type, end.rstrip(")")
+    return None
+
+
+class SchemaRetriever:
+    """
+    Embeds the labels and relationship types of one database once, then picks the
+    labels most similar to a question together with their one-hop relationships.
+    """
+
+    def __init__(self, graph_store, embed_model):
+        self.schema_version = id(graph_store.structured_schema)
+        self.node_props, self.relationships = get_schema_elements(
+            graph_store, list(EXCLUDE_TYPES)
+        )
+        self.full_schema = format_optimized_schema(self.node_props, self.relationships)
+        self.embed_model = embed_model
+
+        self.labels = list(self.node_props)
+        self.edges: List[Tuple[str, str, str]] = []
+        for rel in self.relationships:
+            parsed = _parse_relationship(rel)
+            if parsed and all(parsed):
+                self.edges.append(parsed)
+
+        # 标签文本带上属性名，关系文本带上两端标签，便于和问题中的词语对齐
+        label_texts = [
+            f"{label}: {', '.join(self.node_props[label])}" for label in self.labels
+        ]
+        edge_texts = [f"{start} {rel_type} {end}" for start, rel_type, end in self.edges]
+        texts = label_texts + edge_texts
+        vectors = _normalize(embed_model.encode(texts)) if texts else np.zeros((0, 1))
+        self.label_vectors = vectors[: len(label_texts)]
+        self.edge_vectors = vectors[len(label_texts) :]
+
+    def prune(
+        self,
+        question: str,
+        top_k: int = SCHEMA_PRUNING_TOP_K,
+        token_budget: int = SCHEMA_PRUNING_TOKEN_BUDGET,
+    ) -> str:
+        """
+        Returns the schema string restricted to the top-k labels for the question and
+        their one-hop relationships, trimmed to the token budget in order of relevance.
+        The full schema is returned when it already fits the budget.
+        """
+        if estimate_tokens(self.full_schema) <= token_budget or not self.labels:
+            return self.full_schema
+
+        query = _normalize(self.embed_model.encode([question]))[0]
+        label_scores = self.label_vectors @ query
+        edge_scores = (
+            self.edge_vectors @ query if len(self.edges) else np.zeros(0, dtype=np.float32)
+        )
+
+        ranked_labels = [self.labels[i] for i in np.argsort(-label_scores)]
+        selected = ranked_labels[:top_k]
+        # 关系类型本身与问题高度相关时，把它的端点标签也算进来
+        for i in np.argsort(-edge_scores)[:top_k]:
+            start, _, end = self.edges[i]
+            for label in (start, end):
+                if label not in selected:
+                    selected.append(label)
+        selected_set = set(selected)
+
+        # 一跳关系：至少一端在已选标签中，按相关度排序
+        edge_order = [
+            i
+            for i in np.argsort(-edge_scores)
+            if self.edges[i][0] in selected_set or self.edges[i][2] in selected_set
+        ]
+
+        # 按相关度依次加入标签与关系，直到用完 token 预算
+        kept_props: Dict[str, List[str]] = {}
+        kept_edges: List[Tuple[str, str, str]] = []
+        used = estimate_tokens("Node Properties:\nRelationships:")
+        label_rank = {label: rank for rank, label in enumerate(selected)}
+        for label in selected:
+            cost = estimate_tokens(f"{label}: [{', '.join(self.node_props.get(label, []))}]")
+            if kept_props and used + cost > token_budget:
+                break
+            kept_props[label] = self.node_props.get(label, [])
+            used += cost
+        for i in edge_order:
+            start, rel_type, end = self.edges[i]
+            if start not in kept_props and end not in kept_props:
+                continue
+            cost = estimate_tokens(f"(:{start})-[:{rel_type}]->(:{end})")
+            if used + cost > token_budget:
+                break
+            kept_edges.append(self.edges[i])
+            used += cost
+
+        node_props = {
+            label: kept_props[label]
+            for label in sorted(kept_props, key=lambda label: label_rank[label])
+        }
+        relationships = [
+            {"start": start, "type": rel_type, "end": end}
+            for start, rel_type, end in kept_edges
+        ]
+        return format_optimized_schema(node_props, relationships)
+
+
+def get_schema_retriever(graph_store, embed_model) -> SchemaRetriever:
+    """每个数据库只嵌入一次 schema；模式刷新后（structured_schema 被替换）重新构建"""
+    key = id(graph_store)
+    with _lock:
+        retriever = _retrievers.get(key)
+    if (
+        retriever is None
+        or retriever.embed_model is not embed_model
+        or retriever.schema_version != id(graph_store.structured_schema)
+    ):
+        retriever = SchemaRetriever(graph_store, embed_model)
+        with _lock:
+            _retrievers[key] = retriever
+    return retriever
+
+
+def get_pruned_schema(graph_store, embed_model, question: str) -> str:
+    """
+    Schema for the generation prompt of a question. Falls back to the full optimized
+    schema when pruning is disabled, no embedding model is available, or pruning fails.
+    """
+    # 随机向量的相似度没有意义，不做裁剪
+    if (
+        not SCHEMA_PRUNING_ENABLED
+        or embed_model is None
+        or type(embed_model).__name__ == "RandomEmbedding"
+    ):
+        return format_optimized_schema(*get_schema_elements(graph_store, list(EXCLUDE_TYPES)))
+    try:
+        return get_schema_retriever(graph_store, embed_model).prune(question)
+    except Exception as e:
+        print(f"[WARN] 按问题裁剪schema失败，使用完整schema: {e}")
+        return format_optimized_schema(*get_schema_elements(graph_store, list(EXCLUDE_TYPES)))
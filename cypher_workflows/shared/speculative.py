@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from cypher_workflows.shared.cost_guard import guard_cypher_cost
+from cypher_workflows.shared.cypher_executor import run_cypher
+from cypher_workflows.shared.entity_index import rewrite_entity_literals
+
+# 推测式多候选生成配置，均可通过环境变量覆盖
+# 并行生成的候选个数，1 表示关闭（按原流程逐步生成、执行、修正）
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+# first：第一个执行成功且结果非空的候选胜出；majority：等全部候选完成后按结果哈希投票
+SPECULATIVE_SELECTION = os.getenv("SPECULATIVE_SELECTION", "first").lower()
+# 额外参与生成的模型名（ResourceManager.llms 中的名称，逗号分隔），为空时只用请求的模型
+SPECULATIVE_LLMS = [
+    name.strip() for name in os.getenv("SPECULATIVE_LLMS", "").split(",") if name.strip()
+]
+# 评估与总结重叠：评估进行时就开始流式生成答案并缓存，评估通过后再放出
+SPECULATIVE_SUMMARY = os.getenv("SPECULATIVE_SUMMARY", "false").lower() == "true"
+
+speculative_stats = {
+    "runs": 0,
+    "candidates": 0,
+    "cancelled": 0,
+    "fallbacks": 0,
+    "wins_by_candidate": {},
+    "summaries_started": 0,
+    "summaries_released": 0,
+    "summaries_discarded": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def is_speculative_enabled() -> bool:
+    return SPECULATIVE_CANDIDATES > 1
+
+
+def get_candidate_llms(primary_llm, llms: List[Tuple[str, Any]]) -> List[Any]:
+    """
+    Models for the candidates: the requested model first, then the configured
+    SPECULATIVE_LLMS in turn, repeated until there is one per candidate.
+    """
+    by_name = dict(llms)
+    pool = [primary_llm] + [
+        by_name[name]
+        for name in SPECULATIVE_LLMS
+        if name in by_name and by_name[name] is not primary_llm
+    ]
+    return [pool[i % len(pool)] for i in range(max(1, SPECULATIVE_CANDIDATES))]
+
+
+def split_fewshot_examples(examples: List[Any], count: int) -> List[List[Any]]:
+    """
+    Gives every candidate a different few-shot subset: the first one sees all
+    examples, candidate i leaves out every count-th example starting at i - 1.
+    """
+    examples = list(examples or [])
+    subsets = [examples]
+    for i in range(1, count):
+        subset = [ex for j, ex in enumerate(examples) if j % count != i - 1]
+        subsets.append(subset or examples)
+    return subsets
+
+
+def result_hash(records: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(records, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _count(key: str):
+    with _stats_lock:
+        speculative_stats[key] += 1
+
+
+def _record_run(winner: Optional[int], candidates: int, cancelled: int):
+    with _stats_lock:
+        speculative_stats["runs"] += 1
+        speculative_stats["candidates"] += candidates
+        speculative_stats["cancelled"] += cancelled
+        if winner is None:
+            speculative_stats["fallbacks"] += 1
+        else:
+            wins = speculative_stats["wins_by_candidate"]
+            wins[winner] = wins.get(winner, 0) + 1
+
+
+def get_speculative_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        return {
+            "enabled": is_speculative_enabled(),
+            "candidates_per_run": SPECULATIVE_CANDIDATES,
+            "selection": SPECULATIVE_SELECTION,
+            "summary_enabled": SPECULATIVE_SUMMARY,
+            **speculative_stats,
+            "wins_by_candidate": dict(speculative_stats["wins_by_candidate"]),
+        }
+
+
+async def run_speculative_candidates(
+    llms: List[Any],
+    fewshot_examples: List[Any],
+    generate: Callable[[Any, List[Any]], Awaitable[str]],
+    execute: Callable[[str], Awaitable[Tuple[str, Any]]],
+    selection: str = SPECULATIVE_SELECTION,
+) -> Dict[str, Any]:
+    """
+    Generates and executes one candidate per model/few-shot subset concurrently.
+
+    With "first" selection the first candidate whose execution succeeds with a non-empty
+    result wins and the remaining tasks are cancelled, which aborts their in-flight LLM
+    requests. With "majority" all candidates finish and the most common non-empty result
+    (by hash) wins, ties going to the candidate that finished first.
+
+    Returns {"winner", "cypher", "records", "candidates"}; "winner" is None when no
+    candidate produced a result, "cypher" is then the first generated statement so the
+    caller can fall back to the regular execute/correct path.
+    """
+    subsets = split_fewshot_examples(fewshot_examples, len(llms))
+    outcomes: List[Dict[str, Any]] = [
+        {"index": i, "cypher": None, "error": None, "rows": None} for i in range(len(llms))
+    ]
+    start = time.perf_counter()
+
+    async def _candidate(i: int):
+        outcome = outcomes[i]
+        outcome["cypher"] = await generate(llms[i], subsets[i])
+        outcome["cypher"], records = await execute(outcome["cypher"])
+        outcome["records"] = records
+        outcome["rows"] = len(records) if isinstance(records, list) else None
+        outcome["elapsed"] = time.perf_counter() - start
+        return i
+
+    tasks = {asyncio.create_task(_candidate(i)): i for i in range(len(llms))}
+    finished: List[int] = []
+    winner = None
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                i = tasks[task]
+                try:
+                    task.result()
+                except Exception as e:
+                    outcomes[i]["error"] = str(e)
+                    continue
+                if outcomes[i].get("records"):
+                    finished.append(i)
+            if selection != "majority" and finished:
+                winner = finished[0]
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+            outcomes[tasks[task]]["error"] = "cancelled"
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if selection == "majority" and finished:
+        groups: Dict[str, List[int]] = {}
+        for i in finished:
+            groups.setdefault(result_hash(outcomes[i]["records"]), []).append(i)
+        winner = max(groups.values(), key=len)[0]
+
+    _record_run(winner, len(llms), len(pending))
+    summary = [
+        {key: outcome.get(key) for key in ("index", "cypher", "error", "rows", "elapsed")}
+        for outcome in outcomes
+    ]
+    if winner is None:
+        fallback = next((o["cypher"] for o in outcomes if o["cypher"]), None)
+        return {"winner": None, "cypher": fallback, "records": None, "candidates": summary}
+    return {
+        "winner": winner,
+        "cypher": outcomes[winner]["cypher"],
+        "records": outcomes[winner]["records"],
+        "candidates": summary,
+    }
+
+
+async def execute_candidate(
+    graph_store, database_name: str, cypher: str, deadline: Optional[float] = None
+) -> Tuple[str, Any]:
+    """Runs a candidate through the same entity mapping, cost guard and executor as the flows."""
+    cypher, _ = rewrite_entity_literals(cypher, database_name)
+    # EXPLAIN 成本检查是同步调用，放到线程中避免阻塞其他候选
+    cypher = await asyncio.to_thread(guard_cypher_cost, graph_store, cypher)
+    records = await run_cypher(graph_store, cypher, deadline=deadline)
+    return cypher, records
+
+
+class SpeculativeStream:
+    """
+    Streams an LLM chat in the background and buffers the deltas until the caller
+    either releases them with `stream()` or discards them with `cancel()`.
+    """
+
+    _DONE = object()
+
+    def __init__(self, llm, messages):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._released = False
+        self._buffered = 0
+        self.task = asyncio.create_task(self._run(llm, messages))
+        self.task.add_done_callback(self._retrieve_exception)
+        _count("summaries_started")
+
+    def _retrieve_exception(self, task: asyncio.Task):
+        # 取出异常，未被 stream() 等待的失败任务不会触发 "Task exception was never retrieved"
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None and not self._released:
+            print(f"[WARN] 推测式总结生成失败: {error}")
+
+    async def _run(self, llm, messages):
+        try:
+            gen = await llm.astream_chat(messages)
+            async for response in gen:
+                self._buffered += 1
+                self._queue.put_nowait(response.delta)
+        finally:
+            self._queue.put_nowait(self._DONE)
+
+    async def stream(self):
+        """Yields the buffered deltas, then the live ones until the response is complete."""
+        if not self._released:
+            self._released = True
+            _count("summaries_released")
+        while True:
+            delta = await self._queue.get()
+            if delta is self._DONE:
+                break
+            yield delta
+        # 生成失败时把异常抛给调用方
+        self.task.result()
+
+    def cancel(self):
+        """Stops the generation; counts as discarded only when generated deltas are thrown away."""
+        failed = self.task.done() and not self.task.cancelled() and self.task.exception()
+        if not self.task.done():
+            self.task.cancel()
+        if not self._released and self._buffered and not failed:
+            _count("summaries_discarded")
@@ -0,0 +1,235 @@
+import bisect
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from cypher_workflows.shared.metrics import STEP_DURATION
+from cypher_workflows.shared.request_context import record_trace_span, span_scope
+
+# 直方图桶上界（毫秒），超过最后一个上界的观测值计入 +Inf 桶
+LATENCY_BUCKETS_MS = (
+    5, 10, 25, 50, 75, 100, 150, 250, 400, 500, 750, 1000, 1500, 2000,
+    3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000, 120000,
+)
+
+# 工作流阶段名；prepare_generate_inputs 的计时键映射到对应阶段
+STAGES = (
+    "fewshot",
+    "schema",
+    "prompts",
+    "guardrails",
+    "plan",
+    "generate",
+    "speculative",
+    "explain",
+    "execute",
+    "evaluate",
+    "correct",
+    "information_check",
+    "summarize",
+)
+_TIMING_STAGES = {
+    "fewshot": "fewshot",
+    "schema": "schema",
+    "prompts": "prompts",
+    "llm": "generate",
+    "speculative": "speculative",
+}
+# 直方图的标签维度，request_id 只出现在单次请求的 span 中
+LABELS = ("workflow", "llm", "database")
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds) with interpolated quantiles."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                # 桶边界收紧到观测到的最小/最大值，减小粗桶的插值误差
+                lower = max(self.buckets[i - 1] if i > 0 else 0.0, self.min)
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                fraction = (rank - cumulative) / count
+                return lower + (upper - lower) * fraction
+            cumulative += count
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 3),
+            "avg_ms": round(self.sum / self.count, 3) if self.count else None,
+            "max_ms": round(self.max, 3),
+            "p50_ms": _round(self.quantile(0.5)),
+            "p90_ms": _round(self.quantile(0.9)),
+            "p99_ms": _round(self.quantile(0.99)),
+            "buckets": buckets,
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 3)
+
+
+# (阶段, workflow, llm, database) -> 直方图
+_histograms: Dict[Tuple[str, ...], LatencyHistogram] = {}
+_lock = threading.Lock()
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _observe(stage: str, labels: Dict[str, Any], duration: float):
+    key = (stage,) + tuple(str(labels.get(label) or "") for label in LABELS)
+    STEP_DURATION.observe(duration, stage=stage, **dict(zip(LABELS, key[1:])))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = LatencyHistogram()
+        histogram.observe(duration * 1000)
+
+
+def record_span(
+    spans: Optional[List[Dict[str, Any]]],
+    labels: Dict[str, Any],
+    stage: str,
+    start: float,
+    duration: float,
+    error: bool = False,
+    span_id: Optional[str] = None,
+    **attributes,
+):
+    """
+    Adds a finished span to the run's span list, to the stage histogram and to the
+    request trace.
+    """
+    labels = {**labels, **{k: v for k, v in attributes.items() if k in LABELS and v}}
+    _observe(stage, labels, duration)
+    record_trace_span(stage, start, duration, error, span_id=span_id, **attributes)
+    if spans is not None:
+        spans.append(
+            {
+                "stage": stage,
+                **labels,
+                "start": start,
+                "duration_ms": round(duration * 1000, 3),
+                "error": error,
+                **{k: v for k, v in attributes.items() if k not in LABELS},
+            }
+        )
+
+
+async def start_spans(ctx, ev, workflow: str):
+    """
+    Initialises the span list of a run. Labels come from the StartEvent (set by
+    WorkflowService); a run started without them gets a fresh request id.
+    """
+    labels = dict(getattr(ev, "span_labels", None) or {})
+    labels.setdefault("request_id", new_request_id())
+    labels.setdefault("workflow", workflow)
+    await ctx.set("span_labels", labels)
+    await ctx.set("spans", [])
+
+
+async def _span_state(ctx) -> Tuple[Optional[List[Dict[str, Any]]], Dict[str, Any]]:
+    return (
+        await ctx.get("spans", default=None),
+        await ctx.get("span_labels", default={}),
+    )
+
+
+@asynccontextmanager
+async def step_span(ctx, stage: str, **attributes):
+    """Times the enclosed block as one span of `stage`; `llm=` overrides the model label."""
+    spans, labels = await _span_state(ctx)
+    start = time.time()
+    perf_start = time.perf_counter()
+    error = False
+    # 块内的 LLM 调用和 Neo4j 查询在追踪中作为该阶段的子 span
+    try:
+        with span_scope() as span_id:
+            try:
+                yield
+            except BaseException:
+                error = True
+                raise
+    finally:
+        record_span(
+            spans, labels, stage, start, time.perf_counter() - perf_start, error, span_id, **attributes
+        )
+
+
+async def record_timings(ctx, timings: Dict[str, float], **attributes):
+    """Records the phase timings returned by prepare_generate_inputs as spans."""
+    spans, labels = await _span_state(ctx)
+    now = time.time()
+    for name, duration in timings.items():
+        stage = _TIMING_STAGES.get(name)
+        if stage is None:
+            continue
+        # 模型标签只用于 LLM 生成阶段，推测式生成混用多个候选模型
+        stage_attributes = attributes if stage == "generate" else {}
+        record_span(spans, labels, stage, now - duration, duration, **stage_attributes)
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-stage totals of one run in the order the stages first occurred."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for span in spans or []:
+        entry = summary.setdefault(span["stage"], {"count": 0, "duration_ms": 0.0})
+        entry["count"] += 1
+        entry["duration_ms"] = round(entry["duration_ms"] + span["duration_ms"], 3)
+    return summary
+
+
+def format_span_summary(summary: Dict[str, Dict[str, Any]]) -> str:
+    return ", ".join(
+        f"{stage}={entry['duration_ms']:.0f}ms" + (f"x{entry['count']}" if entry["count"] > 1 else "")
+        for stage, entry in summary.items()
+    )
+
+
+async def finish_spans(ctx) -> Dict[str, Any]:
+    """Span summary of the run, attached to the final result."""
+    spans, labels = await _span_state(ctx)
+    return {
+        "request_id": labels.get("request_id"),
+        "stages": summarize_spans(spans),
+        "spans": spans or [],
+    }
+
+
+def get_step_timing_stats() -> Dict[str, Any]:
+    with _lock:
+        items = sorted(_histograms.items())
+        histograms = [
+            {"stage": key[0], **dict(zip(LABELS, key[1:])), **histogram.snapshot()}
+            for key, histogram in items
+        ]
+    return {"buckets_ms": list(LATENCY_BUCKETS_MS), "histograms": histograms}
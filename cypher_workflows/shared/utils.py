@@ -1,5 +1,9 @@
 import os
-from neo4j import GraphDatabase
+import time
+
+from neo4j import READ_ACCESS
+
+from cypher_workflows.shared.driver_registry import get_shared_drivers
 
 def check_ok(text):
     # Split the text into words
@@ -11,9 +15,88 @@ def check_ok(text):
     return first_word in ["Ok.", "Ok"] or last_word in ["Ok.", "Ok"]
 
 
-def get_neo4j_schema_str(uri, username, password, database, exclude_types=None):
+# 模式内省方式：sample 按关系类型有界采样，procedures 使用 db.schema.* 过程
+SCHEMA_INTROSPECTION_MODE = os.getenv("SCHEMA_INTROSPECTION_MODE", "sample")
+# 每种关系类型最多采样的关系数
+SCHEMA_SAMPLE_SIZE = int(os.getenv("SCHEMA_SAMPLE_SIZE", "1000"))
+
+# (uri, database) -> 最近一次内省的耗时等信息
+introspection_stats = {}
+
+
+def _sample_relationships(session, rel_types, exclude_types):
+    """Samples at most SCHEMA_SAMPLE_SIZE relationships per type for their properties and endpoints."""
+    rel_props_dict = {}
+    rels = set()
+    for rel_type in rel_types:
+        result = session.run(
+            f"""
+            MATCH (a)-[r:`{rel_type}`]->(b)
+            WITH a, r, b LIMIT $sample_size
+            RETURN labels(a) AS startLabels, keys(r) AS props, labels(b) AS endLabels
+            """,
+            sample_size=SCHEMA_SAMPLE_SIZE,
+        )
+        props = set()
+        for record in result:
+            props.update(str(p) for p in record["props"])
+            start = ":".join(record["startLabels"]) if record["startLabels"] else "?"
+            end = ":".join(record["endLabels"]) if record["endLabels"] else "?"
+            if start in exclude_types or end in exclude_types:
+                continue
+            rels.add(f"(:{start})-[:{rel_type}]->(:{end})")
+        if props:
+            rel_props_dict[rel_type] = sorted(props)
+    return rel_props_dict, sorted(rels)
+
+
+def _procedure_relationships(session, rel_types, exclude_types):
+    """Reads relationship properties and endpoints from the db.schema.* procedures."""
+    rel_props_dict = {}
+    result = session.run(
+        "CALL db.schema.relTypeProperties() YIELD relType, propertyName "
+        "RETURN relType, collect(propertyName) AS props"
+    )
+    for record in result:
+        # relType 形如 :`ACTED_IN`
+        rel_type = record["relType"].lstrip(":").strip("`")
+        props = [str(p) for p in record["props"] if p is not None]
+        if rel_type in rel_types and props:
+            rel_props_dict[rel_type] = sorted(set(props))
+
+    rels = set()
+    record = session.run(
+        "CALL db.schema.visualization() YIELD relationships "
+        "UNWIND relationships AS rel "
+        "RETURN collect([labels(startNode(rel)), type(rel), labels(endNode(rel))]) AS rels"
+    ).single()
+    for start_labels, rel_type, end_labels in record["rels"]:
+        start = ":".join(start_labels) if start_labels else "?"
+        end = ":".join(end_labels) if end_labels else "?"
+        if rel_type not in rel_types or start in exclude_types or end in exclude_types:
+            continue
+        rels.add(f"(:{start})-[:{rel_type}]->(:{end})")
+    return rel_props_dict, sorted(rels)
+
+
+def get_neo4j_schema_str(
+    uri=None, username=None, password=None, database=None, exclude_types=None, graph_store=None
+):
+    """
+    Returns the schema description used in the generation prompts.
+    Labels, property keys and relationship types come from the token store procedures;
+    relationship properties and endpoints from bounded sampling per relationship type
+    (or the db.schema.* procedures), so no query scans the whole graph.
+    Pass `graph_store` to reuse its driver and database, otherwise a shared driver for
+    `uri`/`username` is used.
+    """
     exclude_types = set(exclude_types or [])
-    driver = GraphDatabase.driver(uri, auth=(username, password))
+    if graph_store is not None:
+        driver = graph_store._driver
+        database = graph_store._database
+        uri = getattr(graph_store, "url", uri)
+    else:
+        driver, _ = get_shared_drivers(uri, username, password)
     print(f"[INFO] Getting schema from Neo4j database: {uri}")
 
     node_labels = []
@@ -21,112 +104,60 @@ def get_neo4j_schema_str(uri, username, password, database, exclude_types=None):
     rel_types = []
     rel_props_dict = {}
     rels_list = []
+    mode = SCHEMA_INTROSPECTION_MODE
+    start_time = time.perf_counter()
 
     try:
-        with driver.session(database=database) as session:
+        with driver.session(database=database, default_access_mode=READ_ACCESS) as session:
             print("[INFO] Connected to Neo4j")
 
             # 获取节点标签
-            try:
-                print("[DEBUG] Trying db.nodeLabels()")
-                result = session.run("CALL db.nodeLabels()")
-                node_labels = [record["label"] for record in result]
-            except Exception as e:
-                print("[WARN] db.nodeLabels() failed, falling back. Error:", e)
-                try:
-                    result = session.run("MATCH (n) RETURN DISTINCT labels(n) AS labels")
-                    node_labels = set()
-                    for record in result:
-                        for label in record["labels"]:
-                            node_labels.add(label)
-                    node_labels = list(node_labels)
-                except Exception as e2:
-                    print("[ERROR] Fallback label query failed:", e2)
-
+            result = session.run("CALL db.labels()")
+            node_labels = [record["label"] for record in result]
             node_labels = [label for label in node_labels if label not in exclude_types]
             print(f"[INFO] Node labels: {node_labels}")
 
             # 获取节点属性
-            try:
-                print("[DEBUG] Trying db.propertyKeys()")
-                result = session.run("CALL db.propertyKeys()")
-                node_props = [record["propertyKey"] for record in result]
-            except Exception as e:
-                print("[WARN] db.propertyKeys() failed, falling back. Error:", e)
-                try:
-                    result = session.run("MATCH (n) UNWIND keys(n) AS k RETURN DISTINCT k")
-                    node_props = [record["k"] for record in result]
-                except Exception as e2:
-                    print("[ERROR] Fallback property key query failed:", e2)
+            result = session.run("CALL db.propertyKeys()")
+            node_props = [record["propertyKey"] for record in result]
             print(f"[INFO] Node properties: {node_props}")
 
             # 获取关系类型
-            try:
-                print("[DEBUG] Trying db.relationshipTypes()")
-                result = session.run("CALL db.relationshipTypes()")
-                rel_types = [record["relationshipType"] for record in result]
-            except Exception as e:
-                print("[WARN] db.relationshipTypes() failed, falling back. Error:", e)
-                try:
-                    result = session.run("MATCH ()-[r]->() RETURN DISTINCT type(r) AS t")
-                    rel_types = [record["t"] for record in result]
-                except Exception as e2:
-                    print("[ERROR] Fallback relationship type query failed:", e2)
-
+            result = session.run("CALL db.relationshipTypes()")
+            rel_types = [record["relationshipType"] for record in result]
             rel_types = [r for r in rel_types if r not in exclude_types]
             print(f"[INFO] Relationship types: {rel_types}")
 
-            # 获取关系属性
-            try:
-                print("[DEBUG] Running relationship property query")
-                rel_props_query = """
-                    MATCH ()-[r]->() 
-                    WITH type(r) AS relType, keys(r) AS props
-                    UNWIND props AS prop
-                    RETURN relType, collect(DISTINCT prop) AS propList
-                """
-                result = session.run(rel_props_query)
-                for record in result:
-                    rel_type = record["relType"]
-                    if rel_type in exclude_types:
-                        continue
-                    prop_list = record["propList"]
-                    # 修复：确保prop_list为list，否则转为字符串
-                    if isinstance(prop_list, list):
-                        rel_props_dict[rel_type] = [str(p) for p in prop_list]
-                    else:
-                        rel_props_dict[rel_type] = [str(prop_list)]
-            except Exception as e:
-                print("[ERROR] Relationship properties query failed:", e)
-
+            # 获取关系属性和关系结构（方向和标签）
+            if mode == "procedures":
+                try:
+                    rel_props_dict, rels_list = _procedure_relationships(
+                        session, rel_types, exclude_types
+                    )
+                except Exception as e:
+                    print("[WARN] db.schema procedures failed, falling back to sampling. Error:", e)
+                    mode = "sample"
+            if mode != "procedures":
+                rel_props_dict, rels_list = _sample_relationships(
+                    session, rel_types, exclude_types
+                )
             print(f"[INFO] Relationship properties: {rel_props_dict}")
-
-            # 获取关系结构（方向和标签）
-            try:
-                print("[DEBUG] Running relationship structure query")
-                rel_struct_query = """
-                    MATCH (a)-[r]->(b)
-                    RETURN DISTINCT labels(a) AS startLabels, type(r) AS relType, labels(b) AS endLabels
-                """
-                result = session.run(rel_struct_query)
-                for record in result:
-                    rel_type = record["relType"]
-                    if rel_type in exclude_types:
-                        continue
-                    start = ":".join(record["startLabels"]) if record["startLabels"] else "?"
-                    end = ":".join(record["endLabels"]) if record["endLabels"] else "?"
-                    rels_list.append(f"(:{start})-[:{rel_type}]->(:{end})")
-            except Exception as e:
-                print("[ERROR] Relationship structure query failed:", e)
-
             print(f"[INFO] Relationship structures: {rels_list}")
 
     except Exception as e:
         print(f"[FATAL] Unexpected error: {e}")
         return "Unexpected error occurred."
-    finally:
-        driver.close()
-        print("[INFO] Neo4j connection closed.")
+
+    duration = time.perf_counter() - start_time
+    introspection_stats[(uri, database)] = {
+        "uri": uri,
+        "database": database,
+        "mode": mode,
+        "sample_size": SCHEMA_SAMPLE_SIZE if mode == "sample" else None,
+        "duration": duration,
+        "finished_at": time.time(),
+    }
+    print(f"[INFO] Schema introspection ({mode}) took {duration:.2f}s")
 
     # 格式化输出字符串
     node_props_str = ", ".join(sorted(node_props)) or "None"
@@ -145,4 +176,9 @@ def get_neo4j_schema_str(uri, username, password, database, exclude_types=None):
         "Relationship types:", rel_types_str,
         "Relationship properties:", rel_props_str,
         "The relationships are the following:", rels_str,
-    ])
\ No newline at end of file
+    ])
+
+
+def get_introspection_stats():
+    """Returns the runtime of the latest schema introspection per database."""
+    return list(introspection_stats.values())
@@ -0,0 +1,215 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import neo4j
+
+from cypher_workflows.shared.filter_extractor import EQUALITY_OPERATORS
+
+# 值映射配置，均可通过环境变量覆盖
+VALUE_MAPPING_ENABLED = os.getenv("VALUE_MAPPING_ENABLED", "true").lower() == "true"
+# 缺少全文索引时是否自动创建（需要 schema 管理权限）
+VALUE_MAPPING_CREATE_INDEXES = (
+    os.getenv("VALUE_MAPPING_CREATE_INDEXES", "true").lower() == "true"
+)
+# 新建索引后等待其上线的秒数
+VALUE_MAPPING_INDEX_WAIT = int(os.getenv("VALUE_MAPPING_INDEX_WAIT", "10"))
+# 每个过滤条件返回的候选值个数
+VALUE_MAPPING_MAX_SUGGESTIONS = int(os.getenv("VALUE_MAPPING_MAX_SUGGESTIONS", "3"))
+
+INDEX_PREFIX = "value_mapping"
+
+# Lucene 查询语法中的特殊字符
+_LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/&|])')
+
+# (url, database) -> {(label, property): index_name}，只记录已上线的全文索引
+_online_indexes: Dict[Tuple[Optional[str], Optional[str]], Dict[Tuple[str, str], str]] = {}
+# (url, database) -> 无法创建索引的 (label, property)，不再重复尝试
+_unavailable: Dict[Tuple[Optional[str], Optional[str]], Set[Tuple[str, str]]] = {}
+
+VALUE_MAPPING_QUERY = """
+UNWIND $filters AS f
+CALL {
+    WITH f
+    CALL db.index.fulltext.queryNodes(f.index, f.query, {limit: $limit})
+    YIELD node, score
+    RETURN node[f.property] AS candidate, score
+    ORDER BY score DESC
+}
+WITH f, candidate WHERE candidate IS NOT NULL
+RETURN f.id AS id, collect(DISTINCT toString(candidate))[..$limit] AS candidates
+"""
+
+
+def _store_key(graph_store) -> Tuple[Optional[str], Optional[str]]:
+    return getattr(graph_store, "url", None), getattr(graph_store, "_database", None)
+
+
+def get_index_name(label: str, property_key: str) -> str:
+    sanitized = re.sub(r"\W", "_", f"{label}_{property_key}")
+    return f"{INDEX_PREFIX}_{sanitized}"
+
+
+def build_fulltext_query(value: str) -> str:
+    """
+    Builds a Lucene query that ranks the exact phrase first and accepts
+    fuzzy matches of every term (typos, missing accents, different casing).
+    """
+    escaped = _LUCENE_SPECIAL.sub(r"\\\1", value.strip())
+    terms = [term for term in escaped.split() if term]
+    if not terms:
+        return '""'
+    fuzzy = " AND ".join(f"{term}~" for term in terms)
+    return f'"{escaped}"^2 OR ({fuzzy})'
+
+
+def _load_existing_indexes(graph_store) -> Dict[Tuple[str, str], str]:
+    """Reads the online single-property full-text indexes of the database."""
+    indexes = {}
+    rows = graph_store.structured_query(
+        "SHOW FULLTEXT INDEXES YIELD name, entityType, labelsOrTypes, properties, state "
+        "WHERE entityType = 'NODE' AND state = 'ONLINE' "
+        "RETURN name, labelsOrTypes, properties"
+    )
+    for row in rows:
+        for label in row["labelsOrTypes"]:
+            for prop in row["properties"]:
+                indexes.setdefault((label, prop), row["name"])
+    return indexes
+
+
+def ensure_fulltext_indexes(
+    graph_store, targets: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], str]:
+    """
+    Returns the online full-text index for every (label, property) target,
+    creating the missing ones when VALUE_MAPPING_CREATE_INDEXES is enabled.
+    Targets without a usable index are left out of the result.
+    """
+    key = _store_key(graph_store)
+    if key not in _online_indexes:
+        try:
+            _online_indexes[key] = _load_existing_indexes(graph_store)
+        except Exception as e:
+            print(f"[WARN] 读取全文索引失败，跳过值映射: {e}")
+            return {}
+    online = _online_indexes[key]
+    unavailable = _unavailable.setdefault(key, set())
+
+    for label, prop in targets:
+        if (label, prop) in online or (label, prop) in unavailable:
+            continue
+        if not VALUE_MAPPING_CREATE_INDEXES:
+            unavailable.add((label, prop))
+            continue
+        index_name = get_index_name(label, prop)
+        try:
+            graph_store.structured_query(
+                f"CREATE FULLTEXT INDEX `{index_name}` IF NOT EXISTS "
+                f"FOR (n:`{label}`) ON EACH [n.`{prop}`]"
+            )
+            graph_store.structured_query(
+                "CALL db.awaitIndex($name, $timeout)",
+                {"name": index_name, "timeout": VALUE_MAPPING_INDEX_WAIT},
+            )
+            online[(label, prop)] = index_name
+            print(f"-> 已创建值映射全文索引: {index_name}")
+        except neo4j.exceptions.Neo4jError as e:
+            # 权限不足或索引尚未上线，本次跳过；权限问题不再重试
+            if "Forbidden" in (e.code or ""):
+                unavailable.add((label, prop))
+            print(f"[WARN] 全文索引 {index_name} 不可用: {e.message or e}")
+
+    return {target: online[target] for target in targets if target in online}
+
+
+def _is_string_property(graph_store, label: str, property_key: str) -> bool:
+    node_props = graph_store.get_schema().get("node_props", {})
+    return any(
+        prop.get("property") == property_key and prop.get("type") == "STRING"
+        for prop in node_props.get(label, [])
+    )
+
+
+def map_property_values(graph_store, filters: List[Any]) -> Dict[str, Any]:
+    """
+    Checks the string literals a statement filters on against the database in one
+    UNWIND round trip over full-text indexes.
+    `filters` holds objects with node_label, property_key, property_value and optionally
+    operator; only equality filters (=, IN) are checked, since CONTAINS, STARTS WITH,
+    regular expressions and range comparisons do not have to equal a stored value.
+    Returns the filters that have no exact (case-insensitive) match, with fuzzy suggestions.
+    Runs synchronous queries (and may create indexes), so call it off the event loop.
+    """
+    result = {"mapping_errors": [], "unmatched": []}
+    if not VALUE_MAPPING_ENABLED or not filters:
+        return result
+
+    # 只映射精确匹配且 schema 中类型为 STRING 的属性，忽略不存在的属性
+    string_filters = [
+        f
+        for f in filters
+        if getattr(f, "operator", "=") in EQUALITY_OPERATORS
+        and isinstance(f.property_value, str)
+        and f.property_value.strip()
+        and _is_string_property(graph_store, f.node_label, f.property_key)
+    ]
+    if not string_filters:
+        return result
+
+    indexes = ensure_fulltext_indexes(
+        graph_store,
+        list(dict.fromkeys((f.node_label, f.property_key) for f in string_filters)),
+    )
+    batch = [
+        {
+            "id": i,
+            "index": indexes[(f.node_label, f.property_key)],
+            "property": f.property_key,
+            "query": build_fulltext_query(f.property_value),
+        }
+        for i, f in enumerate(string_filters)
+        if (f.node_label, f.property_key) in indexes
+    ]
+    if not batch:
+        return result
+
+    try:
+        rows = graph_store.structured_query(
+            VALUE_MAPPING_QUERY,
+            {"filters": batch, "limit": VALUE_MAPPING_MAX_SUGGESTIONS},
+        )
+    except Exception as e:
+        print(f"[WARN] 值映射查询失败，跳过: {e}")
+        return result
+    candidates_by_id = {row["id"]: row["candidates"] for row in rows}
+
+    for item in batch:
+        f = string_filters[item["id"]]
+        candidates = candidates_by_id.get(item["id"], [])
+        if any(c.lower() == f.property_value.lower() for c in candidates):
+            continue
+        result["unmatched"].append(
+            {
+                "node_label": f.node_label,
+                "property_key": f.property_key,
+                "property_value": f.property_value,
+                "suggestions": candidates,
+            }
+        )
+        if candidates:
+            suggestions = ", ".join(f"'{c}'" for c in candidates)
+            result["mapping_errors"].append(
+                f"Could not find node in graph with label '{f.node_label}' where property "
+                f"'{f.property_key}' equals '{f.property_value}'. "
+                f"Similar values in the database: {suggestions}. "
+                f"Use the value that matches the question."
+            )
+        else:
+            result["mapping_errors"].append(
+                f"Could not find node in graph with label '{f.node_label}' where property "
+                f"'{f.property_key}' equals '{f.property_value}', and no similar values exist. "
+                f"Check whether another property or label holds this value."
+            )
+
+    return result
@@ -1,14 +1,18 @@
-from typing import List, Optional
+import asyncio
+from typing import List, Optional, Union
 
 from llama_index.core import ChatPromptTemplate
 from app.prompt_service import PromptService
 from app.prompt_models import PromptType
-from app.api_models import PromptConfig
-from neo4j.exceptions import CypherSyntaxError
 from pydantic import BaseModel, Field
 
+from cypher_workflows.shared.cost_guard import check_cypher_cost
+from cypher_workflows.shared.filter_extractor import extract_filter_triples
+from cypher_workflows.shared.value_mapping import map_property_values
+
 # 注意：此硬编码提示词已被迁移到提示词管理系统
 # 请使用 PromptService 获取提示词模板
+# 过滤条件现由 extract_property_filters 解析提取，下面的规则和示例即解析器的预期行为
 VALIDATE_CYPHER_SYSTEM_TEMPLATE = """You are a specialized parser focused on analyzing Cypher query statements to extract node property filters. Your task is to identify and extract properties used in WHERE clauses and pattern matching conditions, but only when they contain explicit literal values.
 
 For each Cypher statement, you should:
@@ -93,7 +97,11 @@ class Property(BaseModel):
         description="The label of the node to which this property belongs."
     )
     property_key: str = Field(description="The key of the property being filtered.")
-    property_value: str = Field(
+    operator: str = Field(
+        default="=",
+        description="The comparison operator, e.g. =, IN, <, CONTAINS or STARTS WITH.",
+    )
+    property_value: Union[str, int, float, bool] = Field(
         description="The value that the property is being matched against."
     )
 
@@ -108,6 +116,18 @@ class ValidateCypherOutput(BaseModel):
     )
 
 
+def extract_property_filters(cypher: str) -> List[Property]:
+    """
+    Extracts the node property filters with literal values from the Cypher statement.
+    Parses MATCH patterns and WHERE clauses directly, following the rules and examples
+    of VALIDATE_CYPHER_SYSTEM_TEMPLATE, instead of asking the LLM.
+    """
+    return [
+        Property(node_label=label, property_key=key, operator=operator, property_value=value)
+        for label, key, operator, value in extract_filter_triples(cypher)
+    ]
+
+
 async def validate_cypher_step(
     llm,
     graph_store,
@@ -121,76 +141,27 @@ async def validate_cypher_step(
     errors = []
     mapping_errors = []
 
-    # Check for syntax errors
-    try:
-        graph_store.structured_query(f"EXPLAIN {cypher}")
-    except CypherSyntaxError as e:
-        errors.append(e.message)
+    # Check for syntax errors and the estimated cost of the statement
+    # (EXPLAIN runs on the sync driver, so keep it off the event loop)
+    cost_check = await asyncio.to_thread(check_cypher_cost, graph_store, cypher)
+    errors.extend(cost_check["errors"])
+    cypher = cost_check["cypher"]
 
     # Experimental feature for correcting relationship directions
     corrected_cypher = cypher_query_corrector(cypher)
     if not corrected_cypher:
         errors.append("The generated Cypher statement doesn't fit the graph schema")
 
-    # Skip mapping the values to the database, LLMs struggle with this tool output
-    """
-    # Use LLM for mapping for values
-    # 获取提示词服务
-    prompt_service = PromptService()
-    
-    # 从提示词管理系统获取提示词
-    system_prompt, user_prompt = prompt_service.get_workflow_step_prompts(
-        system_prompt_type=PromptType.ITERATIVE_VALIDATE_CYPHER_SYSTEM,
-        user_prompt_type=PromptType.ITERATIVE_VALIDATE_CYPHER_USER if "iterative_validate_cypher_user" != "None" else None,
-        prompt_config=prompt_config
-    )
-    
-    # 如果获取失败，抛出异常
-    if not system_prompt:
-        raise ValueError("无法从提示词管理系统获取必要的提示词模板")
-    
-    msgs = [
-        ("system", system_prompt),
-        ("user", user_prompt),
-    ]
-    validate_cypher_prompt = ChatPromptTemplate.from_messages(validate_cypher_msgs)
-    llm_output = await llm.as_structured_llm(ValidateCypherOutput).acomplete(
-        validate_cypher_prompt.format(cypher=cypher)
-    )
-    llm_output = llm_output.raw
-
-    if llm_output.filters:
-        for filter in llm_output.filters:
-            # Do mapping only for string values
-            try:
-                if (
-                    not [
-                        prop
-                        for prop in graph_store.get_schema()["node_props"][
-                            filter.node_label
-                        ]
-                        if prop["property"] == filter.property_key
-                    ][0]["type"]
-                    == "STRING"
-                ):
-                    continue
-            except:  # if property is hallucinated/doesn't exist in the schema # ToDo handle it better
-                continue
-            mapping = graph_store.structured_query(
-                f"MATCH (n:{filter.node_label}) WHERE toLower(n.`{filter.property_key}`) = toLower($value) RETURN 'yes' LIMIT 1",
-                {"value": filter.property_value},
-            )
-            if not mapping:
-                mapping_errors.append(
-                    f"Could not find node in graph with label '{filter.node_label}' where property '{filter.property_key}' equals '{filter.property_value}'. "
-                    f"Without this information, I cannot provide a complete answer to your question. "
-                    f"If you meant something else, please rephrase your question or verify the specific {filter.property_key} you're asking about. "
-                    f"Would you like to try with a different {filter.property_key} value?"
-                )
-
-    if mapping_errors:
-        next_action = "end"
-    """
+    # Map the string values the statement filters on to the database in one batched query,
+    # statements that fail to plan are corrected first
+    if not errors:
+        filters = extract_property_filters(cypher)
+        # The lookup (and any full-text index creation) uses the sync driver as well
+        mapping = await asyncio.to_thread(map_property_values, graph_store, filters)
+        mapping_errors = mapping["mapping_errors"]
+        # Wrong entity names are sent to the correction step together with the suggestions
+        errors.extend(mapping_errors)
+
     if errors:
         next_action = "correct_cypher"
     else:
@@ -200,6 +171,8 @@ async def validate_cypher_step(
         "next_action": next_action,
         "cypher_statement": corrected_cypher,
         "cypher_errors": errors,
+        # Errors of the EXPLAIN check: the statement must not be executed as is
+        "cost_errors": cost_check["errors"],
         "mapping_errors": mapping_errors,
         "steps": ["validate_cypher"],
     }
@@ -2,13 +2,19 @@ from cypher_workflows.steps.naive_text2cypher.correct_cypher import correct_cyph
 from cypher_workflows.steps.naive_text2cypher.evaluate_answer import (
     evaluate_database_output_step,
 )
-from cypher_workflows.steps.naive_text2cypher.generate_cypher import generate_cypher_step
+from cypher_workflows.steps.naive_text2cypher.generate_cypher import (
+    format_timings,
+    generate_cypher_step,
+    prepare_generate_inputs,
+)
 from cypher_workflows.steps.naive_text2cypher.summarize_answer import (
     get_naive_final_answer_prompt,
 )
 
 __all__ = [
     "generate_cypher_step",
+    "prepare_generate_inputs",
+    "format_timings",
     "get_naive_final_answer_prompt",
     "correct_cypher_step",
     "evaluate_database_output_step",
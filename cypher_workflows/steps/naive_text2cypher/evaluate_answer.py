@@ -45,8 +45,8 @@ async def evaluate_database_output_step(llm, subquery, cypher, context, prompt_c
     
     # 从提示词管理系统获取提示词
     system_prompt, user_prompt = prompt_service.get_workflow_step_prompts(
-        system_prompt_type=PromptType.NAIVE_EVALUATE_ANSWER_SYSTEM,
-        user_prompt_type=PromptType.NAIVE_EVALUATE_ANSWER_USER,
+        workflow_type="naive_text2cypher",
+        step_name="evaluate_answer",
         prompt_config=prompt_config
     )
     
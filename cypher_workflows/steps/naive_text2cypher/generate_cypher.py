@@ -1,6 +1,8 @@
 # from nt import system
+import asyncio
 import sys
-from typing import Optional
+import time
+from typing import Callable, Optional, Tuple
 from llama_index.core import ChatPromptTemplate
 # from cypher_workflows.shared.utils import get_neo4j_schema_str
 # import os
@@ -10,6 +12,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))))
 from app.utils import get_llm_logger, get_optimized_schema
+from cypher_workflows.shared.schema_retriever import get_pruned_schema
 from app.prompt_service import PromptService
 from app.api_models import PromptConfig
 from app.prompt_models import PromptType
@@ -80,12 +83,86 @@ MATCH (a:LabelA {name: 'NodeA'}), (b:LabelB {name: 'NodeB'}) WITH a, b, [r1 IN r
 ### ✅ Cypher Query (error-free, ready to execute):"""
 
 
-async def generate_cypher_step(llm, graph_store, subquery, fewshot_examples, prompt_config: Optional[Dict[str, Any]] = None):
+def load_generate_schema(graph_store, subquery, embed_model=None) -> str:
+    # 传入embed_model时只保留与问题相关的标签及其一跳关系；修正步骤仍使用完整schema
+    if embed_model is not None:
+        return get_pruned_schema(graph_store, embed_model, subquery)
+    # 使用优化的schema函数
+    return get_optimized_schema(graph_store, exclude_types=["Actor", "Director"])
+
+
+def load_generate_prompts(prompt_config: Optional[Dict[str, Any]] = None) -> Tuple[str, str]:
+    # 获取提示词服务
+    prompt_service = PromptService()
+    
+    # 从提示词管理系统获取提示词
+    system_prompt, user_prompt = prompt_service.get_workflow_step_prompts(
+        workflow_type="naive_text2cypher",
+        step_name="generate_cypher",
+        prompt_config=prompt_config
+    )
+    
+    # 如果获取失败，抛出异常
+    if not system_prompt or not user_prompt:
+        raise ValueError("无法从提示词管理系统获取必要的提示词模板")
+    return system_prompt, user_prompt
+
+
+async def prepare_generate_inputs(
+    graph_store,
+    subquery,
+    fewshot_retriever: Callable[[], Any],
+    prompt_config: Optional[Dict[str, Any]] = None,
+    embed_model=None,
+) -> Dict[str, Any]:
+    """
+    并发获取few-shot示例、schema和提示词模板（三者互不依赖，都在线程池中执行），
+    返回结果以及各阶段耗时（秒）
+    """
+    timings: Dict[str, float] = {}
+
+    async def _timed(name, func, *args):
+        start = time.perf_counter()
+        try:
+            return await asyncio.to_thread(func, *args)
+        finally:
+            timings[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fewshot_examples, schema, prompts = await asyncio.gather(
+        _timed("fewshot", fewshot_retriever),
+        _timed("schema", load_generate_schema, graph_store, subquery, embed_model),
+        _timed("prompts", load_generate_prompts, prompt_config),
+    )
+    timings["prepare"] = time.perf_counter() - start
+    return {
+        "fewshot_examples": fewshot_examples,
+        "schema": schema,
+        "prompts": prompts,
+        "timings": timings,
+    }
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in timings.items())
+
+
+async def generate_cypher_step(
+    llm,
+    graph_store,
+    subquery,
+    fewshot_examples,
+    prompt_config: Optional[Dict[str, Any]] = None,
+    embed_model=None,
+    schema: Optional[str] = None,
+    prompts: Optional[Tuple[str, str]] = None,
+):
     # 获取日志记录器
     logger = get_llm_logger()
     
-    # 使用优化的schema函数
-    schema = get_optimized_schema(graph_store, exclude_types=["Actor", "Director"])
+    # schema 和提示词可由 prepare_generate_inputs 预先并发获取
+    if schema is None:
+        schema = load_generate_schema(graph_store, subquery, embed_model)
     print(f"-> 成功获取优化schema为: {schema}")
     
     # 直接用环境变量获取数据库连接参数
@@ -156,19 +233,7 @@ async def generate_cypher_step(llm, graph_store, subquery, fewshot_examples, pro
 
 
 
-    # 获取提示词服务
-    prompt_service = PromptService()
-    
-    # 从提示词管理系统获取提示词
-    system_prompt, user_prompt = prompt_service.get_workflow_step_prompts(
-        workflow_type="naive_text2cypher",
-        step_name="generate_cypher",
-        prompt_config=prompt_config
-    )
-    
-    # 如果获取失败，抛出异常
-    if not system_prompt or not user_prompt:
-        raise ValueError("无法从提示词管理系统获取必要的提示词模板")
+    system_prompt, user_prompt = prompts or load_generate_prompts(prompt_config)
     
     generate_cypher_msgs = [
         ("system", system_prompt),
@@ -1,3 +1,7 @@
+import asyncio
+import time
+from typing import Any, Optional
+
 from llama_index.core import VectorStoreIndex
 from llama_index.core.schema import TextNode
 from llama_index.core.workflow import (
@@ -9,15 +13,46 @@ from llama_index.core.workflow import (
     step,
 )
 
+from cypher_workflows.shared.answer_templates import (
+    TEMPLATE_ANSWERS_DEFAULT,
+    json_safe_rows,
+    render_template_answer,
+)
+from cypher_workflows.shared.cost_guard import guard_cypher_cost
+from cypher_workflows.shared.cypher_executor import run_cypher
+from cypher_workflows.shared.entity_index import rewrite_entity_literals
+from cypher_workflows.shared.evaluation_policy import evaluate_with_policy
+from cypher_workflows.shared.model_router import get_step_llm, summarize_usage
 from cypher_workflows.shared.local_fewshot_manager import LocalFewshotManager
 from cypher_workflows.shared.neo4j_fewshot_manager import Neo4jFewshotManager
+from cypher_workflows.shared.speculative import (
+    SPECULATIVE_SUMMARY,
+    SpeculativeStream,
+    execute_candidate,
+    get_candidate_llms,
+    is_speculative_enabled,
+    run_speculative_candidates,
+)
+from cypher_workflows.shared.result_serializer import (
+    get_context_token_budget,
+    serialize_records,
+)
 from cypher_workflows.shared.sse_event import SseEvent
+from cypher_workflows.shared.step_timing import (
+    finish_spans,
+    format_span_summary,
+    record_timings,
+    start_spans,
+    step_span,
+)
 from cypher_workflows.shared.utils import check_ok
 from cypher_workflows.steps.naive_text2cypher import (
     correct_cypher_step,
     evaluate_database_output_step,
+    format_timings,
     generate_cypher_step,
     get_naive_final_answer_prompt,
+    prepare_generate_inputs,
 )
 
 # 导入日志工具
@@ -31,11 +66,16 @@ class SummarizeEvent(Event):
     cypher: str
     context: str
     evaluation: str
+    # 原始查询结果，用于模板答案并随结果返回
+    records: Optional[Any] = None
 
 
 class ExecuteCypherEvent(Event):
     question: str
     cypher: str
+    # 推测式生成时胜出候选已执行过，直接带上其结果
+    database_output: Optional[str] = None
+    records: Optional[Any] = None
 
 
 class CorrectCypherEvent(Event):
@@ -48,6 +88,8 @@ class EvaluateEvent(Event):
     question: str
     cypher: str
     context: str
+    # 原始查询结果，供本地评估打分使用
+    records: Optional[Any] = None
 
 
 class NaiveText2CypherRetryCheckFlow(Workflow):
@@ -57,6 +99,8 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
         super().__init__(*args, **kwargs)
         self.llm = llm
         self.graph_store = db["graph_store"]
+        # 推测式生成使用的候选模型，WorkflowPool 会按 SPECULATIVE_LLMS 替换
+        self.candidate_llms = get_candidate_llms(llm, [])
         self.embed_model = embed_model
         self.db_name = db["name"]
 
@@ -80,25 +124,99 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
         
         # Init global vars
         await ctx.set("retries", 0)
+        # 请求截止时间，用于限定Neo4j事务超时
+        await ctx.set("deadline", getattr(ev, "deadline", None))
+        # 按步骤选择模型（请求中的 step_models 优先于 MODEL_ROUTING），并记录各步骤耗时与成本
+        await ctx.set("step_models", getattr(ev, "step_models", None))
+        await ctx.set("step_usage", [])
+        # 各阶段计时 span，汇入按工作流/LLM/数据库分组的延迟直方图
+        await start_spans(ctx, ev, "text2cypher_with_1_retry_and_output_check")
+        # 请求选择模板答案时，简单结果（标量、单列、小表格）不再调用LLM总结
+        template_answers = getattr(ev, "template_answers", None)
+        await ctx.set(
+            "template_answers",
+            TEMPLATE_ANSWERS_DEFAULT if template_answers is None else template_answers,
+        )
 
         question = ev.input
 
-        fewshot_examples = self.fewshot_retriever(
-            question, self.db_name, self.embed_model
+        # few-shot检索、schema获取和提示词模板解析互不依赖，并发执行
+        inputs = await prepare_generate_inputs(
+            self.graph_store,
+            question,
+            lambda: self.fewshot_retriever(question, self.db_name, self.embed_model),
+            embed_model=self.embed_model,
         )
+        timings = inputs["timings"]
+        generate_llm = await get_step_llm(ctx, "generate", self.llm)
+
+        cypher_query = None
+        database_output = None
+        records = None
+        # 推测式生成：多个候选并行生成并执行，选出第一个（或多数一致的）有效结果
+        if is_speculative_enabled():
+            deadline = await ctx.get("deadline", default=None)
+            speculative_start = time.perf_counter()
+            speculative = await run_speculative_candidates(
+                self.candidate_llms,
+                inputs["fewshot_examples"],
+                lambda llm, fewshots: generate_cypher_step(
+                    llm,
+                    self.graph_store,
+                    question,
+                    fewshots,
+                    schema=inputs["schema"],
+                    prompts=inputs["prompts"],
+                ),
+                lambda cypher: execute_candidate(
+                    self.graph_store, self.db_name, cypher, deadline
+                ),
+            )
+            timings["speculative"] = time.perf_counter() - speculative_start
+            ctx.write_event_to_stream(
+                SseEvent(
+                    label="Speculative generation",
+                    message=f"Winner: {speculative['winner']}, candidates: {speculative['candidates']}",
+                )
+            )
+            # 没有候选成功时退回常规的执行/修正流程
+            cypher_query = speculative["cypher"]
+            if speculative["winner"] is not None:
+                records = speculative["records"]
+                database_output = serialize_records(
+                    records, await get_context_token_budget(ctx, self.llm)
+                )
+
+        if cypher_query is None:
+            llm_start = time.perf_counter()
+            cypher_query = await generate_cypher_step(
+                llm=generate_llm,
+                graph_store=self.graph_store,
+                subquery=question,
+                fewshot_examples=inputs["fewshot_examples"],
+                schema=inputs["schema"],
+                prompts=inputs["prompts"],
+            )
+            timings["llm"] = time.perf_counter() - llm_start
+        await record_timings(ctx, timings, llm=generate_llm.model_name)
 
-        cypher_query = await generate_cypher_step(
-            llm=self.llm,
-            graph_store=self.graph_store,
-            subquery=question,
-            fewshot_examples=fewshot_examples,
+        ctx.write_event_to_stream(
+            SseEvent(
+                label="Generation timings",
+                message=f"Generation timings: {format_timings(timings)}",
+            )
         )
         
         # 记录步骤完成
         logger.log_workflow_step("步骤完成", "Cypher查询生成完成", {"cypher": cypher_query})
         
         # Return for the next step
-        return ExecuteCypherEvent(question=question, cypher=cypher_query)
+        return ExecuteCypherEvent(
+            question=question,
+            cypher=cypher_query,
+            database_output=database_output,
+            records=records,
+        )
 
     @step
     async def execute_query(
@@ -113,13 +231,49 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
         # Get global var
         retries = await ctx.get("retries")
 
+        # 推测式生成的胜出候选已经执行过，直接使用其结果
+        if ev.database_output is not None:
+            ctx.write_event_to_stream(
+                SseEvent(
+                    message=f"Database output: {ev.database_output}", label="Database output"
+                )
+            )
+            return EvaluateEvent(
+                question=ev.question,
+                cypher=ev.cypher,
+                context=ev.database_output,
+                records=ev.records,
+            )
+
         ctx.write_event_to_stream(
             SseEvent(message=f"Executing Cypher: {ev.cypher}", label="Cypher execution")
         )
+        cypher = ev.cypher
+        records = None
         try:
+            # 用实体名索引把实体名改写为库中的实际取值
+            cypher, entity_rewrites = rewrite_entity_literals(ev.cypher, self.db_name)
+            if entity_rewrites:
+                ctx.write_event_to_stream(
+                    SseEvent(
+                        message=f"Entity names mapped: {entity_rewrites}",
+                        label="Entity mapping",
+                    )
+                )
+            # 执行前检查EXPLAIN预估成本，超预算的原因交给修正步骤
+            async with step_span(ctx, "explain"):
+                # EXPLAIN 是同步驱动调用，放到线程中避免阻塞事件循环
+                cypher = await asyncio.to_thread(guard_cypher_cost, self.graph_store, cypher)
             print(f"[INFO] 即将查询数据库: {self.db_name}")
             # Hard limit to 100 records
-            database_output = str(self.graph_store.structured_query(ev.cypher)[:100])
+            async with step_span(ctx, "execute"):
+                records = await run_cypher(
+                    self.graph_store, cypher, deadline=await ctx.get("deadline", default=None)
+                )
+            # 紧凑、按 token 预算截断的结果文本，评估与总结共用
+            database_output = serialize_records(
+                records, await get_context_token_budget(ctx, self.llm)
+            )
             logger.log_workflow_step("步骤完成", "Cypher查询执行成功", {"output_length": len(database_output)})
         except Exception as e:
             database_output = str(e)
@@ -134,7 +288,7 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
             if retries < self.max_retries:
                 await ctx.set("retries", retries + 1)
                 return CorrectCypherEvent(
-                    question=ev.question, cypher=ev.cypher, error=database_output
+                    question=ev.question, cypher=cypher, error=database_output
                 )
         ctx.write_event_to_stream(
             SseEvent(
@@ -142,7 +296,10 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
             )
         )
         return EvaluateEvent(
-            question=ev.question, cypher=ev.cypher, context=database_output
+            question=ev.question,
+            cypher=cypher,
+            context=database_output,
+            records=records,
         )
 
     @step
@@ -157,23 +314,68 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
         
         # Get global var
         retries = await ctx.get("retries")
-        evaluation = await evaluate_database_output_step(
-            self.llm, ev.question, ev.cypher, ev.context
+        # 推测式总结：评估的同时开始流式生成答案，先缓存不输出
+        speculative_summary = None
+        # 模板答案能覆盖的简单结果不需要推测式总结
+        template_ready = await ctx.get("template_answers", default=False) and (
+            render_template_answer(ev.question, ev.records)
+            is not None
+        )
+        if SPECULATIVE_SUMMARY and not template_ready:
+            speculative_summary = SpeculativeStream(
+                await get_step_llm(ctx, "summarize", self.llm),
+                get_naive_final_answer_prompt().format_messages(
+                    context=ev.context, question=ev.question, cypher_query=ev.cypher
+                ),
+            )
+
+        # 按评估策略先做本地打分，明确的情况不再调用LLM
+        evaluate_llm = await get_step_llm(ctx, "evaluate", self.llm)
+        try:
+            async with step_span(ctx, "evaluate", llm=evaluate_llm.model_name):
+                result = await evaluate_with_policy(
+                    lambda: evaluate_database_output_step(
+                        evaluate_llm, ev.question, ev.cypher, ev.context
+                    ),
+                    ev.question,
+                    ev.cypher,
+                    ev.context,
+                    records=ev.records,
+                )
+        except Exception:
+            if speculative_summary is not None:
+                speculative_summary.cancel()
+            raise
+        evaluation = result["evaluation"]
+        ctx.write_event_to_stream(
+            SseEvent(
+                message=f"Evaluation ({result['source']}, score={result['score']}): {evaluation}",
+                label="Evaluation",
+            )
         )
         
         # 记录评估结果
-        logger.log_workflow_step("步骤完成", "数据库输出评估完成", {"evaluation": evaluation})
+        logger.log_workflow_step(
+            "步骤完成",
+            "数据库输出评估完成",
+            {"evaluation": evaluation, "source": result["source"], "score": result["score"]},
+        )
         
         if retries < self.max_retries and not evaluation == "Ok":
+            # 需要修正时丢弃缓存的答案并取消生成
+            if speculative_summary is not None:
+                speculative_summary.cancel()
             await ctx.set("retries", retries + 1)
             return CorrectCypherEvent(
                 question=ev.question, cypher=ev.cypher, error=evaluation
             )
+        await ctx.set("speculative_summary", speculative_summary)
         return SummarizeEvent(
             question=ev.question,
             cypher=ev.cypher,
             context=ev.context,
             evaluation=evaluation,
+            records=ev.records,
         )
 
     @step
@@ -192,13 +394,15 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
                 label="Cypher correction",
             )
         )
-        results = await correct_cypher_step(
-            self.llm,
-            self.graph_store,
-            ev.question,
-            ev.cypher,
-            ev.error,
-        )
+        correct_llm = await get_step_llm(ctx, "correct", self.llm)
+        async with step_span(ctx, "correct", llm=correct_llm.model_name):
+            results = await correct_cypher_step(
+                correct_llm,
+                self.graph_store,
+                ev.question,
+                ev.cypher,
+                ev.error,
+            )
         
         # 记录步骤完成
         logger.log_workflow_step("步骤完成", "Cypher查询修正完成", {"corrected_cypher": results})
@@ -233,39 +437,88 @@ class NaiveText2CypherRetryCheckFlow(Workflow):
                     success=False
                 )
 
-        naive_final_answer_prompt = get_naive_final_answer_prompt()
-        
-        # 准备发送给LLM的提示词
-        prompt_messages = naive_final_answer_prompt.format_messages(
-            context=ev.context, question=ev.question, cypher_query=ev.cypher
-        )
-        
-        # 记录发送给LLM的提示词
-        context = {
-            "question": ev.question,
-            "cypher_query": ev.cypher,
-            "database_context": ev.context,
-            "evaluation": ev.evaluation
-        }
-        logger.log_prompt("生成最终答案", prompt_messages, context)
-        
-        # 发送给LLM并获取流式回应
-        gen = await self.llm.astream_chat(prompt_messages)
-        final_answer = ""
-        async for response in gen:
-            final_answer += response.delta
+        rows = ev.records
+        template_answer = None
+        if await ctx.get("template_answers", default=False):
+            template_answer = render_template_answer(ev.question, rows)
+        if template_answer is not None:
+            # 标量、单列列表和小表格直接用模板渲染答案，不调用LLM
+            final_answer = template_answer
+            logger.log_workflow_step(
+                "模板答案", "结果已用模板渲染，跳过LLM总结", {"question": ev.question}
+            )
+            speculative_summary = await ctx.get("speculative_summary", default=None)
+            if speculative_summary is not None:
+                await ctx.set("speculative_summary", None)
+                speculative_summary.cancel()
             ctx.write_event_to_stream(
-                SseEvent(message=response.delta, label="Final answer")
+                SseEvent(message=final_answer, label="Final answer")
             )
-        
-        # 记录LLM的完整回应
-        logger.log_response("生成最终答案", final_answer, context)
+        else:
+            naive_final_answer_prompt = get_naive_final_answer_prompt()
+
+            # 准备发送给LLM的提示词
+            prompt_messages = naive_final_answer_prompt.format_messages(
+                context=ev.context, question=ev.question, cypher_query=ev.cypher
+            )
+
+            # 记录发送给LLM的提示词
+            context = {
+                "question": ev.question,
+                "cypher_query": ev.cypher,
+                "database_context": ev.context,
+                "evaluation": ev.evaluation
+            }
+            logger.log_prompt("生成最终答案", prompt_messages, context)
+
+            # 评估时已开始的推测式总结直接放出缓存内容，否则发送给LLM并获取流式回应
+            speculative_summary = await ctx.get("speculative_summary", default=None)
+            summary_llm = await get_step_llm(ctx, "summarize", self.llm)
+            # 推测式总结的 span 只包含放出缓存和剩余生成的时间
+            async with step_span(
+                ctx,
+                "summarize",
+                llm=summary_llm.model_name,
+                speculative=speculative_summary is not None,
+            ):
+                if speculative_summary is not None:
+                    await ctx.set("speculative_summary", None)
+                    deltas = speculative_summary.stream()
+                else:
+                    gen = await summary_llm.astream_chat(prompt_messages)
+                    deltas = (response.delta async for response in gen)
+                final_answer = ""
+                async for delta in deltas:
+                    final_answer += delta
+                    ctx.write_event_to_stream(
+                        SseEvent(message=delta, label="Final answer")
+                    )
+
+            # 记录LLM的完整回应
+            logger.log_response("生成最终答案", final_answer, context)
+
+        # 各步骤的模型、耗时与预估成本
+        step_usage = summarize_usage(await ctx.get("step_usage", default=[]))
+        ctx.write_event_to_stream(
+            SseEvent(message=f"Step usage: {step_usage}", label="Step usage")
+        )
+        # 本次请求各阶段的耗时
+        step_timings = await finish_spans(ctx)
+        ctx.write_event_to_stream(
+            SseEvent(
+                message=f"Step timings: {format_span_summary(step_timings['stages'])}",
+                label="Step timings",
+            )
+        )
 
         stop_event = StopEvent(
             result={
                 "cypher": ev.cypher,
                 "question": ev.question,
                 "answer": final_answer,
+                "rows": json_safe_rows(rows),
+                "step_usage": step_usage,
+                "step_timings": step_timings,
             }
         )
 
@@ -0,0 +1,40 @@
+import json
+
+from neo4j.spatial import CartesianPoint
+from neo4j.time import Date, DateTime
+
+from cypher_workflows.shared.answer_templates import (
+    classify_result_shape,
+    json_safe_rows,
+    render_template_answer,
+)
+
+
+def test_classifies_result_shapes():
+    assert classify_result_shape(None) == "complex"
+    assert classify_result_shape([]) == "empty"
+    assert classify_result_shape([{"count": 42}]) == "scalar"
+    assert classify_result_shape([{"name": "Big"}, {"name": "Splash"}]) == "list"
+    assert classify_result_shape([{"m": {"title": "Big"}}]) == "complex"
+
+
+def test_renders_scalar_answer():
+    assert render_template_answer("How many movies?", [{"count(m)": 42}]) == "Result (count(m)): 42"
+    assert render_template_answer("How many movies?", None) is None
+
+
+def test_json_safe_rows_encode_driver_types():
+    rows = [
+        {
+            "released": Date(1988, 6, 3),
+            "updated": DateTime(2024, 1, 2, 3, 4, 5),
+            "location": CartesianPoint((1.0, 2.0)),
+            "p": [{"name": "Tom Hanks"}, "ACTED_IN", {"title": "Big"}],
+            "r": ({"name": "Tom Hanks"}, "ACTED_IN", {"title": "Big"}),
+        }
+    ]
+    safe = json_safe_rows(rows)
+    json.dumps({"result": {"rows": safe}})
+    assert safe[0]["released"] == "1988-06-03"
+    assert safe[0]["r"] == [{"name": "Tom Hanks"}, "ACTED_IN", {"title": "Big"}]
+    assert json_safe_rows(None) is None
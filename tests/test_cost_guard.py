@@ -0,0 +1,41 @@
+import pytest
+
+from cypher_workflows.shared.cost_guard import cap_var_length_patterns
+
+
+@pytest.mark.parametrize(
+    "cypher, expected",
+    [
+        ("MATCH (a)-[*]->(b) RETURN b", "MATCH (a)-[*1..5]->(b) RETURN b"),
+        ("MATCH (a)-[:KNOWS*2..]->(b)", "MATCH (a)-[:KNOWS*2..5]->(b)"),
+        ("MATCH (a)-[r*..10]-(b)", "MATCH (a)-[r*..5]-(b)"),
+        ("MATCH (a)-[ * ]-(b)", "MATCH (a)-[ *1..5 ]-(b)"),
+        # 下限超过上限时固定为下限，不能保留无上限的扩展
+        ("MATCH (a)-[:R*7..]->(b)", "MATCH (a)-[:R*7..7]->(b)"),
+    ],
+)
+def test_caps_unbounded_patterns(cypher, expected):
+    capped, rewrites = cap_var_length_patterns(cypher, max_hops=5)
+    assert capped == expected
+    assert len(rewrites) == 1
+
+
+@pytest.mark.parametrize(
+    "cypher",
+    [
+        "MATCH (a)-[*3]-(b)",
+        "MATCH (a)-[*1..4]-(b)",
+        "MATCH (a)-[*7..10]-(b)",
+        'MATCH (a)-[r:R {w:"*"}]->(b)',
+        "MATCH (a)-[r:R {w:'*..'}]->(b)",
+        "MATCH (a)-[:`*`]->(b)",
+        "MATCH (a)-->(b) // -[*]-",
+    ],
+)
+def test_leaves_bounded_patterns_and_literals(cypher):
+    assert cap_var_length_patterns(cypher, max_hops=5) == (cypher, [])
+
+
+def test_keeps_property_map_after_rewrite():
+    capped, _ = cap_var_length_patterns('MATCH (a)-[r:R*2.. {w:"*"}]->(b)', max_hops=5)
+    assert capped == 'MATCH (a)-[r:R*2..5 {w:"*"}]->(b)'
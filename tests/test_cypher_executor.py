@@ -0,0 +1,80 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from neo4j import Record
+from neo4j.graph import Graph, Node, Path
+
+from cypher_workflows.shared.cypher_executor import run_cypher
+from cypher_workflows.shared.result_serializer import serialize_records
+
+
+class _Result:
+    def __init__(self, records):
+        self._records = records
+
+    async def fetch(self, n):
+        return self._records[:n]
+
+    async def consume(self):
+        return SimpleNamespace(server=None, result_available_after=1)
+
+
+class _Tx:
+    def __init__(self, records):
+        self._records = records
+
+    async def run(self, query, params):
+        return _Result(self._records)
+
+
+class _Session:
+    def __init__(self, records):
+        self._records = records
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_read(self, work):
+        return await work(_Tx(self._records))
+
+
+class _Driver:
+    def __init__(self, records):
+        self._records = records
+
+    def session(self, **kwargs):
+        return _Session(self._records)
+
+
+def _graph_records():
+    graph = Graph()
+    tom = Node(graph, "4:db:1", 1, ["Person"], {"name": "Tom Hanks"})
+    big = Node(graph, "4:db:2", 2, ["Movie"], {"title": "Big", "released": 1988})
+    acted_in = graph.relationship_type("ACTED_IN")(graph, "5:db:1", 1, {"roles": ["Josh"]})
+    acted_in._start_node = tom
+    acted_in._end_node = big
+    return [Record({"m": big, "p": Path(tom, acted_in), "r": acted_in})]
+
+
+def test_nodes_and_paths_become_json_safe_rows():
+    store = SimpleNamespace(_async_driver=_Driver(_graph_records()), _database="neo4j")
+    rows = asyncio.run(run_cypher(store, "MATCH p=(:Person)-[r]->(m) RETURN m, p, r"))
+
+    assert rows[0]["m"] == {"title": "Big", "released": 1988}
+    assert rows[0]["p"] == [{"name": "Tom Hanks"}, "ACTED_IN", {"title": "Big", "released": 1988}]
+    json.dumps({"result": rows})
+    serialized = serialize_records(rows)
+    assert "(Tom Hanks)-[:ACTED_IN]-(Big)" in serialized
+    assert "element_id" not in serialized
+
+
+def test_unaliased_columns_keep_their_literals():
+    # 服务端以参数化后的表达式文本命名未起别名的列
+    records = [Record({"$lit_0": "Tom"})]
+    store = SimpleNamespace(_async_driver=_Driver(records), _database="neo4j")
+    rows = asyncio.run(run_cypher(store, "RETURN 'Tom'"))
+    assert rows == [{"'Tom'": "Tom"}]
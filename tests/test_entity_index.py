@@ -0,0 +1,46 @@
+import pytest
+
+from cypher_workflows.shared import entity_index
+from cypher_workflows.shared.entity_index import EntityIndex, rewrite_entity_literals
+
+
+@pytest.fixture
+def movies_index(monkeypatch):
+    index = EntityIndex([("Tom Hanks", "Person", "name"), ("Meg Ryan", "Person", "name")])
+    monkeypatch.setitem(entity_index._indexes, "movies", index)
+    return index
+
+
+def test_rewrites_only_the_filter_literal(movies_index):
+    cypher = (
+        "MATCH (p:Person)-[:ACTED_IN]->(m:Movie) "
+        "WHERE p.name = 'tom hanks' AND m.tagline CONTAINS 'tom hanks' "
+        "RETURN 'tom hanks' AS asked, m"
+    )
+    rewritten, rewrites = rewrite_entity_literals(cypher, "movies")
+    assert rewritten == (
+        "MATCH (p:Person)-[:ACTED_IN]->(m:Movie) "
+        "WHERE p.name = 'Tom Hanks' AND m.tagline CONTAINS 'tom hanks' "
+        "RETURN 'tom hanks' AS asked, m"
+    )
+    assert [(r["from"], r["to"]) for r in rewrites] == [("tom hanks", "Tom Hanks")]
+
+
+def test_rewrites_every_filter_occurrence_once(movies_index):
+    cypher = (
+        "MATCH (p:Person {name: \"Tom Hank\"}) WHERE p.name IN ['Tom Hank', 'meg ryan'] "
+        "AND NOT p.name = 'meg ryan' RETURN p"
+    )
+    rewritten, rewrites = rewrite_entity_literals(cypher, "movies")
+    assert rewritten == (
+        "MATCH (p:Person {name: 'Tom Hanks'}) WHERE p.name IN ['Tom Hanks', 'Meg Ryan'] "
+        "AND NOT p.name = 'meg ryan' RETURN p"
+    )
+    assert len(rewrites) == 2
+
+
+def test_without_index_the_statement_is_unchanged():
+    assert rewrite_entity_literals("MATCH (p:Person {name: 'x'}) RETURN p", "none") == (
+        "MATCH (p:Person {name: 'x'}) RETURN p",
+        [],
+    )
@@ -0,0 +1,58 @@
+from cypher_workflows.shared.evaluation_policy import score_database_output
+
+
+def test_filter_literals_are_not_evidence():
+    result = score_database_output(
+        "Which movies did Tom Hanks direct?",
+        "MATCH (p:Person {name: 'Tom Hanks'})-[:ACTED_IN]->(m:Movie) RETURN m.title",
+        "",
+        [{"m.title": "Big"}, {"m.title": "Cast Away"}],
+    )
+    assert result["verdict"] == "uncertain"
+
+
+def test_single_kind_of_overlap_is_uncertain():
+    result = score_database_output(
+        "Which movies did Tom Hanks act in?",
+        "MATCH (p:Person {name: 'Tom Hanks'})-[:ACTED_IN]->(m:Movie) RETURN m.title AS movie",
+        "",
+        [{"movie": "Big"}, {"movie": "Cast Away"}],
+    )
+    assert result["verdict"] == "uncertain"
+
+
+def test_column_and_value_overlap_is_ok():
+    result = score_database_output(
+        "Which movies belong to the Matrix franchise?",
+        "MATCH (m:Movie)-[:PART_OF]->(f:Franchise {id: 42}) RETURN m.title AS movies",
+        "",
+        [{"movies": "The Matrix"}, {"movies": "The Matrix Reloaded"}],
+    )
+    assert result["verdict"] == "ok"
+
+
+def test_echoed_filter_values_are_not_evidence():
+    # ACTED_IN 答不了“谁导演了”，返回的电影名只是过滤条件的回显
+    result = score_database_output(
+        "Who directed the movie Cast Away?",
+        "MATCH (p:Person)-[:ACTED_IN]->(m:Movie {title: 'Cast Away'}) "
+        "RETURN p.name AS director, m.title AS movie",
+        "",
+        [{"director": "Tom Hanks", "movie": "Cast Away"}],
+    )
+    assert result["verdict"] == "uncertain"
+
+
+def test_empty_result_is_not_ok():
+    result = score_database_output("Who directed Big?", "MATCH (n) RETURN n", "", [])
+    assert result["verdict"] != "ok"
+
+
+def test_missing_records_fall_back_to_the_error_text():
+    failed = score_database_output(
+        "Who directed Big?", "MATCH (n RETURN n", "Invalid input 'RETURN': syntax error", None
+    )
+    assert failed["verdict"] == "error"
+    # 记录缺失时不再从序列化后的 context 解析结果
+    serialized = score_database_output("Who directed Big?", "MATCH (n) RETURN n", "[{'n': 1}]", None)
+    assert serialized["verdict"] == "uncertain"
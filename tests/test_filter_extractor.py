@@ -0,0 +1,158 @@
+import pytest
+
+from cypher_workflows.shared.filter_extractor import (
+    extract_filter_literals,
+    extract_filter_triples,
+    tokenize,
+)
+
+
+def test_tokenize_kinds():
+    assert tokenize("MATCH (n:`My Label`) WHERE n.x >= -1.5 AND n.ok = true // note") == [
+        ("identifier", "MATCH"),
+        ("punct", "("),
+        ("identifier", "n"),
+        ("punct", ":"),
+        ("identifier", "My Label"),
+        ("punct", ")"),
+        ("identifier", "WHERE"),
+        ("identifier", "n"),
+        ("punct", "."),
+        ("identifier", "x"),
+        ("op", ">="),
+        ("punct", "-"),
+        ("number", 1.5),
+        ("identifier", "AND"),
+        ("identifier", "n"),
+        ("punct", "."),
+        ("identifier", "ok"),
+        ("op", "="),
+        ("bool", True),
+    ]
+
+
+def test_inline_properties_and_where_comparisons():
+    cypher = (
+        "MATCH (p:Person {name: 'John'})-[:KNOWS]->(f:Friend) "
+        "WHERE p.age > 30 AND f.city = 'London' AND f.salary = m.salary"
+    )
+    assert extract_filter_triples(cypher) == [
+        ("Person", "name", "=", "John"),
+        ("Person", "age", ">", 30),
+        ("Friend", "city", "=", "London"),
+    ]
+
+
+def test_property_to_property_comparisons_are_ignored():
+    cypher = "MATCH (m1:Movie {title: 'Matrix'}), (m2:Movie) WHERE m1.rating > m2.rating AND m1.year = 1999"
+    assert extract_filter_triples(cypher) == [
+        ("Movie", "title", "=", "Matrix"),
+        ("Movie", "year", "=", 1999),
+    ]
+
+
+@pytest.mark.parametrize(
+    "condition, expected",
+    [
+        ("p.name CONTAINS 'Tom'", ("Person", "name", "CONTAINS", "Tom")),
+        ("p.name STARTS WITH 'The'", ("Person", "name", "STARTS WITH", "The")),
+        ("p.name ENDS WITH 'son'", ("Person", "name", "ENDS WITH", "son")),
+        ("p.name =~ 'Tom.*'", ("Person", "name", "=~", "Tom.*")),
+        ("p.name <> 'Tom'", ("Person", "name", "<>", "Tom")),
+        ("p.born <= 1960", ("Person", "born", "<=", 1960)),
+        ("p.born > -5", ("Person", "born", ">", -5)),
+        # 字面量在左边时运算符换向
+        ("1950 < p.born", ("Person", "born", ">", 1950)),
+        ("'Tom' = p.name", ("Person", "name", "=", "Tom")),
+    ],
+)
+def test_operators_are_kept(condition, expected):
+    assert extract_filter_triples(f"MATCH (p:Person) WHERE {condition} RETURN p") == [expected]
+
+
+def test_in_list_gives_one_filter_per_item():
+    cypher = "MATCH (m:Movie) WHERE m.year IN [1999, 2003] RETURN m"
+    assert extract_filter_triples(cypher) == [
+        ("Movie", "year", "IN", 1999),
+        ("Movie", "year", "IN", 2003),
+    ]
+
+
+def test_string_operator_followed_by_more_conditions():
+    cypher = "MATCH (p:Person) WHERE p.name STARTS WITH 'T' AND p.born = 1956 RETURN p"
+    assert extract_filter_triples(cypher) == [
+        ("Person", "name", "STARTS WITH", "T"),
+        ("Person", "born", "=", 1956),
+    ]
+
+
+@pytest.mark.parametrize(
+    "cypher",
+    [
+        # 比较出现在 RETURN / WITH 中不是过滤条件
+        "MATCH (p:Person) RETURN p.born = 1956",
+        "MATCH (p:Person) WITH p, p.name = 'Tom' AS isTom RETURN p",
+        "MATCH (p:Person) RETURN CASE WHEN p.born > 1950 THEN 1 ELSE 0 END",
+        # 字面量只是表达式的一部分
+        "MATCH (p:Person) WHERE p.born = 1950 + 6 RETURN p",
+        "MATCH (p:Person) WHERE p.born = toInteger('1956') RETURN p",
+        # 未声明标签的变量
+        "MATCH (p) WHERE p.name = 'Tom' RETURN p",
+        # 未闭合的字符串
+        "MATCH (p:Person) WHERE p.name = 'Tom RETURN p",
+    ],
+)
+def test_non_filters_are_ignored(cypher):
+    assert extract_filter_triples(cypher) == []
+
+
+def test_where_after_with_is_a_filter():
+    cypher = "MATCH (p:Person) WITH p WHERE p.name = 'Tom' RETURN p.born > 1950"
+    assert extract_filter_triples(cypher) == [("Person", "name", "=", "Tom")]
+
+
+def test_keyword_like_property_names():
+    cypher = "MATCH (p:Person) WHERE p.limit = 3 AND p.with = 'x' RETURN p"
+    assert extract_filter_triples(cypher) == [
+        ("Person", "limit", "=", 3),
+        ("Person", "with", "=", "x"),
+    ]
+
+
+def test_duplicates_are_removed():
+    cypher = "MATCH (p:Person {name: 'Tom'}) WHERE p.name = 'Tom' AND p.name = 'Tom' RETURN p"
+    assert extract_filter_triples(cypher) == [("Person", "name", "=", "Tom")]
+
+
+@pytest.mark.parametrize(
+    "cypher, expected",
+    [
+        ("MATCH (p:Person) WHERE NOT p.name = 'Tom' RETURN p", []),
+        ("MATCH (p:Person) WHERE NOT p.name IN ['Tom', 'Meg'] RETURN p", []),
+        ("MATCH (p:Person) WHERE NOT 'Tom' = p.name RETURN p", []),
+        ("MATCH (p:Person) WHERE NOT p.name STARTS WITH 'T' RETURN p", []),
+        (
+            "MATCH (p:Person) WHERE NOT (p.name = 'Tom' OR p.born = 1956) AND p.born > 1950 RETURN p",
+            [("Person", "born", ">", 1950)],
+        ),
+        (
+            "MATCH (p:Person) WHERE NOT p.name = 'Tom' AND p.born = 1956 RETURN p",
+            [("Person", "born", "=", 1956)],
+        ),
+        (
+            "MATCH (p:Person) WHERE p.not = 'x' RETURN p",
+            [("Person", "not", "=", "x")],
+        ),
+    ],
+)
+def test_negated_comparisons_are_skipped(cypher, expected):
+    assert extract_filter_triples(cypher) == expected
+
+
+def test_filter_literals_carry_their_offsets():
+    cypher = "MATCH (p:Person {name: 'Tom'}) WHERE 1950 < p.born RETURN 'Tom'"
+    located = extract_filter_literals(cypher)
+    assert [(triple, cypher[start:end]) for triple, (start, end) in located] == [
+        (("Person", "name", "=", "Tom"), "'Tom'"),
+        (("Person", "born", ">", 1950), "1950"),
+    ]
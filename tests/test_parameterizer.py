@@ -0,0 +1,82 @@
+import pytest
+
+from cypher_workflows.shared.parameterizer import (
+    mask_literals,
+    parameterize_cypher,
+    restore_literals,
+)
+
+
+def test_lifts_string_and_number_literals():
+    query, params, literals = parameterize_cypher(
+        "MATCH (p:Person {name: 'Tom Hanks'}) WHERE p.born > 1950 RETURN p.rating + 0.5"
+    )
+    assert query == (
+        "MATCH (p:Person {name: $lit_0}) WHERE p.born > $lit_1 RETURN p.rating + $lit_2"
+    )
+    assert params == {"lit_0": "Tom Hanks", "lit_1": 1950, "lit_2": 0.5}
+    assert literals == {"lit_0": "'Tom Hanks'", "lit_1": "1950", "lit_2": "0.5"}
+
+
+def test_same_shape_gives_same_text():
+    first, _, _ = parameterize_cypher("MATCH (m:Movie) WHERE m.title = 'A' RETURN m")
+    second, _, _ = parameterize_cypher('MATCH (m:Movie) WHERE m.title = "B" RETURN m')
+    assert first == second
+
+
+@pytest.mark.parametrize(
+    "cypher",
+    [
+        "MATCH (a)-[*1..3]->(b) RETURN b",
+        "MATCH (a)-[:KNOWS*2]->(b) RETURN b",
+        "MATCH (a)-[r*..4]-(b) RETURN b",
+        "MATCH (a)-[*2..]-(b) RETURN b",
+        "MATCH ((a)-->(b)){1,3} RETURN b",
+        "MATCH ((a)-[:R]->(b)){2,} RETURN b",
+        "MATCH ((a)-[:R]->(b)){,5} RETURN b",
+        "MATCH ((a)-[:R]->(b)){ 3 } RETURN b",
+        "MATCH (a)-[:R]->{1,3}(b) RETURN b",
+    ],
+)
+def test_keeps_path_length_bounds(cypher):
+    query, params, _ = parameterize_cypher(cypher)
+    assert query == cypher
+    assert params == {}
+
+
+def test_quantifier_next_to_lifted_literal():
+    query, params, _ = parameterize_cypher(
+        "MATCH ((a {name: 'x'})-->(b)){1,3} WHERE b.age = 30 RETURN b"
+    )
+    assert query == "MATCH ((a {name: $lit_0})-->(b)){1,3} WHERE b.age = $lit_1 RETURN b"
+    assert params == {"lit_0": "x", "lit_1": 30}
+
+
+def test_keeps_comments_backticks_and_existing_params():
+    cypher = "MATCH (n:`Label 1`) // 'note' 42\nWHERE n.id = $id RETURN n.`x 2`"
+    query, params, _ = parameterize_cypher(cypher, {"id": 7})
+    assert query == cypher
+    assert params == {"id": 7}
+
+
+def test_does_not_reuse_existing_param_names():
+    query, params, _ = parameterize_cypher("RETURN 'a'", {"lit_0": 1})
+    assert query == "RETURN $lit_1"
+    assert params == {"lit_0": 1, "lit_1": "a"}
+
+
+def test_unterminated_string_returns_statement_unchanged():
+    cypher = "MATCH (n) WHERE n.name = 'Tom RETURN n"
+    assert parameterize_cypher(cypher) == (cypher, {}, {})
+
+
+def test_restore_literals_in_column_names():
+    _, _, literals = parameterize_cypher("RETURN 'a' + 'b', 10")
+    assert restore_literals("$lit_0 + $lit_1", literals) == "'a' + 'b'"
+
+
+def test_mask_literals_preserves_offsets():
+    cypher = "MATCH (n {w: '*]'}) // [*]\nRETURN n.`*`"
+    masked = mask_literals(cypher)
+    assert len(masked) == len(cypher)
+    assert "*" not in masked
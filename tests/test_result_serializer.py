@@ -0,0 +1,40 @@
+from neo4j import Record
+from neo4j.graph import Graph, Node, Path
+
+from cypher_workflows.shared.result_serializer import serialize_records
+
+
+def _movie_graph():
+    graph = Graph()
+    tom = Node(graph, "4:db:1", 1, ["Person"], {"name": "Tom Hanks", "born": 1956})
+    big = Node(graph, "4:db:2", 2, ["Movie"], {"title": "Big"})
+    splash = Node(graph, "4:db:3", 3, ["Movie"], {"title": "Splash"})
+    acted_in = graph.relationship_type("ACTED_IN")
+    first = acted_in(graph, "5:db:1", 1, {"roles": ["Josh"]})
+    first._start_node, first._end_node = tom, big
+    second = acted_in(graph, "5:db:2", 2, {"roles": ["Allen"]})
+    second._start_node, second._end_node = tom, splash
+    return tom, big, first, second
+
+
+def test_paths_and_relationships_from_records_are_compressed():
+    tom, big, first, second = _movie_graph()
+    rows = [
+        Record({"p": Path(big, first, second), "r": first}).data(),
+    ]
+    text = serialize_records(rows)
+    assert "(Big)-[:ACTED_IN]-(Tom Hanks)-[:ACTED_IN]-(Splash)" in text
+    assert "(Tom Hanks)-[:ACTED_IN]-(Big)" in text
+
+
+def test_nodes_from_records_are_written_as_maps():
+    tom, _, _, _ = _movie_graph()
+    text = serialize_records([Record({"n": tom}).data()])
+    assert text.splitlines() == ["columns: n", "1. {name: Tom Hanks, born: 1956}"]
+
+
+def test_rows_beyond_the_budget_are_counted():
+    rows = [{"title": f"Movie number {i}"} for i in range(200)]
+    text = serialize_records(rows, token_budget=50)
+    assert text.splitlines()[-1].startswith("... ")
+    assert "more rows omitted" in text
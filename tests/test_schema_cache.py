@@ -0,0 +1,56 @@
+from app.schema_cache import query_schema_fingerprint
+
+
+class _Store:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def structured_query(self, query):
+        self.queries.append(query)
+        for key, rows in self.rows.items():
+            if key in query:
+                return rows
+        return []
+
+
+_SCHEMA = {
+    "nodeTypeProperties": [
+        {"labels": ["Movie"], "property": "title", "types": ["String"]},
+        {"labels": ["Person"], "property": "born", "types": ["Long", "String"]},
+    ],
+    "relTypeProperties": [{"type": ":`ACTED_IN`", "property": "roles", "types": ["StringArray"]}],
+    "visualization": [{"start": ["Person"], "type": "ACTED_IN", "end": ["Movie"]}],
+}
+
+
+def test_fingerprint_ignores_row_and_list_order():
+    reordered = {
+        "nodeTypeProperties": [
+            {"labels": ["Person"], "property": "born", "types": ["String", "Long"]},
+            {"labels": ["Movie"], "property": "title", "types": ["String"]},
+        ],
+        "relTypeProperties": _SCHEMA["relTypeProperties"],
+        "visualization": _SCHEMA["visualization"],
+    }
+    assert query_schema_fingerprint(_Store(_SCHEMA)) == query_schema_fingerprint(_Store(reordered))
+
+
+def test_fingerprint_changes_with_new_patterns_and_types():
+    base = query_schema_fingerprint(_Store(_SCHEMA))
+    new_pattern = dict(_SCHEMA, visualization=_SCHEMA["visualization"] + [
+        {"start": ["Person"], "type": "ACTED_IN", "end": ["Play"]}
+    ])
+    new_type = dict(_SCHEMA, nodeTypeProperties=[
+        {"labels": ["Movie"], "property": "title", "types": ["Long"]},
+        _SCHEMA["nodeTypeProperties"][1],
+    ])
+    assert query_schema_fingerprint(_Store(new_pattern)) != base
+    assert query_schema_fingerprint(_Store(new_type)) != base
+
+
+def test_fingerprint_queries_only_the_schema_procedures():
+    store = _Store(_SCHEMA)
+    query_schema_fingerprint(store)
+    assert len(store.queries) == 3
+    assert all("CALL db.schema." in query for query in store.queries)
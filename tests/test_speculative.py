@@ -0,0 +1,56 @@
+import asyncio
+from types import SimpleNamespace
+
+from cypher_workflows.shared import speculative
+from cypher_workflows.shared.speculative import SpeculativeStream
+
+
+class _LLM:
+    def __init__(self, fail=False, slow=False):
+        self.fail = fail
+        self.slow = slow
+
+    async def astream_chat(self, messages):
+        async def gen():
+            yield SimpleNamespace(delta="Tom ")
+            if self.slow:
+                await asyncio.sleep(10)
+            if self.fail:
+                raise RuntimeError("boom")
+            yield SimpleNamespace(delta="Hanks")
+
+        return gen()
+
+
+def _discarded():
+    return speculative.speculative_stats["summaries_discarded"]
+
+
+def test_cancel_counts_only_discarded_output():
+    async def run():
+        before = _discarded()
+        running = SpeculativeStream(_LLM(slow=True), [])
+        await asyncio.sleep(0.01)
+        running.cancel()
+        released = SpeculativeStream(_LLM(), [])
+        assert [delta async for delta in released.stream()] == ["Tom ", "Hanks"]
+        released.cancel()
+        return _discarded() - before
+
+    assert asyncio.run(run()) == 1
+
+
+def test_failed_summary_is_retrieved_and_not_counted():
+    errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: errors.append(ctx))
+        before = _discarded()
+        failed = SpeculativeStream(_LLM(fail=True), [])
+        await asyncio.sleep(0.01)
+        failed.cancel()
+        del failed
+        return _discarded() - before
+
+    assert asyncio.run(run()) == 0
+    assert errors == []